@@ -1,18 +1,24 @@
 import logging
+import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from app import config
 from app.utils import get_bool_env
 from app.api_utils import CleanJSONResponse
 from app.exceptions import LVException
+from app.metrics import HTTP_REQUEST_SECONDS
+from app.tracing import configure_tracing
+from app.queue_analytics import track_queue_backlog
 from app.dependencies import (
     background_job_storage, schedule_storage,
     clean_cache, refresh_namespace_and_tables,
     queued_task_storage,
-    insight_run_storage, insight_record_storage, active_insight_storage
+    insight_run_storage, insight_record_storage, active_insight_storage,
+    table_health_storage, rule_execution_storage
 )
 from app.routers import auth, tables, insights, jobs
 
@@ -28,6 +34,7 @@ if not HEALTH_ENABLED:
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Application startup...")
+    configure_tracing("lakevision-api")
     # Connect to databases and create tables
     if HEALTH_ENABLED:
         background_job_storage.connect()
@@ -43,6 +50,11 @@ async def lifespan(app: FastAPI):
         insight_record_storage.ensure_table()
         active_insight_storage.connect()
         active_insight_storage.ensure_table()
+        table_health_storage.connect()
+        table_health_storage.ensure_table()
+        rule_execution_storage.connect()
+        rule_execution_storage.ensure_table()
+        track_queue_backlog(queued_task_storage)
     
     # Start periodic maintenance tasks
     refresh_namespace_and_tables()
@@ -59,6 +71,8 @@ async def lifespan(app: FastAPI):
         insight_run_storage.disconnect()
         insight_record_storage.disconnect()
         active_insight_storage.disconnect()
+        table_health_storage.disconnect()
+        rule_execution_storage.disconnect()
     print("Shutdown complete.")
 
 # --- FastAPI App Initialization ---
@@ -77,6 +91,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def observe_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # The route template (/api/tables/{table_id}/snapshots) keeps label cardinality bounded
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            request.method, getattr(route, "path", "unmatched"), str(status_code)
+        ).observe(time.perf_counter() - start)
+
 # --- Exception Handlers ---
 @app.exception_handler(LVException)
 async def lv_exception_handler(request: Request, exc: LVException):
@@ -85,6 +114,10 @@ async def lv_exception_handler(request: Request, exc: LVException):
         content={"name": exc.name, "message": exc.message},
     )
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # --- Include Routers ---
 app.include_router(auth.router)
 app.include_router(tables.router)
@@ -1,13 +1,20 @@
 import json
+import asyncio
+import threading
 import numpy as np
 import math
 import decimal
 import datetime as dt
 import uuid
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from typing import Any
+from fastapi import Request
 from fastapi.responses import JSONResponse
 
+DISCONNECT_POLL_SECONDS = 0.5
+
 def _clean_data_recursively(x: Any) -> Any:
     """
     Recursively traverses a data structure to replace special types and values
@@ -44,12 +51,78 @@ def _clean_data_recursively(x: Any) -> Any:
 
     return x
 
-def df_to_records(df: pd.DataFrame) -> list[dict]:
+# Sample data timestamps, to the second in the column's time zone.
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+BINARY_PLACEHOLDER = '__binary_data__'
+
+
+def _wire_array(arr: pa.Array) -> pa.Array:
+    """
+    Converts an Arrow array to one whose Python values are JSON serializable, with the
+    same values _clean_data_recursively gives: timestamps and dates as strings, decimals
+    as floats, binaries as a placeholder, NaN and infinities as null. Nested values
+    are converted through their child arrays.
+    """
+    t = arr.type
+    if isinstance(t, pa.ExtensionType):
+        return _wire_array(arr.storage)
+    if pa.types.is_dictionary(t):
+        return _wire_array(arr.dictionary_decode())
+    if pa.types.is_timestamp(t):
+        return pc.strftime(arr, format=TIMESTAMP_FORMAT)
+    if pa.types.is_date(t) or pa.types.is_time(t):
+        return arr.cast(pa.string())
+    if pa.types.is_duration(t):
+        return arr.cast(pa.int64())
+    if pa.types.is_decimal(t):
+        return arr.cast(pa.float64())
+    if pa.types.is_binary(t) or pa.types.is_large_binary(t) or pa.types.is_fixed_size_binary(t):
+        return pc.if_else(arr.is_valid(), pa.scalar(BINARY_PLACEHOLDER), pa.scalar(None, pa.string()))
+    if pa.types.is_floating(t):
+        if pa.types.is_float16(t):
+            arr = arr.cast(pa.float32())
+        return pc.if_else(pc.is_finite(arr), arr, pa.scalar(None, arr.type))
+    if pa.types.is_struct(t):
+        children = [_wire_array(arr.field(i)) for i in range(t.num_fields)]
+        return pa.StructArray.from_arrays(
+            children, fields=[pa.field(t.field(i).name, c.type) for i, c in enumerate(children)],
+            mask=arr.is_null() if arr.null_count else None
+        )
+    if (pa.types.is_map(t) or pa.types.is_list(t) or pa.types.is_large_list(t)) and arr.offset:
+        arr = pa.concat_arrays([arr])  # rebuilding a list array needs offsets and children that start at 0
+    if pa.types.is_map(t):
+        return pa.MapArray.from_arrays(
+            arr.offsets, _wire_array(arr.keys), _wire_array(arr.items),
+            mask=arr.is_null() if arr.null_count else None
+        )
+    if pa.types.is_fixed_size_list(t):
+        return _wire_array(arr.cast(pa.list_(t.value_type)))
+    if pa.types.is_list(t) or pa.types.is_large_list(t):
+        list_type = pa.LargeListArray if pa.types.is_large_list(t) else pa.ListArray
+        return list_type.from_arrays(
+            arr.offsets, _wire_array(arr.values), mask=arr.is_null() if arr.null_count else None
+        )
+    return arr
+
+
+def arrow_to_records(table: pa.Table) -> list[dict]:
     """
-    Converts a DataFrame to a list of records, then cleans the data for JSON serialization.
+    Converts an Arrow table to a list of JSON-serializable records in one columnar pass,
+    without going through pandas and the recursive cleaner.
     """
-    records = df.to_dict(orient="records")
-    return _clean_data_recursively(records)
+    if table.num_rows == 0:
+        return []
+    columns = [pa.chunked_array([_wire_array(chunk) for chunk in column.chunks]) for column in table.columns]
+    return pa.Table.from_arrays(columns, names=table.column_names).to_pylist()
+
+
+def records_response(table: pa.Table) -> JSONResponse:
+    """
+    A response with the records of `table`. The records are serializable already, so
+    they skip FastAPI's encoder and the cleaning pass of CleanJSONResponse.
+    """
+    return JSONResponse(arrow_to_records(table))
+
 
 class CleanJSONResponse(JSONResponse):
     def render(self, content: Any) -> bytes:
@@ -57,4 +130,15 @@ class CleanJSONResponse(JSONResponse):
         Renders content to JSON after a cleaning pass to ensure serializability.
         """
         payload = _clean_data_recursively(content)
-        return json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
\ No newline at end of file
+        return json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+
+async def cancel_on_disconnect(request: Request, cancelled: threading.Event, interval: float = DISCONNECT_POLL_SECONDS):
+    """
+    Sets `cancelled` once the client of `request` disconnects, so work running on a
+    threadpool thread on its behalf can stop. Meant to run as a task next to that work.
+    """
+    while not cancelled.is_set():
+        if await request.is_disconnected():
+            cancelled.set()
+            return
+        await asyncio.sleep(interval)
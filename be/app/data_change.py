@@ -0,0 +1,141 @@
+"""
+The Data Change history of a table: one row per snapshot, one column per summary key.
+
+The snapshot summaries (map<string, string>) are exploded into columns with Arrow
+compute, keys whose values are all integers (added-records, total-files-size, ...)
+becoming int64 columns. The snapshots table (Table.inspect.snapshots(), newest first,
+which is also the order of the Snapshots pages) and the exploded history are cached per
+metadata location, which changes with every commit, for up to
+LV_DATA_CHANGE_CACHE_ENTRIES tables.
+
+The history can be cut to a time window and downsampled to hour or day buckets: a
+bucket sums the added/deleted/changed counts of its snapshots, keeps the last of the
+running totals (total-*) and counts its snapshots.
+"""
+import datetime as dt
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.metrics import DATA_CHANGE_CACHE_REQUESTS
+from app.utils import get_int_env
+
+DATA_CHANGE_CACHE_ENTRIES = get_int_env("LV_DATA_CHANGE_CACHE_ENTRIES", 64)
+BUCKETS = ("hour", "day")
+
+
+@dataclass(eq=False)
+class _Snapshots:
+    table: pa.Table  # newest first
+    history: Optional[pa.Table] = None  # exploded, oldest first; built on first use
+
+
+_cache: "OrderedDict[str, _Snapshots]" = OrderedDict()  # least recently used first
+_cache_lock = threading.Lock()
+
+
+def explode_summaries(snapshots: pa.Table) -> pa.Table:
+    """committed_at and one column per summary key of `snapshots` (see Table.inspect.snapshots)."""
+    summary = snapshots["summary"].combine_chunks()
+    # The list kernels take the map as the list of its key/value entries.
+    summary = summary.cast(pa.list_(pa.struct([summary.type.key_field, summary.type.item_field])))
+    entries = pc.list_flatten(summary)
+    keys, values = pc.struct_field(entries, [0]), pc.struct_field(entries, [1])
+    parents = pc.list_parent_indices(summary)
+    rows = pa.array(range(len(summary)), pa.int64())
+
+    columns, names = [snapshots["committed_at"]], ["committed_at"]
+    for key in pc.unique(keys).to_pylist():
+        of_key = pc.equal(keys, key)
+        # Each row's position among the entries of this key, null where the row lacks it.
+        positions = pc.index_in(rows, value_set=pc.filter(parents, of_key))
+        column = pc.filter(values, of_key).take(positions)
+        try:
+            column = column.cast(pa.int64())
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            pass
+        columns.append(column)
+        names.append(key)
+    return pa.Table.from_arrays(columns, names=names)
+
+
+def downsample(changes: pa.Table, bucket: str) -> pa.Table:
+    """The integer columns of `changes` aggregated per `bucket` ("hour" or "day") of committed_at."""
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    counts = [name for name in changes.column_names[1:] if pa.types.is_integer(changes.schema.field(name).type)]
+    bucketed = changes.select(counts).append_column(
+        "committed_at", pc.floor_temporal(changes["committed_at"], unit=bucket)
+    )
+    aggregations = [(name, "last" if name.startswith("total-") else "sum") for name in counts]
+    # Threads would lose the commit order that "last" depends on.
+    grouped = bucketed.group_by("committed_at", use_threads=False).aggregate(aggregations + [([], "count_all")])
+    grouped = grouped.rename_columns([
+        {"count_all": "snapshots"}.get(name, name.rsplit("_", 1)[0]) if name != "committed_at" else name
+        for name in grouped.column_names
+    ])
+    return grouped.select(["committed_at", "snapshots"] + counts).sort_by("committed_at")
+
+
+def data_change(table, since: Optional[dt.datetime] = None, until: Optional[dt.datetime] = None,
+                bucket: Optional[str] = None) -> pa.Table:
+    """
+    The exploded snapshot history of `table`, oldest first, committed from `since` up to
+    `until` (naive times are UTC) and downsampled to `bucket` if given.
+    """
+    changes = committed_between(_history(table), since, until)
+    if bucket is not None:
+        changes = downsample(changes, bucket)
+    return changes
+
+
+def committed_between(snapshots: pa.Table, since: Optional[dt.datetime], until: Optional[dt.datetime]) -> pa.Table:
+    """The rows of `snapshots` committed from `since` up to `until`; either may be None."""
+    if since is not None:
+        committed_at = snapshots["committed_at"]
+        snapshots = snapshots.filter(pc.greater_equal(committed_at, _utc_scalar(since, committed_at.type)))
+    if until is not None:
+        committed_at = snapshots["committed_at"]
+        snapshots = snapshots.filter(pc.less(committed_at, _utc_scalar(until, committed_at.type)))
+    return snapshots
+
+
+def snapshots(table) -> pa.Table:
+    """Table.inspect.snapshots() of `table`, newest first (by committed_at, then snapshot_id)."""
+    return _snapshots(table).table
+
+
+def _history(table) -> pa.Table:
+    entry = _snapshots(table)
+    if entry.history is None:
+        oldest_first = entry.table.take(pa.array(range(entry.table.num_rows - 1, -1, -1), pa.int64()))
+        entry.history = explode_summaries(oldest_first)
+    return entry.history
+
+
+def _snapshots(table) -> _Snapshots:
+    key = table.metadata_location
+    with _cache_lock:
+        if key in _cache:
+            DATA_CHANGE_CACHE_REQUESTS.labels("hit").inc()
+            _cache.move_to_end(key)
+            return _cache[key]
+    DATA_CHANGE_CACHE_REQUESTS.labels("miss").inc()
+    entry = _Snapshots(table.inspect.snapshots().sort_by([("committed_at", "descending"), ("snapshot_id", "descending")]))
+    with _cache_lock:
+        _cache[key] = entry
+        while len(_cache) > DATA_CHANGE_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return entry
+
+
+def _utc_scalar(at: dt.datetime, type_: pa.DataType) -> pa.Scalar:
+    if at.tzinfo is not None:
+        at = at.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    if type_.tz is not None:
+        at = at.replace(tzinfo=dt.timezone.utc)
+    return pa.scalar(at, type_)
@@ -10,9 +10,11 @@ from fastapi import Request, HTTPException
 from pyiceberg.table import Table
 from app.lakeviewer import LakeView
 from app.storage import get_storage
-from app.models import BackgroundJob, InsightRun, JobSchedule, InsightRecord, ActiveInsight, QueuedTask
+from app.models import BackgroundJob, InsightRun, JobSchedule, InsightRecord, ActiveInsight, QueuedTask, TableHealth, RuleExecution
 from app import config
 from app.insights.runner import InsightsRunner
+from app.metrics import PAGE_CACHE_REQUESTS
+from app.profiling import profiled
 
 logger = logging.getLogger(__name__)
 
@@ -91,43 +93,32 @@ authz_class = _load_authz_class()
 authz_ = authz_class()
 
 # --- Storage Instances ---
-background_job_storage = get_storage(model=BackgroundJob)
-schedule_storage = get_storage(model=JobSchedule)
-queued_task_storage = get_storage(model=QueuedTask)
-insight_run_storage = get_storage(model=InsightRun)
-insight_record_storage = get_storage(model=InsightRecord)
-active_insight_storage = get_storage(model=ActiveInsight)
+# Dashboard reads may be served by read replicas (LAKEVISION_DATABASE_READ_URL);
+# the worker and scheduler always use the primary.
+background_job_storage = get_storage(model=BackgroundJob, read_replica=True)
+schedule_storage = get_storage(model=JobSchedule, read_replica=True)
+queued_task_storage = get_storage(model=QueuedTask, read_replica=True)
+insight_run_storage = get_storage(model=InsightRun, read_replica=True)
+insight_record_storage = get_storage(model=InsightRecord, read_replica=True)
+active_insight_storage = get_storage(model=ActiveInsight, read_replica=True)
+table_health_storage = get_storage(model=TableHealth, read_replica=True)
+rule_execution_storage = get_storage(model=RuleExecution, read_replica=True)
 
 def get_runner():
     """
-    FastAPI Dependency to provide a configured InsightsRunner
-    within a proper database session/transaction.
+    FastAPI Dependency to provide a configured InsightsRunner.
+
+    The runner's reads and writes each take their own connection from the shared
+    pool, so no session is held open for the length of the request.
     """
-    # 1. Create the storage instance - REMOVED
-    # 2. Connect to the database - MOVED TO API.PY
-    
-    # We now use db_session() for the request's unit of work,
-    # just like get_atomic_job does in worker.py.
-    try:
-        with insight_run_storage.db_session(), \
-             insight_record_storage.db_session(), \
-             active_insight_storage.db_session():
-            
-            # 3. Create the runner (this is cheap)
-            runner = InsightsRunner(
-                lakeview=lv, 
-                run_storage=insight_run_storage, 
-                insight_storage=insight_record_storage,
-                active_insight_storage=active_insight_storage
-            )
-            # 4. Yield the runner to the endpoint function
-            yield runner
-            
-    except Exception as e:
-        # 5. This block catches errors during the session
-        logging.error(f"Error in get_runner DB session: {e}")
-        # The 'with' block will handle rollback.
-        raise HTTPException(status_code=500, detail="Database session error")
+    return InsightsRunner(
+        lakeview=lv,
+        run_storage=insight_run_storage,
+        insight_storage=insight_record_storage,
+        active_insight_storage=active_insight_storage,
+        health_storage=table_health_storage,
+        execution_storage=rule_execution_storage
+    )
 
 # --- Caching ---
 page_session_cache = {}
@@ -166,6 +157,7 @@ def load_table(table_id: str) -> Table:
     except Exception:
         raise HTTPException(status_code=404, detail="Table not found")
 
+@profiled
 def get_table(request: Request, table_id: str):
     if config.AUTH_ENABLED:
         user = check_auth(request)
@@ -178,8 +170,11 @@ def get_table(request: Request, table_id: str):
 
     cache_key = f"{page_session_id}_{table_id}"
     if cache_key not in page_session_cache:
+        PAGE_CACHE_REQUESTS.labels("miss").inc()
         tbl = load_table(table_id)
         page_session_cache[cache_key] = (tbl, time.time())
+    else:
+        PAGE_CACHE_REQUESTS.labels("hit").inc()
     
     tbl, _ = page_session_cache[cache_key]
     return tbl
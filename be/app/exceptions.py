@@ -2,4 +2,24 @@ class LVException(Exception):
     """Custom exception for LakeView application errors."""
     def __init__(self, name: str, message: str):
         self.name = name
-        self.message = message
\ No newline at end of file
+        self.message = message
+
+
+class QueryCancelled(Exception):
+    """A table query was abandoned because its client went away."""
+
+
+class QueryBudgetExceeded(Exception):
+    """A table query would read more than the user's query budget allows."""
+
+
+class QueryPoolSaturated(Exception):
+    """The sample query pool cannot take a query now: its queue is full or the query waited too long."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ResultNotFound(Exception):
+    """A stored query result is unknown, expired or belongs to another user."""
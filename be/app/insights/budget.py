@@ -0,0 +1,215 @@
+"""
+Time and memory budgets for table health runs.
+
+pyiceberg plans a table's files in one eager call, so a pathological table (say a
+million manifests) can spend unbounded time inside a single rule, out of reach of any
+cooperative check. Budgets are therefore enforced in two layers:
+
+- the runner checks the task deadline between rules (RunBudget) and saves the rules
+  that finished as a partial run with outcome "timed_out";
+- the worker runs each table task in a forked child (run_table_task_isolated) under
+  an address-space limit, and kills it when a rule or the whole task overruns. The
+  rules the child reported as finished are then saved as a partial run.
+
+Either way the task ends as failed with the reason in its error details, rather than
+hanging until the stale-task reaper hands it to another worker.
+
+The same rule-boundary check stops a table task whose batch was cancelled; the rules
+that finished are saved as a partial run with outcome "cancelled" and the task ends
+as cancelled.
+"""
+import multiprocessing
+import resource
+import time
+import traceback
+from typing import Callable, Dict, Optional, Tuple
+
+from app.models import Insight, QueuedTask
+from app.storage.engines import dispose_inherited_engines
+from app.utils import get_float_env, get_int_env
+
+# 0 disables the corresponding limit; with all three at 0 tasks run in the worker process.
+RULE_TIMEOUT_SECONDS = get_float_env("LV_RULE_TIMEOUT_SECONDS", 0.0)
+TASK_TIMEOUT_SECONDS = get_float_env("LV_TASK_TIMEOUT_SECONDS", 0.0)
+TASK_MEMORY_LIMIT_MB = get_int_env("LV_TASK_MEMORY_LIMIT_MB", 0)
+# Left to the child for saving its partial run before the parent kills it.
+SOFT_DEADLINE_MARGIN = 0.9
+# Longest the parent waits on the child between checks of its limits.
+POLL_INTERVAL_SECONDS = 1.0
+
+OUTCOME_COMPLETE = "complete"
+OUTCOME_TIMED_OUT = "timed_out"
+OUTCOME_MEMORY_EXCEEDED = "memory_exceeded"
+OUTCOME_FAILED = "failed"
+OUTCOME_CANCELLED = "cancelled"
+
+
+class RunBudget:
+    """A deadline and an optional cancellation check, both consulted by the runner between rules."""
+
+    def __init__(self, timeout_seconds: float = 0.0, cancelled: Optional[Callable[[], bool]] = None):
+        self.deadline = time.monotonic() + timeout_seconds if timeout_seconds > 0 else None
+        self.cancelled = cancelled
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def stop_reason(self) -> Optional[str]:
+        """The outcome to stop the run with, or None to go on with the next rule."""
+        if self.cancelled is not None and self.cancelled():
+            return OUTCOME_CANCELLED
+        if self.expired():
+            return OUTCOME_TIMED_OUT
+        return None
+
+
+class TaskStopped(Exception):
+    """A table task stopped early; the rules it finished were saved as a partial run."""
+
+    def __init__(self, outcome: str, message: str):
+        super().__init__(message)
+        self.outcome = outcome
+
+
+def isolation_enabled() -> bool:
+    return bool(RULE_TIMEOUT_SECONDS > 0 or TASK_TIMEOUT_SECONDS > 0 or TASK_MEMORY_LIMIT_MB > 0)
+
+
+def _table_identifier(task: QueuedTask) -> str:
+    return f"{task.namespace}.{task.table_name}"
+
+
+def _stopped_message(outcome: str, task_timeout: float) -> str:
+    if outcome == OUTCOME_CANCELLED:
+        return "Cancelled: the batch was cancelled, partial results were saved"
+    return f"Timed out: the task exceeded {task_timeout:g}s, partial results were saved"
+
+
+def run_table_task(runner, task: QueuedTask, cancelled: Optional[Callable[[], bool]] = None) -> None:
+    """Runs a table task in this process. Raises TaskStopped when its batch was cancelled mid-run."""
+    outcomes = []
+
+    def progress(event, rule_id, payload):
+        if event == "run_finished":
+            outcomes.append(payload)
+
+    runner.run_for_table(
+        table_identifier=_table_identifier(task),
+        rule_ids=task.rules_requested,
+        type=task.run_type,
+        budget=RunBudget(cancelled=cancelled),
+        progress=progress
+    )
+    if outcomes and outcomes[-1] != OUTCOME_COMPLETE:
+        raise TaskStopped(outcomes[-1], _stopped_message(outcomes[-1], 0))
+
+
+def _run_child(runner, task: QueuedTask, conn, task_timeout: float, memory_limit_mb: int,
+               cancelled: Optional[Callable[[], bool]]):
+    # Connections inherited from the worker are in use there; the child opens its own.
+    dispose_inherited_engines()
+    if memory_limit_mb > 0:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    try:
+        runner.run_for_table(
+            table_identifier=_table_identifier(task),
+            rule_ids=task.rules_requested,
+            type=task.run_type,
+            budget=RunBudget(task_timeout * SOFT_DEADLINE_MARGIN, cancelled),
+            progress=lambda event, rule_id, payload: conn.send((event, rule_id, payload))
+        )
+    except MemoryError:
+        conn.send(("memory_exceeded", None, traceback.format_exc()))
+    except Exception:
+        conn.send(("error", None, traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def run_table_task_isolated(
+    runner,
+    task: QueuedTask,
+    rule_timeout: float = RULE_TIMEOUT_SECONDS,
+    task_timeout: float = TASK_TIMEOUT_SECONDS,
+    memory_limit_mb: int = TASK_MEMORY_LIMIT_MB,
+    cancelled: Optional[Callable[[], bool]] = None
+) -> None:
+    """
+    Runs a table task in a forked child process and enforces its budgets. Raises
+    TaskStopped when the task was stopped early (after saving what finished) and
+    RuntimeError when the child failed. `cancelled` is checked by the child between rules.
+    """
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    child = context.Process(
+        target=_run_child, args=(runner, task, sender, task_timeout, memory_limit_mb, cancelled), daemon=True
+    )
+    started = time.monotonic()
+    child.start()
+    sender.close()
+
+    finished: Dict[str, Tuple[Optional[Insight], float]] = {}
+    current_rule: Optional[str] = None
+    rule_started = started
+    try:
+        while True:
+            limits = []
+            if task_timeout > 0:
+                limits.append((started + task_timeout, f"the task exceeded {task_timeout:g}s"))
+            if rule_timeout > 0 and current_rule is not None:
+                limits.append((rule_started + rule_timeout, f"rule {current_rule} exceeded {rule_timeout:g}s"))
+            deadline, reason = min(limits, default=(None, None))
+            wait = POLL_INTERVAL_SECONDS if deadline is None else min(POLL_INTERVAL_SECONDS, deadline - time.monotonic())
+
+            if wait <= 0:
+                child.kill()
+                _stop(runner, task, finished, OUTCOME_TIMED_OUT, f"Timed out: {reason}", started)
+
+            if receiver.poll(wait):
+                try:
+                    event, rule_id, payload = receiver.recv()
+                except EOFError:
+                    event, rule_id, payload = "exited", None, None
+            elif child.is_alive():
+                continue
+            else:
+                event, rule_id, payload = "exited", None, None
+
+            if event == "rule_started":
+                current_rule, rule_started = rule_id, time.monotonic()
+            elif event == "rule_finished":
+                finished[rule_id] = payload
+                current_rule = None
+            elif event == "run_finished":
+                if payload != OUTCOME_COMPLETE:
+                    raise TaskStopped(payload, _stopped_message(payload, task_timeout))
+                return
+            elif event == "memory_exceeded":
+                _stop(runner, task, finished, OUTCOME_MEMORY_EXCEEDED,
+                      f"Memory limit of {memory_limit_mb} MB exceeded:\n{payload}", started)
+            elif event == "error":
+                raise RuntimeError(payload)
+            elif event == "exited":
+                child.join()
+                # Killed by the kernel (e.g. the OOM killer) or crashed before reporting back.
+                _stop(runner, task, finished, OUTCOME_MEMORY_EXCEEDED if child.exitcode == -9 else OUTCOME_FAILED,
+                      f"Task process exited with code {child.exitcode}", started)
+    finally:
+        receiver.close()
+        child.join(timeout=5)
+        if child.is_alive():
+            child.kill()
+            child.join()
+
+
+def _stop(runner, task: QueuedTask, finished, outcome: str, message: str, started: float):
+    run = runner.record_partial_run(
+        table_identifier=_table_identifier(task),
+        rule_ids=task.rules_requested,
+        type=task.run_type,
+        finished=finished,
+        outcome=outcome,
+        duration_ms=(time.monotonic() - started) * 1000
+    )
+    raise TaskStopped(outcome, f"{message} (partial results in run {run.id})")
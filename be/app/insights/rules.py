@@ -1,6 +1,7 @@
 from pyiceberg.table import Table 
 from pyiceberg.types import StructType, ListType, MapType, UUIDType
 from typing import Optional
+from contextlib import contextmanager
 from app.insights.utils import qualified_table_name
 import yaml
 import os
@@ -12,40 +13,58 @@ from typing import Dict
 
 from app.models import Rule
 from app.models import Insight
+from app.tracing import span
+from app.utils import get_float_env, get_int_env
 
 rules_yaml_path = os.path.join(os.path.dirname(__file__), "rules.yaml")
 
-
-def _env_int(name: str, default: int) -> int:
-    try:
-        return int(os.getenv(name, default))
-    except (TypeError, ValueError):
-        return default
-
-
-def _env_float(name: str, default: float) -> float:
-    try:
-        return float(os.getenv(name, default))
-    except (TypeError, ValueError):
-        return default
-
-
 ONE_GB_IN_BYTES = 1000**3  # 1 GB in bytes (1024**3 is the actual value)
-LARGE_FILE_THRESHOLD_BYTES = _env_int("LV_RULE_LARGE_FILE_BYTES", ONE_GB_IN_BYTES)
-SEVERAL_FILES = _env_int("LV_RULE_SMALL_FILES_MIN_COUNT", 100)
-AVERAGE_SMALL_FILES_IN_BYTES = _env_int("LV_RULE_SMALL_FILES_AVG_BYTES", 100_000)
-LARGE_TABLE_IN_BYTES = _env_int("LV_RULE_LARGE_TABLE_BYTES", 50 * ONE_GB_IN_BYTES)
-AVERAGE_SMALL_FILES_LARGE_TABLES_IN_BYTES = _env_int("LV_RULE_SMALL_FILES_LARGE_TABLE_AVG_BYTES", 50_000)
-MAX_SNAPSHOTS_RECOMMENDED = _env_int("LV_RULE_MAX_SNAPSHOTS", 500)
-SKEWED_PARTITION_THRESHOLD_RATIO = _env_float("LV_RULE_SKEW_RATIO", 10)
+LARGE_FILE_THRESHOLD_BYTES = get_int_env("LV_RULE_LARGE_FILE_BYTES", ONE_GB_IN_BYTES)
+SEVERAL_FILES = get_int_env("LV_RULE_SMALL_FILES_MIN_COUNT", 100)
+AVERAGE_SMALL_FILES_IN_BYTES = get_int_env("LV_RULE_SMALL_FILES_AVG_BYTES", 100_000)
+LARGE_TABLE_IN_BYTES = get_int_env("LV_RULE_LARGE_TABLE_BYTES", 50 * ONE_GB_IN_BYTES)
+AVERAGE_SMALL_FILES_LARGE_TABLES_IN_BYTES = get_int_env("LV_RULE_SMALL_FILES_LARGE_TABLE_AVG_BYTES", 50_000)
+MAX_SNAPSHOTS_RECOMMENDED = get_int_env("LV_RULE_MAX_SNAPSHOTS", 500)
+SKEWED_PARTITION_THRESHOLD_RATIO = get_float_env("LV_RULE_SKEW_RATIO", 10)
 
 # Load yaml at app startup
 with open(rules_yaml_path) as f:
     INSIGHT_META = yaml.safe_load(f)
 
+# Planned FileScanTasks per table, shared by every rule evaluated inside shared_scan_plan().
+_scan_plan_cache: Dict[int, Optional[list]] = {}
+
+@contextmanager
+def shared_scan_plan(table: Table):
+    """Plans the table's data files at most once for all the rules run inside the block."""
+    _scan_plan_cache[id(table)] = None
+    try:
+        yield
+    finally:
+        _scan_plan_cache.pop(id(table), None)
+
+def _plan_files(table: Table) -> list:
+    with span("iceberg.plan_files") as planning:
+        tasks = list(table.scan().plan_files())
+        if planning is not None:
+            planning.set_attribute("files", len(tasks))
+        return tasks
+
+def plan_data_files(table: Table) -> list:
+    key = id(table)
+    if key not in _scan_plan_cache:
+        return _plan_files(table)
+    if _scan_plan_cache[key] is None:
+        _scan_plan_cache[key] = _plan_files(table)
+    return _scan_plan_cache[key]
+
+def planned_data_files(table: Table) -> Optional[list]:
+    """Returns the shared plan if a rule already planned the table's files, without planning."""
+    return _scan_plan_cache.get(id(table))
+
 
 def rule_small_files(table: Table) -> Optional[Insight]:
-    files = [file_scan_task.file.file_size_in_bytes for file_scan_task in table.scan().plan_files()]
+    files = [file_scan_task.file.file_size_in_bytes for file_scan_task in plan_data_files(table)]
     if not files:
         return None
     len_files = len(files)
@@ -74,7 +93,7 @@ def rule_no_location(table: Table) -> Optional[Insight]:
     return None
 
 def rule_large_files(table: Table) -> Optional[Insight]:
-    files = [file_scan_task.file.file_size_in_bytes for file_scan_task in table.scan().plan_files()]
+    files = [file_scan_task.file.file_size_in_bytes for file_scan_task in plan_data_files(table)]
     if not files:
         return None
     avg_size = sum(files) / len(files)
@@ -97,7 +116,7 @@ def rule_large_files(table: Table) -> Optional[Insight]:
     return None
 
 def rule_small_files_large_table(table: Table) -> Optional[Insight]:
-    files = [file_scan_task.file.file_size_in_bytes for file_scan_task in table.scan().plan_files()]
+    files = [file_scan_task.file.file_size_in_bytes for file_scan_task in plan_data_files(table)]
     if not files:
         return None
     total_size = sum(files)
@@ -224,7 +243,7 @@ def rule_skewed_or_largest_partitions_table(table: Table) -> Optional[Insight]:
     # Table has partitions
     if partition_spec.fields:
         try:
-            files = [TableFile.from_task(task) for task in table.scan().plan_files()]
+            files = [TableFile.from_task(task) for task in plan_data_files(table)]
             partition_summary = defaultdict(lambda: {"records": 0, "size_bytes": 0})
             for file in files:
                 # Create a unique, sortable key for the partition
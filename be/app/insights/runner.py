@@ -1,19 +1,52 @@
-from typing import List, Dict, Any, Optional, Set
+import dataclasses
+import time
+import tracemalloc
+from typing import List, Dict, Any, Optional, Set, Callable, Tuple
 from collections import defaultdict
 
-from app.insights.rules import ALL_RULES_OBJECT
+from app.insights.rules import ALL_RULES_OBJECT, shared_scan_plan, planned_data_files
+from app.insights.budget import RunBudget, OUTCOME_COMPLETE
+from app.insights.scorecard import HEALTH_SORT_COLUMNS, collect_table_metrics, build_table_health
 from app.insights.utils import get_namespace_and_table_name
-from app.models import Insight, InsightRun, InsightRecord, InsightRunOut, ActiveInsight, InsightOccurrence, RuleSummaryOut
+from app.models import (
+    Insight, InsightRun, InsightRecord, InsightRunOut, ActiveInsight, InsightOccurrence, RuleSummaryOut, TableHealth,
+    RuleExecution, RunTimingOut, RulePerformanceOut
+)
 from app.storage.interface import StorageInterface
+from app.metrics import RULE_SECONDS
+from app.tracing import span
+from app.utils import get_bool_env, get_int_env
+
+SUMMARY_TOP_N = get_int_env("LV_SUMMARY_TOP_N", 20)
+# tracemalloc slows allocation-heavy rules down noticeably, so peak memory is opt-in.
+TRACK_RUN_MEMORY = get_bool_env("LV_TRACK_RUN_MEMORY")
+# Sort keys accepted by the run performance endpoints, mapped to columns.
+RUN_TIMING_SORT_COLUMNS = {
+    "duration": "duration_ms",
+    "load": "load_time_ms",
+    "files": "files_scanned",
+    "manifests": "manifest_bytes_read",
+    "memory": "peak_memory_bytes",
+}
+RULE_PERFORMANCE_SORT_COLUMNS = {"avg": "avg_ms", "max": "max_ms", "total": "total_ms"}
+# Most severe first; unknown severities sort last.
+SEVERITY_RANK_SQL = (
+    "CASE LOWER(\"severity\") WHEN 'critical' THEN 0 WHEN 'warning' THEN 1 WHEN 'info' THEN 2 ELSE 3 END"
+)
+
 class InsightsRunner:
     def __init__(self, lakeview, 
                  run_storage: StorageInterface[InsightRun], 
                  insight_storage: StorageInterface[InsightRecord],
-                 active_insight_storage: StorageInterface[ActiveInsight]):
+                 active_insight_storage: StorageInterface[ActiveInsight],
+                 health_storage: Optional[StorageInterface[TableHealth]] = None,
+                 execution_storage: Optional[StorageInterface[RuleExecution]] = None):
         self.lakeview = lakeview
         self.run_storage = run_storage
         self.insight_storage = insight_storage
         self.active_insight_storage = active_insight_storage
+        self.health_storage = health_storage
+        self.execution_storage = execution_storage
 
     def get_latest_run(self, namespace: str, size: int, table_name: str = None, showEmpty: bool = True) -> List[InsightRun]:
         """
@@ -60,11 +93,10 @@ class InsightsRunner:
             
         return response_models
 
-    def get_summary_by_rule(self, 
-                            namespace: str, 
-                            table_name: Optional[str] = None,
-                            rule_codes: Optional[List[str]] = None
-                            ) -> List[Dict[str, Any]]:
+    def _active_insight_filters(self,
+                                namespace: str,
+                                table_name: Optional[str] = None,
+                                rule_codes: Optional[List[str]] = None):
         criteria = {}
         if namespace != '*':
             criteria['namespace'] = namespace
@@ -72,83 +104,352 @@ class InsightsRunner:
             criteria['table_name'] = table_name
         if rule_codes:
             criteria['code'] = rule_codes
-        
-        active_insights: List[ActiveInsight] = self.active_insight_storage.get_by_attributes(criteria)
-        
-        if not active_insights:
+        return criteria
+
+    def get_summary_by_rule(self, 
+                            namespace: str, 
+                            table_name: Optional[str] = None,
+                            rule_codes: Optional[List[str]] = None,
+                            top_n: int = SUMMARY_TOP_N
+                            ) -> List[RuleSummaryOut]:
+        """
+        Summarizes active insights per (rule, namespace) with SQL aggregates: total and
+        per-severity counts plus the top-N occurrences (most severe, then most recent).
+        The remaining occurrences are paged with get_rule_occurrences.
+        """
+        criteria = self._active_insight_filters(namespace, table_name, rule_codes)
+
+        counts = self.active_insight_storage.get_aggregate(
+            "COUNT", "*", criteria=criteria, group_by=["code", "namespace", "severity"]
+        )
+        if not counts:
             return []
 
-        grouped_data = defaultdict(list)
-        for insight in active_insights:
-            group_key = (insight.code, insight.namespace)
-            grouped_data[group_key].append(insight)
+        severity_counts = defaultdict(dict)
+        for row in counts:
+            severity_counts[(row["code"], row["namespace"])][row["severity"]] = row["result"]
 
-        final_summary = []
-        for (code, ns), occurrences in grouped_data.items():
-            suggested_action = occurrences[0].suggested_action
-
-            occurrence_models = [
-                InsightOccurrence(
-                    table_name=occ.table_name,
-                    severity=occ.severity,
-                    message=occ.message,
-                    timestamp=occ.last_seen_timestamp
-                ) for occ in occurrences
-            ]
+        table = self.active_insight_storage.table_name
+        where_sql, params = self.active_insight_storage.build_where_clause(criteria)
+        params['top_n'] = top_n
+        columns = ", ".join(f'"{f.name}"' for f in dataclasses.fields(ActiveInsight))
+        top_query = f'''
+            SELECT {columns} FROM (
+                SELECT {columns}, ROW_NUMBER() OVER (
+                    PARTITION BY "code", "namespace"
+                    ORDER BY {SEVERITY_RANK_SQL}, "last_seen_timestamp" DESC, "table_name"
+                ) AS rn
+                FROM "{table}" {where_sql}
+            ) ranked
+            WHERE rn <= :top_n
+        '''
+        top_occurrences = defaultdict(list)
+        for occ in self.active_insight_storage.find_by_raw_query(top_query, params):
+            top_occurrences[(occ.code, occ.namespace)].append(occ)
 
+        final_summary = []
+        for (code, ns), by_severity in severity_counts.items():
+            occurrences = top_occurrences.get((code, ns), [])
             final_summary.append(
                 RuleSummaryOut(
                     code=code,
                     namespace=ns,
-                    suggested_action=suggested_action,
-                    occurrences=occurrence_models
+                    suggested_action=occurrences[0].suggested_action if occurrences else "",
+                    total_occurrences=sum(by_severity.values()),
+                    severity_counts=by_severity,
+                    occurrences=[self._to_occurrence(occ) for occ in occurrences]
                 )
             )
             
         return final_summary
 
-    def run_for_table(self, table_identifier, rule_ids: List[str] = None, type: str = "manual") -> List[Insight]:
+    def get_rule_occurrences(self,
+                             namespace: str,
+                             code: str,
+                             table_name: Optional[str] = None,
+                             skip: int = 0,
+                             limit: int = 50
+                             ) -> List[InsightOccurrence]:
+        """Pages through the occurrences of one rule, in the same order as the summary."""
+        criteria = self._active_insight_filters(namespace, table_name, [code])
+        where_sql, params = self.active_insight_storage.build_where_clause(criteria)
+        params.update({'limit': limit, 'skip': skip})
+        query = (
+            f'SELECT * FROM "{self.active_insight_storage.table_name}" {where_sql} '
+            f'ORDER BY "namespace", {SEVERITY_RANK_SQL}, "last_seen_timestamp" DESC, "table_name" '
+            'LIMIT :limit OFFSET :skip'
+        )
+        return [self._to_occurrence(occ) for occ in self.active_insight_storage.find_by_raw_query(query, params)]
+
+    def get_table_health(self,
+                         namespace: str = '*',
+                         sort: str = 'worst',
+                         skip: int = 0,
+                         limit: int = 50
+                         ) -> List[TableHealth]:
+        """
+        Ranks tables by their materialized scorecard, worst first for the chosen sort key.
+        Raises ValueError for an unknown sort key.
+        """
+        if self.health_storage is None:
+            return []
+        if sort not in HEALTH_SORT_COLUMNS:
+            raise ValueError(f"Invalid sort '{sort}'. Expected one of: {', '.join(HEALTH_SORT_COLUMNS)}")
+        criteria = {} if namespace == '*' else {'namespace': namespace}
+        where_sql, params = self.health_storage.build_where_clause(criteria)
+        params.update({'limit': limit, 'skip': skip})
+        query = (
+            f'SELECT * FROM "{self.health_storage.table_name}" {where_sql} '
+            f'ORDER BY "{HEALTH_SORT_COLUMNS[sort]}" DESC, "namespace", "table_name" '
+            'LIMIT :limit OFFSET :skip'
+        )
+        return self.health_storage.find_by_raw_query(query, params)
+
+    def get_health_for_table(self, namespace: str, table_name: str) -> Optional[TableHealth]:
+        if self.health_storage is None:
+            return None
+        return self.health_storage.get_by_id(f"{namespace}.{table_name}")
+
+    def get_run_timings(self,
+                        namespace: str = '*',
+                        table_name: Optional[str] = None,
+                        sort: str = 'duration',
+                        limit: int = 50
+                        ) -> List[RunTimingOut]:
+        """
+        Lists the most expensive insight runs (slowest tables first by default), each
+        with its per-rule wall times. Raises ValueError for an unknown sort key.
+        """
+        if sort not in RUN_TIMING_SORT_COLUMNS:
+            raise ValueError(f"Invalid sort '{sort}'. Expected one of: {', '.join(RUN_TIMING_SORT_COLUMNS)}")
+        column = RUN_TIMING_SORT_COLUMNS[sort]
+        criteria = {} if namespace == '*' else {'namespace': namespace}
+        if table_name:
+            criteria['table_name'] = table_name
+        where_sql, params = self.run_storage.build_where_clause(criteria)
+        where_sql = f'{where_sql} AND "{column}" IS NOT NULL' if where_sql else f'WHERE "{column}" IS NOT NULL'
+        params['limit'] = limit
+        query = (
+            f'SELECT * FROM "{self.run_storage.table_name}" {where_sql} '
+            f'ORDER BY "{column}" DESC LIMIT :limit'
+        )
+        runs = self.run_storage.find_by_raw_query(query, params)
+        if not runs:
+            return []
+
+        timings_by_run = defaultdict(dict)
+        if self.execution_storage is not None:
+            for execution in self.execution_storage.get_by_attributes({"run_id": [run.id for run in runs]}):
+                timings_by_run[execution.run_id][execution.rule_id] = execution.duration_ms
+
+        return [
+            RunTimingOut(**{**run.__dict__, "rule_timings": timings_by_run.get(run.id, {})})
+            for run in runs
+        ]
+
+    def get_rule_performance(self,
+                             namespace: str = '*',
+                             sort: str = 'avg',
+                             limit: int = 50
+                             ) -> List[RulePerformanceOut]:
+        """Aggregates rule wall times across runs, slowest rules first. Raises ValueError for an unknown sort key."""
+        if sort not in RULE_PERFORMANCE_SORT_COLUMNS:
+            raise ValueError(f"Invalid sort '{sort}'. Expected one of: {', '.join(RULE_PERFORMANCE_SORT_COLUMNS)}")
+        if self.execution_storage is None:
+            return []
+        criteria = {} if namespace == '*' else {'namespace': namespace}
+        where_sql, params = self.execution_storage.build_where_clause(criteria)
+        params['limit'] = limit
+        query = (
+            'SELECT "rule_id", COUNT(*) AS executions, AVG("duration_ms") AS avg_ms, '
+            'MAX("duration_ms") AS max_ms, SUM("duration_ms") AS total_ms '
+            f'FROM "{self.execution_storage.table_name}" {where_sql} '
+            f'GROUP BY "rule_id" ORDER BY {RULE_PERFORMANCE_SORT_COLUMNS[sort]} DESC LIMIT :limit'
+        )
+        return [RulePerformanceOut(**row) for row in self.execution_storage.execute_raw_select_query(query, params)]
+
+    @staticmethod
+    def _to_occurrence(occ: ActiveInsight) -> InsightOccurrence:
+        return InsightOccurrence(
+            table_name=occ.table_name,
+            severity=occ.severity,
+            message=occ.message,
+            timestamp=occ.last_seen_timestamp
+        )
+
+    def run_for_table(
+        self,
+        table_identifier,
+        rule_ids: List[str] = None,
+        type: str = "manual",
+        budget: Optional[RunBudget] = None,
+        progress: Optional[Callable[[str, Optional[str], Any], None]] = None
+    ) -> List[Insight]:
+        """
+        Runs the rules on one table and saves the run. With a `budget`, the rules left
+        when its deadline passes or its cancellation check fires are skipped, and the
+        finished ones are saved as a partial run with outcome "timed_out" or "cancelled".
+        The run's timed_out_rules lists the skipped rules in either case.
+        `progress(event, rule_id, payload)` is told when each rule starts and finishes
+        and, at the end, the run's outcome.
+        """
         print(f"Running job for {table_identifier}")
-        table = self.lakeview.load_table(table_identifier)
+        track_memory = TRACK_RUN_MEMORY and not tracemalloc.is_tracing()
+        if track_memory:
+            tracemalloc.start()
+        try:
+            with span("insights.run_for_table", table=table_identifier, run_type=type):
+                return self._run_for_table(table_identifier, rule_ids, type, track_memory, budget, progress)
+        finally:
+            if track_memory:
+                tracemalloc.stop()
 
+    @staticmethod
+    def resolve_rule_ids(rule_ids: Optional[List[str]]) -> Set[str]:
+        """The rules a run executes: all of them by default. Raises ValueError for unknown ids."""
         all_valid_ids: Set[str] = {rule.id for rule in ALL_RULES_OBJECT}
-        ids_to_run: Set[str]
-        
         if rule_ids is None:
-            ids_to_run = all_valid_ids
-        else:
-            provided_ids = set(rule_ids)
-            invalid_ids = provided_ids - all_valid_ids
-            if invalid_ids:
-                raise ValueError(f"Invalid rule IDs provided: {', '.join(sorted(invalid_ids))}")
-            ids_to_run = provided_ids
+            return all_valid_ids
+        provided_ids = set(rule_ids)
+        invalid_ids = provided_ids - all_valid_ids
+        if invalid_ids:
+            raise ValueError(f"Invalid rule IDs provided: {', '.join(sorted(invalid_ids))}")
+        return provided_ids
 
+    def _run_for_table(
+        self,
+        table_identifier,
+        rule_ids: Optional[List[str]],
+        type: str,
+        track_memory: bool,
+        budget: Optional[RunBudget] = None,
+        progress: Optional[Callable[[str, Optional[str], Any], None]] = None
+    ) -> List[Insight]:
+        started = time.perf_counter()
+        table = self.lakeview.load_table(table_identifier)
+        load_time_ms = (time.perf_counter() - started) * 1000
+
+        ids_to_run = self.resolve_rule_ids(rule_ids)
         namespace, table_name = get_namespace_and_table_name(table_identifier)
 
-        run_result: List[Insight] = [
-            insight
-            for rule in ALL_RULES_OBJECT
-            if rule.id in ids_to_run and (insight := rule.method(table))
-        ]
+        # Rules share one file plan per table; the scorecard reuses it for file metrics.
+        with shared_scan_plan(table):
+            run_result: List[Insight] = []
+            rule_timings: Dict[str, float] = {}
+            stop_reason: Optional[str] = None
+            for rule in ALL_RULES_OBJECT:
+                if rule.id not in ids_to_run:
+                    continue
+                stop_reason = budget.stop_reason() if budget is not None else None
+                if stop_reason is not None:
+                    break
+                if progress is not None:
+                    progress("rule_started", rule.id, None)
+                rule_started = time.perf_counter()
+                with span("insights.rule", rule=rule.id):
+                    insight = rule.method(table)
+                elapsed = time.perf_counter() - rule_started
+                RULE_SECONDS.labels(rule.id).observe(elapsed)
+                rule_timings[rule.id] = elapsed * 1000
+                if progress is not None:
+                    progress("rule_finished", rule.id, (insight, rule_timings[rule.id]))
+                if insight:
+                    run_result.append(insight)
+            files_scanned, manifest_bytes_read = self._scan_accounting(table)
+            metrics = None
+            if self.health_storage is not None:
+                previous = self.health_storage.get_by_id(f"{namespace}.{table_name}")
+                metrics = collect_table_metrics(table, previous)
+
+        unfinished_rules = sorted(ids_to_run - rule_timings.keys())
+        outcome = stop_reason or OUTCOME_COMPLETE
+        run = InsightRun(
+            namespace=namespace,
+            table_name=table_name,
+            run_type=type,
+            rules_requested=list(ids_to_run),
+            load_time_ms=load_time_ms,
+            duration_ms=(time.perf_counter() - started) * 1000,
+            files_scanned=files_scanned,
+            manifest_bytes_read=manifest_bytes_read,
+            peak_memory_bytes=tracemalloc.get_traced_memory()[1] if track_memory else None,
+            outcome=outcome,
+            timed_out_rules=unfinished_rules or None
+        )
+        self._save_run(run, run_result, rule_timings)
+
+        if metrics is not None:
+            self._update_table_health(namespace, table_name, run, metrics)
+
+        if progress is not None:
+            progress("run_finished", None, outcome)
+        return run_result
 
+    def record_partial_run(
+        self,
+        table_identifier: str,
+        rule_ids: Optional[List[str]],
+        type: str,
+        finished: Dict[str, Tuple[Optional[Insight], float]],
+        outcome: str,
+        duration_ms: float
+    ) -> InsightRun:
+        """
+        Saves the rules that finished before a run was stopped from outside (see
+        app.insights.budget), given as rule id -> (insight or None, duration in ms).
+        """
+        namespace, table_name = get_namespace_and_table_name(table_identifier)
+        ids_to_run = self.resolve_rule_ids(rule_ids)
         run = InsightRun(
             namespace=namespace,
             table_name=table_name,
             run_type=type,
-            rules_requested=list(ids_to_run)
+            rules_requested=list(ids_to_run),
+            duration_ms=duration_ms,
+            outcome=outcome,
+            timed_out_rules=sorted(ids_to_run - finished.keys()) or None
+        )
+        self._save_run(
+            run,
+            [insight for insight, _ in finished.values() if insight],
+            {rule_id: duration for rule_id, (_, duration) in finished.items()}
         )
+        return run
+
+    def _save_run(self, run: InsightRun, run_result: List[Insight], rule_timings: Dict[str, float]):
+        """
+        Saves a run with its insights and rule timings, and replaces the table's active
+        insights for the rules that finished (`rule_timings` keys); rules that did not
+        finish keep their previous active insights.
+        """
+        namespace, table_name = run.namespace, run.table_name
         self.run_storage.save(run)
 
+        if self.execution_storage is not None and rule_timings:
+            self.execution_storage.save_many([
+                RuleExecution(
+                    run_id=run.id,
+                    namespace=namespace,
+                    table_name=table_name,
+                    rule_id=rule_id,
+                    duration_ms=duration_ms,
+                    run_timestamp=run.run_timestamp
+                )
+                for rule_id, duration_ms in rule_timings.items()
+            ])
+
         if run_result:
             insight_records = [
                 InsightRecord(run_id=run.id, **insight.__dict__) for insight in run_result
             ]
             self.insight_storage.save_many(insight_records)
 
+        if not rule_timings:
+            return
         self.active_insight_storage.delete_by_attributes({
             "namespace": namespace,
             "table_name": table_name,
-            "code": list(ids_to_run)
+            "code": list(rule_timings)
         })
 
         if run_result:
@@ -166,4 +467,30 @@ class InsightsRunner:
             ]
             self.active_insight_storage.save_many(new_active_insights)
 
-        return run_result
\ No newline at end of file
+    @staticmethod
+    def _scan_accounting(table) -> tuple:
+        """
+        Data files and manifest bytes read while planning the table's files, or
+        zeros when no rule needed a file plan.
+        """
+        tasks = planned_data_files(table)
+        if tasks is None:
+            return 0, 0
+        manifest_bytes = 0
+        snapshot = table.current_snapshot()
+        if snapshot is not None:
+            try:
+                # The manifest list was already read (and cached) by the planning itself.
+                manifest_bytes = sum(m.manifest_length for m in snapshot.manifests(table.io))
+            except Exception:
+                manifest_bytes = 0
+        return len(tasks), manifest_bytes
+
+    def _update_table_health(self, namespace: str, table_name: str, run: InsightRun, metrics: Dict[str, Any]):
+        """Rewrites the table's scorecard row from its active insights, right after they change."""
+        severity_counts = self.active_insight_storage.get_aggregate(
+            "COUNT", "*",
+            criteria={"namespace": namespace, "table_name": table_name},
+            group_by=["severity"]
+        ) or []
+        self.health_storage.save(build_table_health(namespace, table_name, run, severity_counts, metrics))
\ No newline at end of file
@@ -0,0 +1,89 @@
+from typing import Any, Dict, List, Optional
+
+from pyiceberg.table import Table
+
+from app.insights.rules import planned_data_files, AVERAGE_SMALL_FILES_IN_BYTES
+from app.models import InsightRun, TableHealth
+
+# Weight of one active insight of each severity in TableHealth.health_score.
+SEVERITY_WEIGHTS = {"critical": 100, "warning": 10, "info": 1}
+
+# Sort keys accepted by the health ranking endpoint, mapped to indexed columns.
+HEALTH_SORT_COLUMNS = {
+    "worst": "health_score",
+    "small_files": "small_file_count",
+    "snapshots": "snapshot_count",
+    "size": "total_size_bytes",
+}
+
+
+def _summary_int(summary, key: str) -> Optional[int]:
+    try:
+        return int(summary[key])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def collect_table_metrics(table: Table, previous: Optional[TableHealth] = None) -> Dict[str, Any]:
+    """
+    Collects cheap table metrics from metadata: the current snapshot summary and the
+    snapshot log. The small-file count needs per-file sizes, so it is only refreshed
+    when a rule already planned the table's files during this run.
+    """
+    metrics: Dict[str, Any] = {
+        "snapshot_id": None,
+        "snapshot_count": len(table.metadata.snapshots),
+        "file_count": 0,
+        "small_file_count": previous.small_file_count if previous else 0,
+        "total_size_bytes": 0,
+        "avg_file_size_bytes": 0.0,
+        "record_count": 0,
+    }
+
+    snapshot = table.current_snapshot()
+    if snapshot is not None:
+        metrics["snapshot_id"] = str(snapshot.snapshot_id)
+        summary = snapshot.summary or {}
+        metrics["file_count"] = _summary_int(summary, "total-data-files") or 0
+        metrics["total_size_bytes"] = _summary_int(summary, "total-files-size") or 0
+        metrics["record_count"] = _summary_int(summary, "total-records") or 0
+
+    tasks = planned_data_files(table)
+    if tasks is not None:
+        sizes = [task.file.file_size_in_bytes for task in tasks]
+        metrics["file_count"] = len(sizes)
+        metrics["total_size_bytes"] = sum(sizes)
+        metrics["small_file_count"] = sum(1 for size in sizes if size < AVERAGE_SMALL_FILES_IN_BYTES)
+
+    if metrics["file_count"]:
+        metrics["avg_file_size_bytes"] = metrics["total_size_bytes"] / metrics["file_count"]
+    return metrics
+
+
+def build_table_health(
+    namespace: str,
+    table_name: str,
+    run: InsightRun,
+    severity_counts: List[Dict[str, Any]],
+    metrics: Dict[str, Any]
+) -> TableHealth:
+    """Builds the scorecard row from the table's active insight counts per severity."""
+    counts = {"critical": 0, "warning": 0, "info": 0}
+    score = 0
+    for row in severity_counts:
+        severity = str(row["severity"]).lower()
+        if severity in counts:
+            counts[severity] += row["result"]
+        score += SEVERITY_WEIGHTS.get(severity, 1) * row["result"]
+
+    return TableHealth(
+        namespace=namespace,
+        table_name=table_name,
+        critical_count=counts["critical"],
+        warning_count=counts["warning"],
+        info_count=counts["info"],
+        health_score=score,
+        last_run_id=run.id,
+        last_run_timestamp=run.run_timestamp,
+        **metrics
+    )
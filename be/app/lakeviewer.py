@@ -2,38 +2,60 @@ from pyiceberg import catalog
 from pyiceberg.catalog import Identifier
 from pyiceberg.expressions import AlwaysTrue
 from typing import List, Union
-import json, os, time, re
-import pandas as pd
+import json, os, time, threading
 import pyarrow as pa
-import daft
-from daft.context import get_context
-import humanize
 import pyarrow.compute as pc
-import numpy as np
-import google.auth
-from google.auth.transport.requests import Request
-from sqlglot import parse_one
 import logging
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from app.metrics import CATALOG_CALL_SECONDS
+from app.tracing import span
+from app.exceptions import QueryCancelled
 
+@contextmanager
+def _catalog_call(operation: str):
+    with span(f"catalog.{operation}"), CATALOG_CALL_SECONDS.labels(operation).time():
+        yield
+
+
+# daft, pandas, sqlglot, humanize and google.auth are imported in the methods that use
+# them, and the catalog is loaded on first use, so that importing this module (as the
+# worker, scheduler and tests do) stays cheap.
 class LakeView():
     
     def __init__(self):        
+        self._catalog = None
+        self._catalog_lock = threading.Lock()
+        self.namespace_options = []        
+
+    @property
+    def catalog(self):
+        if self._catalog is None:
+            with self._catalog_lock:
+                if self._catalog is None:
+                    self._catalog = self._load_catalog()
+        return self._catalog
+
+    @catalog.setter
+    def catalog(self, value):
+        self._catalog = value
+
+    def _load_catalog(self):
         service_account_file = os.environ.get("GCP_KEYFILE")
         if service_account_file and service_account_file != "":
             scopes = ["https://www.googleapis.com/auth/cloud-platform"]
             access_token = get_gcp_access_token(service_account_file, scopes)                        
-            self.catalog = catalog.load_catalog("default", 
+            return catalog.load_catalog("default", 
                 **{
                     "gcs.oauth2.token-expires-at": time.mktime(access_token.expiry.timetuple()) * 1000,
                     "gcs.oauth2.token": access_token.token,        
                 })
-        else:
-            self.catalog = catalog.load_catalog("default")        
-        self.namespace_options = []        
+        return catalog.load_catalog("default")
 
     def get_namespaces(_self, include_nested: bool = True):
         result = []
-        namespaces = _self.catalog.list_namespaces()
+        with _catalog_call("list_namespaces"):
+            namespaces = _self.catalog.list_namespaces()
         for ns in namespaces:
             new_ns = ns if len(ns) == 1 else ns[:1]
             result.append(new_ns)
@@ -45,7 +67,8 @@ class LakeView():
 
     def _get_nested_namespaces(self, namespace: Union[str, Identifier] = (), level: int = 1) -> List[Identifier]:
         result = []
-        namespaces = self.catalog.list_namespaces(namespace)
+        with _catalog_call("list_namespaces"):
+            namespaces = self.catalog.list_namespaces(namespace)
         for ns in namespaces:
             #pyiceberg includes the initial level at the beginning for nested namespaces
             fixed_ns = ns if (len(ns) == (level + 1)) else ns[level:]
@@ -54,14 +77,16 @@ class LakeView():
         return result
     
     def get_tables(self, namespace: str):
-        tables = self.catalog.list_tables(namespace)
+        with _catalog_call("list_tables"):
+            tables = self.catalog.list_tables(namespace)
         tables.sort()
         return tables
     
     def get_all_table_names(self, namespaces: List[str]):
         all_tables = {}
         for namespace in namespaces:
-            tabs = self.catalog.list_tables(namespace)            
+            with _catalog_call("list_tables"):
+                tabs = self.catalog.list_tables(namespace)
             ns_tab = []
             for tab in tabs:
                 ns_tab.append(tab[-1])
@@ -70,80 +95,230 @@ class LakeView():
         return all_tables
 
     def load_table(self, table_id: str):
-        table = self.catalog.load_table(table_id)
+        with _catalog_call("load_table"):
+            table = self.catalog.load_table(table_id)
         return table
     
-    def get_partition_data(self, table):        
-        #table = self.catalog.load_table(table_id)
-        pa_partitions = table.inspect.partitions()        
-        if pa_partitions.num_rows >1:
-            pa_partitions = pa_partitions.sort_by([('partition', 'ascending')])
-        return pa_partitions.to_pandas()
+    def get_partition_data(self, table, sort_by='partition', descending=False):
+        """The partitions of `table` sorted by `sort_by` (see app.partition_stats.SORT_KEYS)."""
+        from app.partition_stats import sorted_partitions
+        return sorted_partitions(table, sort_by, descending)[0]
+
+    def get_partition_page(self, table, offset, limit, sort_by='partition', descending=False):
+        """Partitions [offset, offset + limit) of get_partition_data, and the number of partitions."""
+        from app.partition_stats import sorted_partitions
+        return sorted_partitions(table, sort_by, descending, offset, limit)
+
+    def get_partition_stats(self, table):
+        """Min, median, p99 and max partition size and record count, and a histogram of sizes."""
+        from app.partition_stats import partition_stats
+        return partition_stats(table)
 
-    def get_snapshot_data(self, table):        
+    def get_snapshot_data(self, table, since=None, until=None, operations=None, columns=None):
+        """
+        The snapshots of `table`, newest first: those committed from `since` up to `until`
+        with one of `operations`, if given, and only `columns` (and id), if given.
+        """
         if not table.metadata.current_snapshot_id:
-            return []
-        pa_snaps = table.inspect.snapshots().sort_by([('committed_at', 'descending')])
-        df = pa_snaps.to_pandas()
-        df['committed_at'] = df['committed_at'].apply(lambda x: x.strftime('%Y-%m-%d %H:%M:%S'))
-        df['id'] = df.index
-        return df
-    
-    def get_data_change(self, table):        
-        #table = self.catalog.load_table(table_id)
-        pa_snaps = table.inspect.snapshots().sort_by([('committed_at', 'ascending')])
-        pa_snaps = pa_snaps.drop(['snapshot_id', 'parent_id', 'operation', 'manifest_list'])
-        df = pa_snaps.to_pandas()
-        df['committed_at'] = df['committed_at'].apply(lambda x: x.strftime('%Y-%m-%d %H:%M:%S'))              
-        df_summ = pd.DataFrame(df['summary'].apply(self.flatten_tuples).tolist())
-        df_flattened = pd.concat([df.drop('summary', axis=1), df_summ], axis=1)        
-        return df_flattened                
-
-    def get_sample_data(self, table, sql, limit=50):
-        df = daft.read_iceberg(table)         
+            return pa.table({})
+        return self._snapshot_columns(self._snapshots(table, since, until, operations), columns)
+
+    def get_snapshot_page(self, table, limit, cursor=None, since=None, until=None, operations=None, columns=None):
+        """
+        The `limit` snapshots of get_snapshot_data after `cursor` (from the newest when None),
+        and the cursor of the next page (None on the last page). A cursor names the last
+        snapshot of a page, so pages do not shift as new snapshots are committed.
+        """
+        if not table.metadata.current_snapshot_id:
+            return pa.table({}), None
+        pa_snaps = self._snapshots(table, since, until, operations)
+        if cursor:
+            try:
+                committed_ms, snapshot_id = (int(part) for part in cursor.split(':'))
+            except ValueError:
+                raise ValueError(f"{cursor} is not a valid snapshot cursor")
+            committed_at = pa.scalar(committed_ms, pa_snaps.schema.field('committed_at').type)
+            pa_snaps = pa_snaps.filter(pc.or_(
+                pc.less(pa_snaps['committed_at'], committed_at),
+                pc.and_(pc.equal(pa_snaps['committed_at'], committed_at), pc.less(pa_snaps['snapshot_id'], snapshot_id))
+            ))
+        next_cursor = None
+        if pa_snaps.num_rows > limit:
+            pa_snaps = pa_snaps.slice(0, limit)
+            last = pa_snaps.slice(limit - 1)
+            committed_ms = last['committed_at'].cast(pa.int64())[0].as_py()
+            next_cursor = f"{committed_ms}:{last['snapshot_id'][0].as_py()}"
+        return self._snapshot_columns(pa_snaps, columns), next_cursor
+
+    def _snapshots(self, table, since, until, operations):
+        """The filtered snapshots of `table` in page order, numbered by an id column."""
+        from app.data_change import committed_between, snapshots
+        # Cached per metadata location, already in page order.
+        pa_snaps = committed_between(snapshots(table), since, until)
+        if operations:
+            pa_snaps = pa_snaps.filter(pc.is_in(pa_snaps['operation'], pa.array(operations, pa.string())))
+        return pa_snaps.append_column('id', pa.array(range(pa_snaps.num_rows), pa.int64()))
+
+    def _snapshot_columns(self, pa_snaps, columns):
+        if columns:
+            unknown = [c for c in columns if c not in pa_snaps.schema.names]
+            if unknown:
+                raise ValueError(f"Unknown snapshot columns: {', '.join(unknown)}")
+            pa_snaps = pa_snaps.select(list(dict.fromkeys([*columns, 'id'])))
+        if 'committed_at' in pa_snaps.schema.names:
+            pa_snaps = pa_snaps.set_column(
+                pa_snaps.schema.get_field_index('committed_at'), 'committed_at', self._to_seconds(pa_snaps['committed_at'])
+            )
+        return pa_snaps
+
+    def get_data_change(self, table, since=None, until=None, bucket=None):
+        """The snapshot summaries of `table` as columns, oldest first (see app.data_change)."""
+        from app.data_change import data_change
+        changes = data_change(table, since, until, bucket)
+        return changes.set_column(0, 'committed_at', self._to_seconds(changes['committed_at']))
+
+    def get_sample_table(self, table, sql, limit=50, cancelled: threading.Event = None, budget=None,
+                         random_sample: bool = False, partition: dict = None, admit=None) -> pa.Table:
+        """
+        Sample rows of `table`, or the result of a sample query on it, as Arrow.
+        `admit`, if given, is called with the query's cost (see app.query_cost) and returns
+        a context manager held while the query reads, e.g. app.query_pool.QueryPool.admit.
+        """
+        import daft
+        from app.partition_filter import partition_selection
+
+        # Only the manifests and files of the selected partition are read.
+        selection = partition_selection(table, partition) if partition else None
         if sql:
-            logging.info(f"SQL is {sql}")
-            #sql = parse_one(sql).from_("df").sql()
-            namespace = table.catalog.namespace_to_string(table.catalog.namespace_from(table.name()))
-            if 'default.' in namespace:
-                namespace = namespace.replace('default.', '')
-            table_name = table.catalog.table_name_from(table.name())            
-            sql = sql.replace(f"{namespace}.{table_name}", "df")
-            logging.info(sql)
-            sql_ = parse_one(sql)
-            df = daft.sql(sql)
-            curr_snapshot = table.current_snapshot()
-            if (
-                curr_snapshot
-                and "total-data-files" in curr_snapshot.summary.keys()
-                and int(curr_snapshot.summary["total-data-files"]) > 200
-            ):
-                optimized_plan = df._builder.optimize(get_context().daft_execution_config)._builder.repr_ascii(
-                    simple=False
-                )
-                logging.info(optimized_plan)
-                num_tasks = int(self.extract_num_scan_tasks(optimized_plan))
-                logging.info(f"Num tasks {num_tasks}")
-                if num_tasks > 300:
-                    raise Exception(
-                        f"Number of scan tasks ({num_tasks}) too high. Optimize the query or use a distributed query tool."
-                    )            
-        else:        
-            df = df.limit(limit)
-        paT = df.to_arrow()
-        paT = self.convertTimestamp(paT)
-        return paT.to_pandas()
+            from app.query_cost import QueryBudget
+            pushdown, cost = self._plan_sample_query(table, sql, selection)
+            (budget or QueryBudget()).enforce(cost)
+            with admit(cost) if admit is not None else nullcontext():
+                if cost.planned and cost.scan.limit is not None:
+                    # Only the matching files, and the columns the query uses, are read, up to the limit.
+                    df = daft.sql(pushdown.sql, df=daft.from_arrow(self._scan(cost, cancelled)))
+                elif cost.planned:
+                    df = daft.sql(pushdown.sql, df=self._stream(cost, cancelled))
+                else:
+                    df = daft.sql(pushdown.sql, df=daft.read_iceberg(table))
+                paT = self._collect(df, cancelled)
+        else:
+            from app.sampling import sample_batches
+            # Reads only as many manifests and files as the sample needs, not a planned scan.
+            batches = self._drain(sample_batches(table, limit, random_sample, selection), cancelled)
+            paT = self._to_table(batches, table.schema())
+        return paT
+
+    def estimate_sample_query(self, table, sql, budget=None, partition: dict = None):
+        """Dry run of a sample query: what it would read, and whether that fits `budget`."""
+        from app.partition_filter import partition_selection
+        from app.query_cost import QueryBudget, cost_report
+        selection = partition_selection(table, partition) if partition else None
+        pushdown, cost = self._plan_sample_query(table, sql, selection)
+        return cost_report(pushdown, cost, budget or QueryBudget())
+
+    @staticmethod
+    def _plan_sample_query(table, sql, selection=None):
+        from app.query_cost import estimate_scan
+        from app.sql_pushdown import analyze_sample_sql
+
+        logging.info(f"SQL is {sql}")
+        pushdown = analyze_sample_sql(sql, table.name(), table.schema())
+        cost = estimate_scan(table, pushdown, selection)
+        logging.info(f"{pushdown} {cost}")
+        return pushdown, cost
+
+    @staticmethod
+    def _collect(df, cancelled: threading.Event = None) -> pa.Table:
+        """
+        Executes a daft query. With a `cancelled` event the results are streamed and the
+        event is checked between batches; once it is set the stream is closed, which stops
+        daft from scheduling further work, and QueryCancelled is raised.
+        """
+        if cancelled is None:
+            return df.to_arrow()
+        batches = LakeView._drain(df.to_arrow_iter(), cancelled)
+        return pa.Table.from_batches(batches, schema=df.schema().to_pyarrow_schema())
+
+    @staticmethod
+    def _scan(cost, cancelled: threading.Event = None) -> pa.Table:
+        """
+        Reads the files of a planned sample query scan (see app.query_cost) with its row
+        filter, projection and limit, so manifests and files that cannot match are skipped.
+        Used when the scan has a limit, which bounds the rows held.
+        """
+        from pyiceberg.io.pyarrow import ArrowScan
+
+        scan = cost.scan
+        projection = scan.projection()
+        stream = ArrowScan(
+            scan.table_metadata, scan.io, projection, scan.row_filter, scan.case_sensitive, scan.limit
+        ).to_record_batches(cost.tasks)
+        return LakeView._to_table(LakeView._drain(stream, cancelled), projection)
+
+    @staticmethod
+    def _stream(cost, cancelled: threading.Event = None):
+        """
+        A daft DataFrame over the files of a planned sample query scan, each file read with
+        the scan's row filter and projection as daft pulls from it, so a query that reads
+        many rows, e.g. an aggregate, streams them instead of holding the whole scan.
+        """
+        import daft
+        from daft.io._generator import read_generator
+        from daft.recordbatch import RecordBatch
+        from pyiceberg.io.pyarrow import ArrowScan, schema_to_pyarrow
+
+        scan = cost.scan
+        projection = scan.projection()
+        schema = schema_to_pyarrow(projection, include_field_ids=False)
+        reader = ArrowScan(scan.table_metadata, scan.io, projection, scan.row_filter, scan.case_sensitive)
+
+        def read(task):
+            for batch in reader.to_record_batches([task]):
+                if cancelled is not None and cancelled.is_set():
+                    return  # _collect raises QueryCancelled
+                yield RecordBatch.from_arrow_record_batches([batch], schema)
+
+        return read_generator([partial(read, task) for task in cost.tasks], daft.Schema.from_pyarrow_schema(schema))
+
+    @staticmethod
+    def _to_table(batches: list, schema) -> pa.Table:
+        """Combines record batches read from the table, or an empty table of `schema` when there are none."""
+        from pyiceberg.io.pyarrow import schema_to_pyarrow
+
+        if not batches:
+            return schema_to_pyarrow(schema, include_field_ids=False).empty_table()
+        return pa.Table.from_batches(batches)
+
+    @staticmethod
+    def _drain(stream, cancelled: threading.Event = None) -> list:
+        """Consumes a stream of record batches, closing it early if `cancelled` is set."""
+        batches = []
+        try:
+            for batch in stream:
+                if cancelled is not None and cancelled.is_set():
+                    raise QueryCancelled("Query cancelled")
+                batches.append(batch)
+        finally:
+            stream.close()
+        if cancelled is not None and cancelled.is_set():
+            raise QueryCancelled("Query cancelled")
+        return batches
        
 
     def get_schema(self, table):
         #table = self.catalog.load_table(table_id)
-        df = pd.DataFrame(columns=["Field_id", "Field", "DataType", "Required", "Comments"])
-        for field in table.schema().fields:
-            df2 = pd.DataFrame([[str(field.field_id), str(field.name), str(field.field_type), str(field.required), field.doc]], columns=["Field_id", "Field", "DataType", "Required", "Comments"])
-            df = pd.concat([df, df2])
-        return df
+        fields = table.schema().fields
+        return pa.table({
+            "Field_id": pa.array([str(field.field_id) for field in fields], pa.string()),
+            "Field": pa.array([str(field.name) for field in fields], pa.string()),
+            "DataType": pa.array([str(field.field_type) for field in fields], pa.string()),
+            "Required": pa.array([str(field.required) for field in fields], pa.string()),
+            "Comments": pa.array([field.doc for field in fields], pa.string()),
+        })
     
     def get_summary(self, table):
+        import humanize
         #table = self.catalog.load_table(table_id)
         ret = {}         
         ret['Location'] = table.location()
@@ -203,46 +378,18 @@ class LakeView():
         return sorts
 
     def get_row_filter(self, partition, table):
+        """The pyiceberg row filter of a partition record, e.g. {"dt_day": "2024-01-02"} (see app.partition_filter)."""
+        from app.partition_filter import partition_selection
         if partition is None or len(partition) == 0:
             return AlwaysTrue()
-        fields = table.spec().fields
-        use_fields = []
-        for field in fields:
-            source_field = table.schema().find_column_name(field.source_id)            
-            if 'bucket' in str(field.transform):
-                continue  #filter by bucket not yet supported, add others not supported too
-            use_fields.append(source_field)
-        expression=''
-        idx = 0
-        for key, value in partition.items():
-            if key in use_fields:
-                if idx == 0 or len(use_fields)==1:
-                    expression = f"{key}=='{value}'"
-                else:
-                    expression += f" and {key}=='{value}'"
-            idx += 1
-        return expression if len(expression) > 0 else AlwaysTrue()
-        
-    # Flattening the tuple array into separate columns
-    def flatten_tuples(self, row):    
-        return {k: v for k, v in row}
-    
-    def convertTimestamp(self, paT: pa.Table):
-        for col in paT.schema.names:
-            if isinstance(paT.schema.field(col).type, pa.TimestampType):
-                paT = paT.set_column(
-                    paT.schema.get_field_index(col),
-                    col,
-                    pc.strftime(paT[col], format="%Y-%m-%d %H:%M:%S")
-                )
-        return paT
-    
-    def extract_num_scan_tasks(self, log_output):
-        match = re.search(r'\* Num Scan Tasks\s*=\s*(\d+)', log_output)
-        if match:
-            return int(match.group(1))
-        return None
+        return partition_selection(table, partition).row_filter
         
+    @staticmethod
+    def _to_seconds(timestamps):
+        """Formats a timestamp column to the second, e.g. snapshot commit times."""
+        seconds = timestamps.cast(pa.timestamp('s', timestamps.type.tz), safe=False)
+        return pc.strftime(seconds, format='%Y-%m-%d %H:%M:%S')
+
 def get_gcp_access_token(service_account_file, scopes):
     """
     Retrieves an access token from Google Cloud Platform using service account credentials.
@@ -252,6 +399,9 @@ def get_gcp_access_token(service_account_file, scopes):
     Returns:
         The access token as a string.
     """
+    import google.auth
+    from google.auth.transport.requests import Request
+
     credentials, name = google.auth.load_credentials_from_file(
         service_account_file, scopes=scopes)
 
@@ -0,0 +1,140 @@
+"""
+Prometheus metrics shared by the API, worker and scheduler processes.
+
+The API serves the default registry at /metrics; the worker and scheduler expose it
+on a side port when LV_METRICS_PORT is set (0, the default, disables it).
+"""
+import logging
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from app.utils import get_int_env
+
+logger = logging.getLogger(__name__)
+
+METRICS_PORT = get_int_env("LV_METRICS_PORT", 0)
+
+# Catalog and rule calls range from milliseconds to minutes on large tables.
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "lakevision_http_request_duration_seconds",
+    "API request latency by route template.",
+    ["method", "route", "status"],
+    buckets=SLOW_BUCKETS,
+)
+CATALOG_CALL_SECONDS = Histogram(
+    "lakevision_catalog_call_duration_seconds",
+    "Latency of Iceberg catalog calls made by LakeView.",
+    ["operation"],
+    buckets=SLOW_BUCKETS,
+)
+RULE_SECONDS = Histogram(
+    "lakevision_rule_duration_seconds",
+    "Execution time of a single insight rule on a table.",
+    ["rule"],
+    buckets=SLOW_BUCKETS,
+)
+QUEUE_DEPTH = Gauge(
+    "lakevision_queue_pending_tasks",
+    "Pending tasks in the queue, as last seen by this worker.",
+)
+QUEUE_BACKLOG = Gauge(
+    "lakevision_queue_backlog_tasks",
+    "Pending plus running tasks, measured by the API at scrape time; the worker autoscaling signal.",
+)
+QUEUE_OLDEST_PENDING_SECONDS = Gauge(
+    "lakevision_queue_oldest_pending_age_seconds",
+    "Age of the oldest pending task, measured by the API at scrape time (0 when the queue is empty).",
+)
+WORKER_IDLE_POLL_SECONDS = Gauge(
+    "lakevision_worker_idle_poll_seconds",
+    "Current wait between queue polls of this worker (0 while it is busy).",
+)
+QUEUE_CLAIM_SECONDS = Histogram(
+    "lakevision_queue_claim_duration_seconds",
+    "Time spent claiming a task from the queue, by outcome (claimed, empty, lost, error).",
+    ["outcome"],
+    buckets=FAST_BUCKETS,
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "lakevision_queue_wait_seconds",
+    "Time a task waited in the queue before a worker claimed it.",
+    buckets=SLOW_BUCKETS,
+)
+QUEUE_LOST_RACES = Counter(
+    "lakevision_queue_lost_races_total",
+    "Claims lost to another worker between selecting and locking a task.",
+)
+PAGE_CACHE_REQUESTS = Counter(
+    "lakevision_page_cache_requests_total",
+    "Lookups of loaded tables in the per-page session cache, by result (hit, miss).",
+    ["result"],
+)
+DATA_CHANGE_CACHE_REQUESTS = Counter(
+    "lakevision_data_change_cache_requests_total",
+    "Lookups of exploded snapshot histories in the Data Change cache, by result (hit, miss).",
+    ["result"],
+)
+PARTITION_CACHE_REQUESTS = Counter(
+    "lakevision_partition_cache_requests_total",
+    "Lookups of per-snapshot partition statistics in the partition cache, by result (hit, miss).",
+    ["result"],
+)
+DB_QUERY_SECONDS = Histogram(
+    "lakevision_db_query_duration_seconds",
+    "Health database statement latency by statement type.",
+    ["statement"],
+    buckets=FAST_BUCKETS,
+)
+
+QUERY_POOL_RUNNING = Gauge(
+    "lakevision_query_pool_running",
+    "Sample queries running on the query pool.",
+)
+QUERY_POOL_WAITING = Gauge(
+    "lakevision_query_pool_waiting",
+    "Sample queries waiting for a slot on the query pool.",
+)
+QUERY_POOL_ADMISSIONS = Counter(
+    "lakevision_query_pool_admissions_total",
+    "Sample queries by admission outcome (admitted, rejected, timed_out).",
+    ["outcome"],
+)
+QUERY_POOL_WAIT_SECONDS = Histogram(
+    "lakevision_query_pool_wait_seconds",
+    "Time a sample query waited for a slot on the query pool.",
+    buckets=SLOW_BUCKETS,
+)
+
+
+def statement_type(statement: str) -> str:
+    """The leading SQL keyword (select, insert, ...), to keep label cardinality bounded."""
+    words = statement.lstrip().split(None, 1)
+    return words[0].lower() if words else "unknown"
+
+
+def instrument_engine(engine) -> None:
+    """Times every statement executed through `engine`."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("lv_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("lv_query_start")
+        if starts:
+            DB_QUERY_SECONDS.labels(statement_type(statement)).observe(time.perf_counter() - starts.pop())
+
+
+def start_metrics_server(port: int = METRICS_PORT) -> bool:
+    """Serves the registry on a side port for processes without an HTTP server."""
+    if port <= 0:
+        return False
+    start_http_server(port)
+    logger.info(f"Serving metrics on port {port}")
+    return True
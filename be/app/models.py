@@ -25,6 +25,7 @@ class TaskStatus(str, Enum):
     RUNNING = "running"
     COMPLETE = "complete"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 @dataclass
 class QueuedTask:
@@ -46,6 +47,14 @@ class QueuedTask:
 
     error_details: Optional[str] = field(default=None)
     worker_id: Optional[str] = field(default=None)
+    # W3C traceparent of the span that enqueued the task (see app.tracing)
+    trace_context: Optional[str] = field(default=None)
+
+    __indexes__ = [
+        ("status", "priority", "created_at"),
+        ("batch_id", "status"),
+        ("status", "finished_at"),
+    ]
 
 @dataclass
 class BackgroundJob:
@@ -54,16 +63,17 @@ class BackgroundJob:
     namespace: str
     table_name: Optional[str]
     rules_requested: List[str]
-    status: Literal["pending", "running", "complete", "failed"]
+    status: Literal["pending", "running", "complete", "failed", "cancelled"]
     details: Optional[str] = None
     started_at: Optional[datetime] = None
     finished_at: Optional[datetime] = None
     results: Optional[List[Dict[str, Any]]] = None # This can be populated on retrieval
     created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    trace_context: Optional[str] = None
 
 class StatusResponse(BaseModel):
     run_id: str
-    status: Literal["pending", "running", "complete", "failed"]
+    status: Literal["pending", "running", "complete", "failed", "cancelled"]
     table_name: str | None = None
     namespace: str
     details: str | None = None
@@ -71,6 +81,7 @@ class StatusResponse(BaseModel):
     started_at: datetime | None = None
     finished_at: datetime | None = None
     results: List[Dict[str, Any]] | None = None
+    trace_context: str | None = None
 
     @classmethod
     def from_job(cls, job: BackgroundJob) -> "StatusResponse":
@@ -150,6 +161,8 @@ class InsightRecord:
     id: str = field(default_factory=lambda: str(uuid.uuid4()))
     timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
 
+    __indexes__ = [("run_id",)]
+
 @dataclass
 class InsightRun:
     namespace: str
@@ -158,6 +171,18 @@ class InsightRun:
     run_type: Literal['manual', 'auto']
     id: str = field(default_factory=lambda: str(uuid.uuid4()))
     run_timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    # Resource accounting; None on runs recorded before it existed
+    load_time_ms: Optional[float] = None
+    duration_ms: Optional[float] = None  # Table load plus all rules
+    files_scanned: Optional[int] = None
+    manifest_bytes_read: Optional[int] = None
+    peak_memory_bytes: Optional[int] = None  # Python heap peak, only when LV_TRACK_RUN_MEMORY is on
+    # "complete", or why the run stopped early ("timed_out", "memory_exceeded"); see app.insights.budget
+    outcome: Optional[str] = None
+    # Requested rules that did not finish, whether the run timed out or was cancelled
+    timed_out_rules: Optional[List[str]] = None
+
+    __indexes__ = [("namespace", "table_name", "run_timestamp"), ("run_timestamp",), ("duration_ms",)]
 
 class InsightRunOut(BaseModel):
     id: str
@@ -167,10 +192,126 @@ class InsightRunOut(BaseModel):
     run_type: Literal['manual', 'auto']
     run_timestamp: datetime
     results: List[InsightRecord]
+    load_time_ms: Optional[float] = None
+    duration_ms: Optional[float] = None
+    files_scanned: Optional[int] = None
+    manifest_bytes_read: Optional[int] = None
+    peak_memory_bytes: Optional[int] = None
+    outcome: Optional[str] = None
+    timed_out_rules: Optional[List[str]] = None
+
+    class Config:
+        from_attributes = True
+
+@dataclass
+class RuleExecution:
+    """Wall time of one rule in one insight run."""
+    run_id: str
+    namespace: str
+    table_name: str
+    rule_id: str
+    duration_ms: float
+    run_timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+
+    __indexes__ = [("run_id",), ("rule_id", "duration_ms"), ("namespace", "rule_id")]
+
+class RunTimingOut(BaseModel):
+    id: str
+    namespace: str
+    table_name: str
+    run_type: str
+    run_timestamp: datetime
+    load_time_ms: Optional[float] = None
+    duration_ms: Optional[float] = None
+    files_scanned: Optional[int] = None
+    manifest_bytes_read: Optional[int] = None
+    peak_memory_bytes: Optional[int] = None
+    outcome: Optional[str] = None
+    rule_timings: Dict[str, float] = Field(default_factory=dict)
 
     class Config:
         from_attributes = True
 
+class RulePerformanceOut(BaseModel):
+    rule_id: str
+    executions: int
+    avg_ms: float
+    max_ms: float
+    total_ms: float
+
+class PriorityDepthOut(BaseModel):
+    priority: int
+    pending: int
+
+class BatchProgressOut(BaseModel):
+    batch_id: str
+    pending: int
+    running: int
+    finished_in_window: int
+    eta_seconds: Optional[float] = None
+
+class WorkerThroughputOut(BaseModel):
+    worker_id: str
+    completed: int
+    failed: int
+    tasks_per_minute: float
+
+class QueueStatsOut(BaseModel):
+    window_minutes: int
+    pending: int
+    running: int
+    oldest_pending_age_seconds: Optional[float] = None
+    depth_by_priority: List[PriorityDepthOut]
+    batches: List[BatchProgressOut]
+    completed_in_window: int
+    failed_in_window: int
+    throughput_per_minute: float
+    p50_duration_seconds: Optional[float] = None
+    p95_duration_seconds: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    workers: List[WorkerThroughputOut]
+
+class QueryCostOut(BaseModel):
+    files: int
+    bytes: int
+    rows: int
+    estimated_seconds: float
+    planned: bool  # False when estimated from the snapshot summary rather than a pruned scan plan
+    scan_tasks: Optional[int] = None  # of an unplanned query, which its file budget counts
+    row_filter: str
+    selected_fields: List[str]
+    limit: Optional[int] = None
+    max_files: int
+    max_bytes: int
+    within_budget: bool
+    budget_message: Optional[str] = None
+
+class ResultPageOut(BaseModel):
+    handle: str  # of the stored result, for fetching further pages
+    total_rows: int
+    offset: int
+    columns: List[str]
+    rows: List[Dict[str, Any]]
+
+class PartitionSummaryOut(BaseModel):
+    min: int
+    median: int
+    p99: int
+    max: int
+
+class PartitionSizeBucketOut(BaseModel):
+    # Partitions of at least `from` and less than `to` bytes.
+    from_: int = Field(alias="from")
+    to: int
+    partitions: int
+
+class PartitionStatsOut(BaseModel):
+    partitions: int
+    size: Optional[PartitionSummaryOut] = None  # None for tables without partitions
+    records: Optional[PartitionSummaryOut] = None
+    size_histogram: List[PartitionSizeBucketOut]
+
 @dataclass
 class ActiveInsight:
     table_name: str
@@ -184,6 +325,76 @@ class ActiveInsight:
     last_seen_run_id: str
     last_seen_timestamp: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
 
+    __indexes__ = [("namespace", "table_name", "code"), ("code", "namespace", "severity")]
+
+@dataclass
+class InsightRollup:
+    """Daily per-rule occurrence counts kept for runs removed by retention."""
+    day: str  # YYYY-MM-DD (UTC)
+    namespace: str
+    table_name: str
+    code: str
+    occurrences: int = 0
+    id: str = ""
+
+    __indexes__ = [("namespace", "table_name", "day")]
+
+    def __post_init__(self):
+        if not self.id:
+            self.id = f"{self.day}|{self.namespace}|{self.table_name}|{self.code}"
+
+@dataclass
+class TableHealth:
+    """Denormalized per-table health row, refreshed by every insight run of the table."""
+    namespace: str
+    table_name: str
+    critical_count: int = 0
+    warning_count: int = 0
+    info_count: int = 0
+    health_score: int = 0  # Severity-weighted insight count, higher is worse
+    last_run_id: Optional[str] = None
+    last_run_timestamp: Optional[datetime] = None
+    snapshot_id: Optional[str] = None  # Snapshot evaluated by the last run
+    snapshot_count: int = 0
+    file_count: int = 0
+    small_file_count: int = 0
+    total_size_bytes: int = 0
+    avg_file_size_bytes: float = 0.0
+    record_count: int = 0
+    id: str = ""
+
+    __indexes__ = [
+        ("health_score",),
+        ("small_file_count",),
+        ("snapshot_count",),
+        ("total_size_bytes",),
+        ("namespace", "health_score"),
+    ]
+
+    def __post_init__(self):
+        if not self.id:
+            self.id = f"{self.namespace}.{self.table_name}"
+
+class TableHealthOut(BaseModel):
+    namespace: str
+    table_name: str
+    critical_count: int
+    warning_count: int
+    info_count: int
+    health_score: int
+    last_run_id: Optional[str] = None
+    last_run_timestamp: Optional[datetime] = None
+    snapshot_id: Optional[str] = None
+    snapshot_count: int
+    file_count: int
+    small_file_count: int
+    total_size_bytes: int
+    avg_file_size_bytes: float
+    record_count: int
+
+    class Config:
+        from_attributes = True
+
 class InsightOccurrence(BaseModel):
     table_name: str
     severity: str
@@ -194,7 +405,9 @@ class RuleSummaryOut(BaseModel):
     code: str
     namespace: str
     suggested_action: str
-    occurrences: List[InsightOccurrence]
+    total_occurrences: int = 0
+    severity_counts: Dict[str, int] = Field(default_factory=dict)
+    occurrences: List[InsightOccurrence]  # Top-N only; page the rest via the occurrences endpoint
 
 class ColumnFilter(BaseModel):
     name: str
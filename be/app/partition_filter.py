@@ -0,0 +1,173 @@
+"""
+Partition selections for sampling one partition of a table.
+
+A partition is selected by its record as the Partitions tab shows it (the
+`partition` column of `inspect.partitions()`), e.g. {"ts_day": "2024-01-02",
+"id_bucket": 3}. Values are the transformed partition values: dates for day
+partitions, hours/months/years since the epoch for hour/month/year partitions,
+bucket numbers, truncated values.
+
+The selection is resolved against the table's partition specs and turned into
+- a row filter on the source columns, which pyiceberg projects onto the partitions
+  to prune manifests and data files while planning: `col = v` for identity, the
+  time range the partition covers for year/month/day/hour, `[v, v + W)` for a
+  truncated number and a prefix match for a truncated string;
+- checks of the partition values of manifests and data files, for the transforms
+  that have no row filter (bucket, void) and to skip data files that only overlap
+  the partition's range.
+"""
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Callable, Dict, FrozenSet, Optional
+
+from pyiceberg.expressions import (
+    AlwaysTrue, And, BooleanExpression, EqualTo, GreaterThanOrEqual, IsNull, LessThan, StartsWith
+)
+from pyiceberg.expressions.literals import literal
+from pyiceberg.expressions.visitors import manifest_evaluator
+from pyiceberg.partitioning import PartitionField, PartitionSpec
+from pyiceberg.schema import Schema
+from pyiceberg.transforms import (
+    DayTransform, HourTransform, IdentityTransform, MonthTransform, TruncateTransform, YearTransform
+)
+from pyiceberg.types import (
+    DateType, IcebergType, IntegerType, LongType, StringType, TimestampNanoType, TimestamptzNanoType
+)
+
+_EPOCH = date(1970, 1, 1)
+_MICROS_PER_HOUR = 3_600_000_000
+_MICROS_PER_DAY = 24 * _MICROS_PER_HOUR
+_TIME_TRANSFORMS = (YearTransform, MonthTransform, DayTransform, HourTransform)
+
+
+@dataclass
+class PartitionSelection:
+    """One partition of a table: a row filter plus checks on manifests and data files."""
+    specs: Dict[int, PartitionSpec]
+    schema: Schema
+    values: Dict[str, Any]  # partition field name -> partition value, in its internal representation
+    row_filter: BooleanExpression = field(default_factory=AlwaysTrue)
+    filtered: FrozenSet[str] = frozenset()  # the fields `row_filter` covers
+    _evaluators: Dict[int, Callable] = field(default_factory=dict, init=False, repr=False)
+
+    def _in_spec(self, spec: PartitionSpec) -> Optional[Dict[str, int]]:
+        """
+        Positions of the selected fields in `spec`, or None when its files cannot hold the
+        partition: a selected field is missing from it and the row filter cannot stand in.
+        """
+        positions = {f.name: pos for pos, f in enumerate(spec.fields)}
+        if any(name not in positions and name not in self.filtered for name in self.values):
+            return None
+        return {name: positions[name] for name in self.values if name in positions}
+
+    def matches(self, data_file) -> bool:
+        """True when `data_file` may hold rows of the partition."""
+        positions = self._in_spec(self.specs[data_file.spec_id])
+        if positions is None:
+            return False
+        return all(data_file.partition[pos] == self.values[name] for name, pos in positions.items())
+
+    def manifest_matches(self, manifest) -> bool:
+        """True when `manifest` may list data files of the partition, going by its partition summaries."""
+        spec_id = manifest.partition_spec_id
+        if spec_id not in self._evaluators:
+            self._evaluators[spec_id] = self._manifest_evaluator(self.specs[spec_id])
+        return self._evaluators[spec_id](manifest)
+
+    def _manifest_evaluator(self, spec: PartitionSpec) -> Callable:
+        positions = self._in_spec(spec)
+        if positions is None:
+            return lambda manifest: False
+        if not positions:
+            return lambda manifest: True
+        predicates = [
+            IsNull(name) if self.values[name] is None else EqualTo(name, self.values[name]) for name in positions
+        ]
+        partition_filter = And(*predicates) if len(predicates) > 1 else predicates[0]
+        return manifest_evaluator(spec, self.schema, partition_filter)
+
+
+def partition_selection(table, partition: Dict[str, Any]) -> PartitionSelection:
+    """
+    Resolves a partition record against the partition specs of `table`. Raises
+    ValueError for fields that are not partition fields and values of the wrong type.
+    """
+    specs = table.specs()
+    schema = table.schema()
+    fields: Dict[str, PartitionField] = {}
+    for spec_id in sorted(specs):  # the newest spec defines a name reused across specs
+        for partition_field in specs[spec_id].fields:
+            fields[partition_field.name] = partition_field
+
+    values, predicates, filtered = {}, [], set()
+    for name, value in partition.items():
+        partition_field = fields.get(name)
+        if partition_field is None:
+            raise ValueError(f"{name} is not a partition field of {'.'.join(table.name())}")
+        try:
+            source = schema.find_field(partition_field.source_id)
+        except ValueError:
+            raise ValueError(f"The source column of partition field {name} was dropped") from None
+        values[name] = _partition_value(name, value, partition_field.transform.result_type(source.field_type))
+        source_name = schema.find_column_name(partition_field.source_id)
+        predicate = _source_filter(partition_field.transform, source_name, source.field_type, values[name])
+        if predicate is not None:
+            predicates.append(predicate)
+            filtered.add(name)
+
+    row_filter = And(*predicates) if len(predicates) > 1 else (predicates[0] if predicates else AlwaysTrue())
+    return PartitionSelection(specs, schema, values, row_filter, frozenset(filtered))
+
+
+def _partition_value(name: str, value: Any, result_type: IcebergType) -> Any:
+    if value is None:
+        return None
+    try:
+        return literal(value).to(result_type).value
+    except Exception:
+        raise ValueError(f"{value!r} is not a valid value of partition field {name} ({result_type})") from None
+
+
+def _source_filter(transform, source_name: str, source_type: IcebergType, value: Any) -> Optional[BooleanExpression]:
+    """The rows of the source column that fall in the partition, or None when that cannot be expressed."""
+    if isinstance(transform, IdentityTransform):
+        return IsNull(source_name) if value is None else EqualTo(source_name, value)
+    if value is None:
+        # Time and truncate transforms map only nulls to null; bucket and void have no row filter.
+        return IsNull(source_name) if isinstance(transform, (*_TIME_TRANSFORMS, TruncateTransform)) else None
+    if isinstance(transform, _TIME_TRANSFORMS):
+        lower, upper = _time_range(transform, value, source_type)
+        return And(GreaterThanOrEqual(source_name, lower), LessThan(source_name, upper))
+    if isinstance(transform, TruncateTransform):
+        if isinstance(source_type, (IntegerType, LongType)):
+            return And(GreaterThanOrEqual(source_name, value), LessThan(source_name, value + transform.width))
+        if isinstance(source_type, StringType):
+            # A value shorter than the width was not truncated: it is the whole string.
+            return EqualTo(source_name, value) if len(value) < transform.width else StartsWith(source_name, value)
+    return None
+
+
+def _time_range(transform, value: int, source_type: IcebergType):
+    """[lower, upper) of a time partition, in the representation of the source column."""
+    if isinstance(transform, HourTransform):
+        lower, upper = value * _MICROS_PER_HOUR, (value + 1) * _MICROS_PER_HOUR
+    else:
+        first_day, next_day = _day_range(transform, value)
+        if isinstance(source_type, DateType):
+            return first_day, next_day
+        lower, upper = first_day * _MICROS_PER_DAY, next_day * _MICROS_PER_DAY
+    if isinstance(source_type, (TimestampNanoType, TimestamptzNanoType)):
+        return lower * 1000, upper * 1000
+    return lower, upper
+
+
+def _day_range(transform, value: int):
+    """[first day, next day) of a year, month or day partition, in days since the epoch."""
+    if isinstance(transform, YearTransform):
+        start, end = date(1970 + value, 1, 1), date(1971 + value, 1, 1)
+    elif isinstance(transform, MonthTransform):
+        start = date(1970 + value // 12, value % 12 + 1, 1)
+        end = date(1970 + (value + 1) // 12, (value + 1) % 12 + 1, 1)
+    else:
+        return value, value + 1
+    return (start - _EPOCH).days, (end - _EPOCH).days
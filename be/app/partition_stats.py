@@ -0,0 +1,117 @@
+"""
+Partition statistics of a table, computed with Arrow and cached per snapshot.
+
+Table.inspect.partitions() reads every manifest of the current snapshot, so its result
+is kept for up to LV_PARTITION_CACHE_ENTRIES snapshots (a new commit is a new snapshot,
+so entries never go stale), together with the sort orders pages were served in. The
+partitions can be paged through sorted by partition, record count, size or last update,
+and summarized: the min, median, p99 and max partition size and record count, and a
+histogram of partition sizes in power-of-two buckets.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.metrics import PARTITION_CACHE_REQUESTS
+from app.utils import get_int_env
+
+PARTITION_CACHE_ENTRIES = get_int_env("LV_PARTITION_CACHE_ENTRIES", 16)
+
+# Sort keys of the partitions endpoint -> columns of Table.inspect.partitions().
+SORT_KEYS = {
+    "partition": "partition",
+    "records": "record_count",
+    "files": "file_count",
+    "size": "total_data_file_size_in_bytes",
+    "last_updated": "last_updated_at",
+}
+QUANTILES = {"median": 0.5, "p99": 0.99}
+
+
+@dataclass(eq=False)
+class _Partitions:
+    table: pa.Table
+    # (sort key, descending) -> row indices; kept for every order served, there are few.
+    order: Dict[Tuple[str, bool], pa.Array] = field(default_factory=dict)
+
+
+_cache: "OrderedDict[tuple, _Partitions]" = OrderedDict()  # least recently used first
+_cache_lock = threading.Lock()
+
+
+def sorted_partitions(table, sort_by: str = "partition", descending: bool = False,
+                      offset: int = 0, limit: Optional[int] = None) -> Tuple[pa.Table, int]:
+    """
+    Partitions [offset, offset + limit) of `table` sorted by `sort_by` (one of SORT_KEYS),
+    all from `offset` when `limit` is None, and the number of partitions.
+    """
+    if sort_by not in SORT_KEYS:
+        raise ValueError(f"sort_by must be one of {', '.join(SORT_KEYS)}")
+    partitions = _partitions(table)
+    key = (sort_by, descending)
+    indices = partitions.order.get(key)
+    if indices is None:
+        column = SORT_KEYS[sort_by]
+        if column in partitions.table.column_names:
+            indices = pc.sort_indices(
+                partitions.table, sort_keys=[(column, "descending" if descending else "ascending")]
+            )
+        else:
+            # Unpartitioned tables have no partition column, and a single row.
+            indices = pa.array(range(partitions.table.num_rows), pa.int64())
+        partitions.order[key] = indices
+    return partitions.table.take(indices.slice(offset, limit)), partitions.table.num_rows
+
+
+def partition_stats(table) -> dict:
+    """Summary statistics of the partition sizes and record counts of `table`."""
+    partitions = _partitions(table).table
+    sizes = partitions["total_data_file_size_in_bytes"]
+    return {
+        "partitions": partitions.num_rows,
+        "size": _summary(sizes),
+        "records": _summary(partitions["record_count"]),
+        "size_histogram": _histogram(sizes),
+    }
+
+
+def _summary(values: pa.ChunkedArray) -> Optional[dict]:
+    if len(values) == 0:
+        return None
+    min_max = pc.min_max(values).as_py()
+    quantiles = pc.quantile(values, q=list(QUANTILES.values()), interpolation="nearest").to_pylist()
+    return {"min": min_max["min"], **dict(zip(QUANTILES, quantiles)), "max": min_max["max"]}
+
+
+def _histogram(sizes: pa.ChunkedArray) -> list:
+    """Partition counts per power-of-two size bucket [2^k, 2^(k+1)) bytes; [0, 1) for empty partitions."""
+    if len(sizes) == 0:
+        return []
+    exponents = pc.floor(pc.log2(pc.max_element_wise(sizes, 1).cast(pa.float64()))).cast(pa.int64())
+    exponents = pc.if_else(pc.equal(sizes, 0), -1, exponents)
+    counts = pc.value_counts(exponents).to_pylist()
+    return [
+        {"from": 0 if c["values"] < 0 else 2 ** c["values"], "to": 2 ** (c["values"] + 1), "partitions": c["counts"]}
+        for c in sorted(counts, key=lambda c: c["values"])
+    ]
+
+
+def _partitions(table) -> _Partitions:
+    snapshot = table.current_snapshot()
+    key = (table.metadata.table_uuid, snapshot.snapshot_id if snapshot else None)
+    with _cache_lock:
+        if key in _cache:
+            PARTITION_CACHE_REQUESTS.labels("hit").inc()
+            _cache.move_to_end(key)
+            return _cache[key]
+    PARTITION_CACHE_REQUESTS.labels("miss").inc()
+    partitions = _Partitions(table.inspect.partitions())
+    with _cache_lock:
+        _cache[key] = partitions
+        while len(_cache) > PARTITION_CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return partitions
@@ -0,0 +1,243 @@
+"""
+Request-scoped sampling profiler for the table endpoints.
+
+A request is profiled when it carries `X-Profile-Token` matching LV_PROFILING_TOKEN
+(profiling is off when the token is unset). Its threads are sampled every
+LV_PROFILE_INTERVAL_MS and the samples are stored as a speedscope profile
+(https://www.speedscope.app) under LV_PROFILE_DIR; the response carries its id in
+`X-Profile-Id` and GET /api/profiles/{id} returns it.
+
+Independently, requests running longer than LV_SLOW_REQUEST_SECONDS start being
+sampled when they cross the threshold, and their hottest stacks are logged.
+
+FastAPI runs sync handlers and sync dependencies on threadpool threads, possibly
+different ones, so the functions to cover are wrapped with `profiled`, which
+registers the calling thread with the request's session (found via a contextvar,
+which the threadpool copies) for the duration of the call.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from app.utils import get_float_env, get_int_env
+
+logger = logging.getLogger(__name__)
+
+PROFILING_TOKEN = os.getenv("LV_PROFILING_TOKEN", "")
+PROFILE_DIR = os.getenv("LV_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "lakevision-profiles")
+PROFILE_INTERVAL_SECONDS = max(1, get_int_env("LV_PROFILE_INTERVAL_MS", 5)) / 1000
+SLOW_REQUEST_SECONDS = get_float_env("LV_SLOW_REQUEST_SECONDS", 0.0)
+SLOW_REQUEST_TOP_STACKS = 5
+MAX_STACK_DEPTH = 256
+
+Frame = Tuple[str, str, int]  # (function, file, line)
+
+_current_session: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar(
+    "lv_profile_session", default=None
+)
+
+
+class ProfileSession:
+    """Samples the stacks of the threads registered while a request runs."""
+
+    def __init__(self, name: str, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.name = name
+        self.interval = interval
+        self.samples: List[Tuple[Frame, ...]] = []
+        self._threads: Set[int] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started_at = time.perf_counter()
+
+    def register_thread(self, thread_id: int) -> None:
+        with self._lock:
+            self._threads.add(thread_id)
+
+    def unregister_thread(self, thread_id: int) -> None:
+        with self._lock:
+            self._threads.discard(thread_id)
+
+    def start_sampling(self) -> None:
+        if self._sampler is not None or self._stop.is_set():
+            return
+        self._sampler = threading.Thread(target=self._run, name=f"lv-profiler-{self.name}", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started_at
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                thread_ids = list(self._threads)
+            frames = sys._current_frames()
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.samples.append(_stack_of(frame))
+
+    def top_stacks(self, limit: int = SLOW_REQUEST_TOP_STACKS) -> List[Tuple[str, int]]:
+        """The most frequent stacks, collapsed to `file:function:line;...` strings."""
+        collapsed = Counter(
+            ";".join(f"{os.path.basename(file)}:{func}:{line}" for func, file, line in stack)
+            for stack in self.samples
+        )
+        return collapsed.most_common(limit)
+
+    def to_speedscope(self) -> dict:
+        """Serializes the samples as a speedscope 'sampled' profile, root frame first."""
+        frame_index: Dict[Frame, int] = {}
+        frames = []
+        samples = []
+        for stack in self.samples:
+            indexes = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                indexes.append(frame_index[frame])
+            samples.append(indexes)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "lakevision",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": len(samples) * self.interval,
+                "samples": samples,
+                "weights": [self.interval] * len(samples),
+            }],
+        }
+
+
+def _stack_of(frame) -> Tuple[Frame, ...]:
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, frame.f_lineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def profiled(func):
+    """
+    Registers the calling thread with the current request's profile session, if any.
+    Coroutine functions are returned as they are: they run on the event loop, and the
+    sync functions they hand to the threadpool are wrapped instead.
+    """
+    if inspect.iscoroutinefunction(func):
+        return func
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        session = _current_session.get()
+        if session is None:
+            return func(*args, **kwargs)
+        thread_id = threading.get_ident()
+        session.register_thread(thread_id)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            session.unregister_thread(thread_id)
+    return wrapper
+
+
+def profiling_authorized(request: Request) -> bool:
+    token = request.headers.get("X-Profile-Token", "")
+    return bool(PROFILING_TOKEN) and bool(token) and secrets.compare_digest(token, PROFILING_TOKEN)
+
+
+def _profile_path(profile_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}.speedscope.json")
+
+
+def save_profile(session: ProfileSession) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = uuid.uuid4().hex
+    with open(_profile_path(profile_id), "w") as f:
+        json.dump(session.to_speedscope(), f)
+    return profile_id
+
+
+def load_profile(profile_id: str) -> Optional[dict]:
+    # Ids are uuid4 hex; anything else never names a profile file.
+    if len(profile_id) != 32 or not all(c in "0123456789abcdef" for c in profile_id):
+        return None
+    try:
+        with open(_profile_path(profile_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class ProfiledRoute(APIRoute):
+    """
+    Route class for routers whose handlers should be profilable: wraps the endpoint
+    with `profiled` and runs each request under a ProfileSession when profiling was
+    requested or the slow-request log is enabled.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, profiled(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            explicit = profiling_authorized(request)
+            if not explicit and SLOW_REQUEST_SECONDS <= 0:
+                return await handler(request)
+
+            session = ProfileSession(f"{request.method} {self.path}")
+            token = _current_session.set(session)
+            timer = None
+            if explicit:
+                session.start_sampling()
+            else:
+                timer = threading.Timer(SLOW_REQUEST_SECONDS, session.start_sampling)
+                timer.daemon = True
+                timer.start()
+            try:
+                response = await handler(request)
+            finally:
+                _current_session.reset(token)
+                if timer is not None:
+                    timer.cancel()
+                session.stop()
+
+            if explicit:
+                response.headers["X-Profile-Id"] = save_profile(session)
+            elif session.elapsed >= SLOW_REQUEST_SECONDS and session.samples:
+                stacks = "\n".join(f"  {count:5d} {stack}" for stack, count in session.top_stacks())
+                logger.warning(
+                    f"Slow request {request.method} {request.url.path} took {session.elapsed:.2f}s; "
+                    f"top stacks sampled after {SLOW_REQUEST_SECONDS}s:\n{stacks}"
+                )
+            return response
+
+        return route_handler
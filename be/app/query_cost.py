@@ -0,0 +1,184 @@
+"""
+Cost estimates and budgets for sample queries.
+
+Before a sample query runs, the files, bytes and rows it will read are estimated
+from its pruned scan plan (see app.sql_pushdown): the data files left after
+manifest and metrics pruning, sized by the columns the query selects and, for a
+query without a row filter, cut off once a pushed LIMIT is covered. Queries that prune
+nothing would plan every manifest just to be estimated, so they are costed from the
+snapshot summary instead. daft merges small files into scan tasks, so the file budget
+counts the scan tasks (the bytes over DAFT_SCAN_TASK_BYTES, at most one per file), as
+the scan task guard it replaces did, rather than the files.
+A query over one partition (see app.partition_filter) is always planned, with the
+partition's row filter added and the files of other partitions dropped.
+The expected runtime is derived from LV_QUERY_SECONDS_PER_FILE and
+LV_QUERY_SCAN_BYTES_PER_SECOND.
+
+Queries over LV_QUERY_MAX_FILES files (scan tasks) or LV_QUERY_MAX_BYTES bytes are refused
+(0 disables a limit). LV_QUERY_USER_BUDGETS overrides them per user, as JSON:
+    {"analyst@example.com": {"max_files": 2000, "max_bytes": 10737418240}}
+"""
+import json
+import logging
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from pyiceberg.expressions import AlwaysTrue, And
+
+from app.exceptions import QueryBudgetExceeded
+from app.models import QueryCostOut
+from app.partition_filter import PartitionSelection
+from app.sql_pushdown import ScanPushdown
+from app.utils import get_float_env, get_int_env
+
+logger = logging.getLogger(__name__)
+
+QUERY_MAX_FILES = get_int_env("LV_QUERY_MAX_FILES", 300)
+QUERY_MAX_BYTES = get_int_env("LV_QUERY_MAX_BYTES", 0)
+QUERY_USER_BUDGETS = os.getenv("LV_QUERY_USER_BUDGETS", "")
+SECONDS_PER_FILE = get_float_env("LV_QUERY_SECONDS_PER_FILE", 0.05)
+SCAN_BYTES_PER_SECOND = get_float_env("LV_QUERY_SCAN_BYTES_PER_SECOND", 100 * 1024 * 1024)
+# daft's default scan_tasks_min_size_bytes: read_iceberg merges smaller files into tasks of this size.
+DAFT_SCAN_TASK_BYTES = 96 * 1024 * 1024
+
+
+@dataclass
+class QueryCost:
+    """What a sample query is expected to read, with the scan plan it was derived from."""
+    files: int
+    bytes: int
+    rows: int
+    planned: bool  # from the pruned scan plan; False when taken from the snapshot summary
+    scan: Optional[object] = field(default=None, repr=False)
+    tasks: Optional[List[object]] = field(default=None, repr=False)
+    # The scan tasks daft would merge the files into.
+    scan_tasks: Optional[int] = None
+
+    @property
+    def estimated_seconds(self) -> float:
+        return self.files * SECONDS_PER_FILE + self.bytes / SCAN_BYTES_PER_SECOND
+
+
+@dataclass
+class QueryBudget:
+    max_files: int = QUERY_MAX_FILES
+    max_bytes: int = QUERY_MAX_BYTES
+
+    def violation(self, cost: QueryCost) -> Optional[str]:
+        """Why the query is over budget, or None when it is within it."""
+        if self.max_files and cost.scan_tasks is not None:
+            if cost.scan_tasks > self.max_files:
+                return (f"The query would read {cost.files} files in about {cost.scan_tasks} "
+                        f"scan tasks, more than the limit of {self.max_files}. "
+                        f"Filter on partition columns or use a distributed query tool.")
+        elif self.max_files and cost.files > self.max_files:
+            return (f"The query would read {cost.files} files, more than the limit of {self.max_files}. "
+                    f"Filter on partition columns or use a distributed query tool.")
+        if self.max_bytes and cost.bytes > self.max_bytes:
+            return (f"The query would read {cost.bytes} bytes, more than the limit of {self.max_bytes}. "
+                    f"Select fewer columns, filter on partition columns or use a distributed query tool.")
+        return None
+
+    def enforce(self, cost: QueryCost) -> None:
+        reason = self.violation(cost)
+        if reason is not None:
+            raise QueryBudgetExceeded(reason)
+
+
+def _user_budgets() -> Dict[str, dict]:
+    if not QUERY_USER_BUDGETS:
+        return {}
+    try:
+        return json.loads(QUERY_USER_BUDGETS)
+    except ValueError:
+        logger.error("LV_QUERY_USER_BUDGETS is not valid JSON; using the default query budget")
+        return {}
+
+
+def budget_for(user: Optional[str]) -> QueryBudget:
+    """The query budget of `user` (None when authentication is off)."""
+    override = _user_budgets().get(user, {}) if user else {}
+    return QueryBudget(
+        max_files=int(override.get("max_files", QUERY_MAX_FILES)),
+        max_bytes=int(override.get("max_bytes", QUERY_MAX_BYTES))
+    )
+
+
+def _summary_int(summary, key: str) -> int:
+    return int(summary[key]) if summary is not None and key in summary.keys() else 0
+
+
+def _bytes_read(task, field_ids: Optional[Set[int]]) -> int:
+    data_file = task.file
+    size = data_file.file_size_in_bytes
+    if field_ids and data_file.column_sizes:
+        projected = sum(s for field_id, s in data_file.column_sizes.items() if field_id in field_ids)
+        size = projected or size
+    return size + sum(delete_file.file_size_in_bytes for delete_file in task.delete_files)
+
+
+def _scan_tasks(files: int, size: int) -> int:
+    return min(files, max(1, math.ceil(size / DAFT_SCAN_TASK_BYTES))) if files else 0
+
+
+def estimate_scan(table, pushdown: ScanPushdown, selection: Optional[PartitionSelection] = None) -> QueryCost:
+    """
+    Estimates the scan of `table` that the sample query described by `pushdown` needs,
+    restricted to the `selection` partition if given.
+    """
+    if not pushdown.prunes and selection is None:
+        snapshot = table.current_snapshot()
+        summary = snapshot.summary if snapshot is not None else None
+        files = _summary_int(summary, "total-data-files")
+        size = _summary_int(summary, "total-files-size")
+        return QueryCost(
+            files=files,
+            bytes=size,
+            rows=_summary_int(summary, "total-records"),
+            planned=False,
+            scan_tasks=_scan_tasks(files, size)
+        )
+
+    row_filter = pushdown.row_filter if selection is None else And(pushdown.row_filter, selection.row_filter)
+    scan = table.scan(row_filter=row_filter, selected_fields=pushdown.selected_fields, limit=pushdown.limit)
+    tasks = [task for task in scan.plan_files() if selection is None or selection.matches(task.file)]
+    field_ids = None
+    if pushdown.selected_fields != ("*",):
+        field_ids = {f.field_id for f in scan.projection().fields}
+
+    # Record counts are before the row filter, so they only tell when a LIMIT is covered
+    # if there is none; with a filter, the read may go through every planned file.
+    limit = pushdown.limit if pushdown.row_filter == AlwaysTrue() else None
+    files = size = rows = 0
+    for task in tasks:
+        if limit is not None and rows >= limit:
+            tasks = tasks[:files]  # the read stops once the limit is covered
+            break
+        files += 1
+        size += _bytes_read(task, field_ids)
+        rows += task.file.record_count
+    if pushdown.limit is not None:
+        rows = min(rows, pushdown.limit)
+    return QueryCost(files=files, bytes=size, rows=rows, planned=True, scan=scan, tasks=tasks,
+                     scan_tasks=_scan_tasks(files, size))
+
+
+def cost_report(pushdown: ScanPushdown, cost: QueryCost, budget: QueryBudget) -> QueryCostOut:
+    reason = budget.violation(cost)
+    return QueryCostOut(
+        files=cost.files,
+        bytes=cost.bytes,
+        rows=cost.rows,
+        estimated_seconds=round(cost.estimated_seconds, 3),
+        planned=cost.planned,
+        scan_tasks=cost.scan_tasks,
+        row_filter=str(cost.scan.row_filter if cost.scan is not None else pushdown.row_filter),
+        selected_fields=list(pushdown.selected_fields),
+        limit=pushdown.limit,
+        max_files=budget.max_files,
+        max_bytes=budget.max_bytes,
+        within_budget=reason is None,
+        budget_message=reason
+    )
@@ -0,0 +1,196 @@
+"""
+A dedicated, bounded pool for sample queries.
+
+Sample queries used to run on the threadpool FastAPI shares with every sync
+endpoint, so a few heavy queries could hold all of its threads and stall cheap
+metadata endpoints (/schema, /summary) for everyone. They now run on their own
+LV_QUERY_CONCURRENCY threads, and queries beyond that wait in a queue:
+
+- waiting queries are started round-robin across users, so a burst of queries from
+  one user does not hold up everyone else's;
+- at most LV_QUERY_QUEUE_SIZE queries wait; further queries, and queries still
+  waiting after LV_QUERY_QUEUE_TIMEOUT_SECONDS, are refused with 429 and Retry-After;
+- with LV_QUERY_MEMORY_MB set, a query holds part of that memory while it reads:
+  LV_QUERY_MEMORY_FACTOR times the bytes its cost estimate (see app.query_cost) says it
+  scans, as Parquet decompresses to several times its size in Arrow. A query waits
+  for its share to be free, and is refused when it would need more than all of it.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Optional
+
+from app.exceptions import QueryBudgetExceeded, QueryPoolSaturated
+from app.metrics import QUERY_POOL_ADMISSIONS, QUERY_POOL_RUNNING, QUERY_POOL_WAIT_SECONDS, QUERY_POOL_WAITING
+from app.utils import get_float_env, get_int_env
+
+QUERY_CONCURRENCY = max(1, get_int_env("LV_QUERY_CONCURRENCY", 4))
+QUERY_QUEUE_SIZE = get_int_env("LV_QUERY_QUEUE_SIZE", 32)
+QUERY_QUEUE_TIMEOUT_SECONDS = get_float_env("LV_QUERY_QUEUE_TIMEOUT_SECONDS", 30.0)
+QUERY_MEMORY_MB = get_int_env("LV_QUERY_MEMORY_MB", 0)
+QUERY_MEMORY_FACTOR = get_float_env("LV_QUERY_MEMORY_FACTOR", 4.0)
+# Suggested to refused clients; a sample query usually takes a few seconds.
+RETRY_AFTER_SECONDS = 5
+
+_MB = 1024 * 1024
+
+
+@dataclass(eq=False)
+class _Ticket:
+    """A query waiting for, or holding, a slot on the pool."""
+    user: str
+    fn: Callable[[], Any]
+    loop: asyncio.AbstractEventLoop
+    started: asyncio.Future
+    done: asyncio.Future
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+def _settle(ticket: _Ticket, future: asyncio.Future, result: Any = None, error: BaseException = None) -> None:
+    """Resolves one of the ticket's futures from a pool thread."""
+    def settle():
+        if future.done():
+            return  # the request went away
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    try:
+        ticket.loop.call_soon_threadsafe(settle)
+    except RuntimeError:
+        pass  # the event loop of the request is closed
+
+
+class QueryPool:
+    def __init__(self, concurrency: int = QUERY_CONCURRENCY, queue_size: int = QUERY_QUEUE_SIZE,
+                 queue_timeout: float = QUERY_QUEUE_TIMEOUT_SECONDS, memory_mb: int = QUERY_MEMORY_MB):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.memory_bytes = memory_mb * _MB
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="query")
+        self._lock = threading.Condition()
+        # User -> their waiting queries; the first user is the next to start one.
+        self._waiting: Dict[str, Deque[_Ticket]] = OrderedDict()
+        self._running = 0
+        self._memory_in_use = 0
+
+    async def run(self, user: Optional[str], fn: Callable[[], Any]) -> Any:
+        """
+        Runs `fn` on the pool once it is admitted and returns its result. Raises
+        QueryPoolSaturated when the queue is full or the query waited too long.
+        """
+        loop = asyncio.get_running_loop()
+        # Like run_in_threadpool, run `fn` in the request's context (profiling, tracing).
+        fn = functools.partial(contextvars.copy_context().run, fn)
+        ticket = _Ticket(user or "", fn, loop, loop.create_future(), loop.create_future())
+        with self._lock:
+            if self._running >= self.concurrency and self._waiting_count() >= self.queue_size:
+                QUERY_POOL_ADMISSIONS.labels("rejected").inc()
+                raise QueryPoolSaturated(
+                    f"{self._running} queries are running and {self._waiting_count()} are waiting; "
+                    f"try again shortly.", RETRY_AFTER_SECONDS
+                )
+            self._waiting.setdefault(ticket.user, deque()).append(ticket)
+            self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.started), self.queue_timeout or None)
+        except asyncio.TimeoutError:
+            if self._withdraw(ticket):
+                QUERY_POOL_ADMISSIONS.labels("timed_out").inc()
+                raise QueryPoolSaturated(
+                    f"The query waited {self.queue_timeout:g}s for one of {self.concurrency} query slots; "
+                    f"try again shortly.", RETRY_AFTER_SECONDS
+                )
+            # It started while the wait timed out.
+        except asyncio.CancelledError:
+            self._withdraw(ticket)
+            raise
+        return await ticket.done
+
+    @contextmanager
+    def admit(self, cost):
+        """
+        Holds the memory a query with `cost` (an app.query_cost.QueryCost) needs while the
+        block runs, waiting for it to be free. Does nothing when LV_QUERY_MEMORY_MB is 0.
+        """
+        needed = int(cost.bytes * QUERY_MEMORY_FACTOR)
+        if not self.memory_bytes or needed <= 0:
+            yield
+            return
+        if needed > self.memory_bytes:
+            raise QueryBudgetExceeded(
+                f"The query would need about {needed // _MB} MB of memory, more than the "
+                f"{self.memory_bytes // _MB} MB sample queries may use. "
+                f"Select fewer columns or filter on partition columns."
+            )
+        deadline = time.monotonic() + self.queue_timeout if self.queue_timeout > 0 else None
+        with self._lock:
+            while self._memory_in_use + needed > self.memory_bytes:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    QUERY_POOL_ADMISSIONS.labels("timed_out").inc()
+                    raise QueryPoolSaturated(
+                        f"The query waited {self.queue_timeout:g}s for {needed // _MB} MB of query memory; "
+                        f"try again shortly.", RETRY_AFTER_SECONDS
+                    )
+                self._lock.wait(remaining)
+            self._memory_in_use += needed
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._memory_in_use -= needed
+                self._lock.notify_all()
+
+    def _waiting_count(self) -> int:
+        return sum(len(tickets) for tickets in self._waiting.values())
+
+    def _dispatch(self) -> None:
+        """Starts waiting queries while slots are free, taking users in turn. Called with the lock held."""
+        while self._running < self.concurrency and self._waiting:
+            user, tickets = self._waiting.popitem(last=False)
+            ticket = tickets.popleft()
+            if tickets:
+                self._waiting[user] = tickets  # back of the line for their next query
+            self._running += 1
+            QUERY_POOL_ADMISSIONS.labels("admitted").inc()
+            QUERY_POOL_WAIT_SECONDS.observe(time.monotonic() - ticket.queued_at)
+            _settle(ticket, ticket.started)
+            self._executor.submit(self._execute, ticket)
+        QUERY_POOL_RUNNING.set(self._running)
+        QUERY_POOL_WAITING.set(self._waiting_count())
+
+    def _withdraw(self, ticket: _Ticket) -> bool:
+        """Takes a query that has not started off the queue. False when it already started."""
+        with self._lock:
+            tickets = self._waiting.get(ticket.user)
+            if tickets is None or ticket not in tickets:
+                return False
+            tickets.remove(ticket)
+            if not tickets:
+                del self._waiting[ticket.user]
+            QUERY_POOL_WAITING.set(self._waiting_count())
+            return True
+
+    def _execute(self, ticket: _Ticket) -> None:
+        try:
+            result = ticket.fn()
+        except BaseException as e:
+            _settle(ticket, ticket.done, error=e)
+        else:
+            _settle(ticket, ticket.done, result)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._dispatch()
+
+
+query_pool = QueryPool()
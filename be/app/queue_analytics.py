@@ -0,0 +1,199 @@
+"""
+Queue and batch analytics over the `queuedtasks` table.
+
+Everything is computed from aggregates that the task indexes serve: pending depth
+from (status, priority, created_at), active batches from (batch_id, status) and the
+recent-completion window from (status, finished_at). Only the task durations of the
+window are fetched row by row, to compute their percentiles.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from statistics import quantiles
+from typing import Any, Dict, List, Optional
+
+from app.models import (
+    QueuedTask, TaskStatus, QueueStatsOut, PriorityDepthOut, BatchProgressOut, WorkerThroughputOut
+)
+from app.metrics import QUEUE_BACKLOG, QUEUE_OLDEST_PENDING_SECONDS
+from app.storage import StorageInterface
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = [TaskStatus.COMPLETE.value, TaskStatus.FAILED.value]
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _percentile(sorted_values: List[float], pct: int) -> Optional[float]:
+    if not sorted_values:
+        return None
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    return quantiles(sorted_values, n=100, method="inclusive")[pct - 1]
+
+
+def _eta(remaining: int, per_second: float) -> Optional[float]:
+    if remaining == 0:
+        return 0.0
+    return remaining / per_second if per_second > 0 else None
+
+
+def get_queue_stats(
+    task_storage: StorageInterface[QueuedTask],
+    window_minutes: int = 15,
+    now: Optional[datetime] = None
+) -> QueueStatsOut:
+    """
+    Reports queue depth, the age of the oldest pending task, throughput and task
+    duration percentiles over the last `window_minutes`, per-worker throughput, and an
+    estimated time to completion per active batch at that batch's recent rate (the
+    whole queue's rate for batches with nothing finished yet).
+    """
+    now = now or datetime.now(timezone.utc)
+    since = now - timedelta(minutes=window_minutes)
+    window_seconds = window_minutes * 60
+    table = task_storage.table_name
+
+    depth_by_priority = [
+        PriorityDepthOut(priority=row["priority"], pending=row["result"])
+        for row in task_storage.get_aggregate(
+            "COUNT", "*", {"status": TaskStatus.PENDING.value}, group_by=["priority"]
+        )
+    ]
+    depth_by_priority.sort(key=lambda d: d.priority)
+    oldest_pending = _as_datetime(
+        task_storage.get_aggregate("MIN", "created_at", {"status": TaskStatus.PENDING.value})
+    )
+
+    active: Dict[str, Dict[str, int]] = defaultdict(lambda: {"pending": 0, "running": 0})
+    for row in task_storage.get_aggregate(
+        "COUNT", "*", {"status": [TaskStatus.PENDING.value, TaskStatus.RUNNING.value]},
+        group_by=["batch_id", "status"]
+    ):
+        active[row["batch_id"]][str(row["status"])] = row["result"]
+
+    finished_params = {"complete": FINISHED_STATUSES[0], "failed": FINISHED_STATUSES[1], "since": since}
+    finished_filter = f'FROM "{table}" WHERE "status" IN (:complete, :failed) AND "finished_at" >= :since'
+    workers: Dict[str, Dict[str, int]] = defaultdict(lambda: {"completed": 0, "failed": 0})
+    for row in task_storage.execute_raw_select_query(
+        f'SELECT "worker_id", "status", COUNT(*) AS tasks {finished_filter} GROUP BY "worker_id", "status"',
+        finished_params
+    ):
+        key = "completed" if row["status"] == TaskStatus.COMPLETE.value else "failed"
+        workers[row["worker_id"] or "unknown"][key] += row["tasks"]
+
+    finished_by_batch: Dict[str, int] = {}
+    if active:
+        batch_ids = list(active)
+        names = [f"batch_{i}" for i in range(len(batch_ids))]
+        batch_rows = task_storage.execute_raw_select_query(
+            f'SELECT "batch_id", COUNT(*) AS tasks {finished_filter} '
+            f'AND "batch_id" IN ({", ".join(":" + n for n in names)}) GROUP BY "batch_id"',
+            {**finished_params, **dict(zip(names, batch_ids))}
+        )
+        finished_by_batch = {row["batch_id"]: row["tasks"] for row in batch_rows}
+
+    durations = []
+    for row in task_storage.execute_raw_select_query(
+        f'SELECT "started_at", "finished_at" {finished_filter} AND "started_at" IS NOT NULL', finished_params
+    ):
+        started, finished = _as_datetime(row["started_at"]), _as_datetime(row["finished_at"])
+        durations.append(max(0.0, (finished - started).total_seconds()))
+    durations.sort()
+
+    completed = sum(w["completed"] for w in workers.values())
+    failed = sum(w["failed"] for w in workers.values())
+    queue_rate = (completed + failed) / window_seconds
+
+    batches = []
+    for batch_id, counts in active.items():
+        finished_in_window = finished_by_batch.get(batch_id, 0)
+        rate = finished_in_window / window_seconds if finished_in_window else queue_rate
+        batches.append(BatchProgressOut(
+            batch_id=batch_id,
+            pending=counts["pending"],
+            running=counts["running"],
+            finished_in_window=finished_in_window,
+            eta_seconds=_eta(counts["pending"] + counts["running"], rate)
+        ))
+    batches.sort(key=lambda b: b.pending + b.running, reverse=True)
+
+    pending = sum(d.pending for d in depth_by_priority)
+    running = sum(b.running for b in batches)
+    return QueueStatsOut(
+        window_minutes=window_minutes,
+        pending=pending,
+        running=running,
+        oldest_pending_age_seconds=(now - oldest_pending).total_seconds() if oldest_pending else None,
+        depth_by_priority=depth_by_priority,
+        batches=batches,
+        completed_in_window=completed,
+        failed_in_window=failed,
+        throughput_per_minute=(completed + failed) / window_minutes,
+        p50_duration_seconds=_percentile(durations, 50),
+        p95_duration_seconds=_percentile(durations, 95),
+        eta_seconds=_eta(pending + running, queue_rate),
+        workers=sorted(
+            (
+                WorkerThroughputOut(
+                    worker_id=worker_id,
+                    completed=counts["completed"],
+                    failed=counts["failed"],
+                    tasks_per_minute=(counts["completed"] + counts["failed"]) / window_minutes
+                )
+                for worker_id, counts in workers.items()
+            ),
+            key=lambda w: w.tasks_per_minute,
+            reverse=True
+        )
+    )
+
+
+def track_queue_backlog(task_storage: StorageInterface[QueuedTask], cache_seconds: float = 5.0) -> None:
+    """
+    Makes the backlog gauges read the queue whenever metrics are scraped (at most once
+    every `cache_seconds`), so an autoscaler sees the backlog even with no workers running.
+    """
+    lock = threading.Lock()
+    state = {"at": float("-inf"), "backlog": 0.0, "oldest": 0.0}
+
+    def refresh():
+        with lock:
+            if time.monotonic() - state["at"] < cache_seconds:
+                return
+            state["at"] = time.monotonic()
+            try:
+                backlog = task_storage.get_aggregate(
+                    "COUNT", "*", {"status": [TaskStatus.PENDING.value, TaskStatus.RUNNING.value]}
+                )
+                oldest = _as_datetime(
+                    task_storage.get_aggregate("MIN", "created_at", {"status": TaskStatus.PENDING.value})
+                )
+            except Exception as e:
+                # Keep reporting the last known values rather than failing the scrape.
+                logger.warning(f"Could not read the queue backlog: {e}")
+                return
+            state["backlog"] = float(backlog or 0)
+            state["oldest"] = (datetime.now(timezone.utc) - oldest).total_seconds() if oldest else 0.0
+
+    def backlog():
+        refresh()
+        return state["backlog"]
+
+    def oldest_pending():
+        refresh()
+        return state["oldest"]
+
+    QUEUE_BACKLOG.set_function(backlog)
+    QUEUE_OLDEST_PENDING_SECONDS.set_function(oldest_pending)
@@ -0,0 +1,152 @@
+"""
+Query results kept on the server, for paging through them without running the query again.
+
+A paginated sample query (`paginate=true`) stores its result under a handle and returns
+its first page; further pages, optionally sorted by a column, are read from the stored
+result (GET /api/results/{handle}). Results are kept as Arrow tables:
+
+- up to LV_RESULT_MEMORY_MB in memory; beyond that the least recently used are spilled
+  to Arrow IPC files under LV_RESULT_SPILL_DIR (a temporary directory by default) and
+  memory-mapped when read;
+- up to LV_RESULT_DISK_MB on disk; beyond that the least recently used are dropped;
+- until LV_RESULT_TTL_SECONDS after they were last read.
+
+A result is only served to the user whose query produced it.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.exceptions import ResultNotFound
+from app.utils import get_float_env, get_int_env
+
+logger = logging.getLogger(__name__)
+
+RESULT_MEMORY_MB = get_int_env("LV_RESULT_MEMORY_MB", 256)
+RESULT_DISK_MB = get_int_env("LV_RESULT_DISK_MB", 2048)
+RESULT_TTL_SECONDS = get_float_env("LV_RESULT_TTL_SECONDS", 900.0)
+RESULT_SPILL_DIR = os.getenv("LV_RESULT_SPILL_DIR", "")
+
+_MB = 1024 * 1024
+
+
+@dataclass(eq=False)
+class _Result:
+    owner: Optional[str]
+    num_rows: int
+    nbytes: int
+    table: Optional[pa.Table]  # None once spilled to `path`
+    path: Optional[str] = None
+    last_used: float = field(default_factory=time.monotonic)
+    # The sort order of the last sorted page, (column, descending) -> row indices.
+    order: Dict[Tuple[str, bool], pa.Array] = field(default_factory=dict)
+
+
+class ResultStore:
+    def __init__(self, memory_mb: int = RESULT_MEMORY_MB, disk_mb: int = RESULT_DISK_MB,
+                 ttl_seconds: float = RESULT_TTL_SECONDS, spill_dir: str = RESULT_SPILL_DIR):
+        self.memory_bytes = memory_mb * _MB
+        self.disk_bytes = disk_mb * _MB
+        self.ttl_seconds = ttl_seconds
+        self._spill_dir = spill_dir or None
+        self._lock = threading.Lock()
+        self._results: "OrderedDict[str, _Result]" = OrderedDict()  # least recently used first
+
+    def put(self, table: pa.Table, owner: Optional[str]) -> str:
+        """Stores a query result and returns its handle. Raises ValueError when it is too large to keep."""
+        if table.nbytes > max(self.memory_bytes, self.disk_bytes):
+            raise ValueError(
+                f"The result ({table.nbytes // _MB} MB) is too large to page through; "
+                f"add a LIMIT or select fewer columns."
+            )
+        handle = uuid.uuid4().hex
+        with self._lock:
+            self._expire()
+            self._results[handle] = _Result(owner, table.num_rows, table.nbytes, table)
+            self._enforce_limits()
+        return handle
+
+    def page(self, handle: str, owner: Optional[str], offset: int, limit: int,
+             sort_by: Optional[str] = None, descending: bool = False) -> Tuple[pa.Table, int]:
+        """
+        Rows [offset, offset + limit) of a stored result, sorted by the `sort_by` column if
+        given, and the result's total row count. Raises ResultNotFound for unknown or
+        expired handles and results of other users.
+        """
+        with self._lock:
+            self._expire()
+            result = self._results.get(handle)
+            if result is None or result.owner != owner:
+                raise ResultNotFound(handle)
+            self._results.move_to_end(handle)
+            result.last_used = time.monotonic()
+            table = result.table if result.table is not None else self._load(result)
+
+        if not sort_by:
+            return table.slice(offset, limit), result.num_rows
+        if sort_by not in table.schema.names:
+            raise ValueError(f"{sort_by} is not a column of the result")
+        key = (sort_by, descending)
+        indices = result.order.get(key)
+        if indices is None:
+            indices = pc.sort_indices(table, sort_keys=[(sort_by, "descending" if descending else "ascending")])
+            result.order = {key: indices}
+        return table.take(indices.slice(offset, limit)), result.num_rows
+
+    def _load(self, result: _Result) -> pa.Table:
+        # Zero-copy: the table's buffers are views of the mapped file.
+        return pa.ipc.open_file(pa.memory_map(result.path)).read_all()
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for handle, result in list(self._results.items()):
+            if now - result.last_used > self.ttl_seconds:
+                self._drop(handle)
+
+    def _enforce_limits(self) -> None:
+        in_memory = sum(r.nbytes for r in self._results.values() if r.table is not None)
+        for result in self._results.values():
+            if in_memory <= self.memory_bytes:
+                break
+            if result.table is not None:
+                self._spill(result)
+                in_memory -= result.nbytes
+        on_disk = sum(r.nbytes for r in self._results.values() if r.table is None)
+        for handle, result in list(self._results.items()):
+            if on_disk <= self.disk_bytes:
+                break
+            if result.table is None:
+                self._drop(handle)
+                on_disk -= result.nbytes
+
+    def _spill(self, result: _Result) -> None:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="lakevision-results-")
+        os.makedirs(self._spill_dir, exist_ok=True)
+        path = os.path.join(self._spill_dir, f"{uuid.uuid4().hex}.arrow")
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, result.table.schema) as writer:
+            writer.write_table(result.table)
+        result.path, result.table = path, None
+        result.order = {}
+
+    def _drop(self, handle: str) -> None:
+        result = self._results.pop(handle)
+        if result.path is not None:
+            try:
+                os.remove(result.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove spilled result {result.path}: {e}")
+
+
+result_store = ResultStore()
@@ -0,0 +1,334 @@
+"""
+Retention and compaction for the health history tables.
+
+Every scheduled execution adds one InsightRun per table (plus its InsightRecords),
+and every finished QueuedTask stays in the queue table forever. This module trims
+those tables in bounded chunks so each DELETE stays a short transaction:
+
+- keep the last N runs per table and/or drop runs older than a maximum age
+  (the most recent run of a table is always kept),
+- optionally roll the removed runs up into daily per-rule counts (InsightRollup),
+- optionally collapse streaks of identical consecutive runs to their first and last run,
+  each cycle reading only the runs added since the previous one,
+- drop finished queue tasks older than a maximum age.
+
+It runs at the end of every scheduler cycle and can also be run on its own:
+    PYTHONPATH=app python -m app.retention
+"""
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from app.models import InsightRun, InsightRecord, InsightRollup, QueuedTask, TaskStatus, RuleExecution
+from app.storage import get_storage, StorageInterface
+from app.utils import get_bool_env, get_int_env
+
+logger = logging.getLogger(__name__)
+
+# 0 disables the corresponding policy.
+RETENTION_KEEP_RUNS = get_int_env("LV_RETENTION_KEEP_RUNS", 0)
+RETENTION_MAX_AGE_DAYS = get_int_env("LV_RETENTION_MAX_AGE_DAYS", 0)
+RETENTION_TASK_MAX_AGE_DAYS = get_int_env("LV_RETENTION_TASK_MAX_AGE_DAYS", 0)
+RETENTION_CHUNK_SIZE = max(1, get_int_env("LV_RETENTION_CHUNK_SIZE", 1000))
+RETENTION_ROLLUP = get_bool_env("LV_RETENTION_ROLLUP")
+RETENTION_COLLAPSE = get_bool_env("LV_RETENTION_COLLAPSE")
+
+
+def retention_enabled() -> bool:
+    return bool(RETENTION_KEEP_RUNS or RETENTION_MAX_AGE_DAYS or RETENTION_TASK_MAX_AGE_DAYS or RETENTION_COLLAPSE)
+
+
+def _day_of(ts) -> str:
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    return ts.strftime("%Y-%m-%d")
+
+
+def rollup_runs(
+    runs: List[InsightRun],
+    records: List[InsightRecord],
+    rollup_storage: StorageInterface[InsightRollup]
+) -> None:
+    """Adds the occurrences of the given runs to their daily per-rule counters."""
+    run_by_id = {run.id: run for run in runs}
+    counts: Dict[str, InsightRollup] = {}
+    for record in records:
+        run = run_by_id.get(record.run_id)
+        if run is None:
+            continue
+        rollup = InsightRollup(
+            day=_day_of(run.run_timestamp),
+            namespace=run.namespace,
+            table_name=run.table_name,
+            code=record.code
+        )
+        counts.setdefault(rollup.id, rollup).occurrences += 1
+
+    if not counts:
+        return
+
+    existing = rollup_storage.get_by_attributes({"id": list(counts.keys())})
+    for row in existing:
+        counts[row.id].occurrences += row.occurrences
+    rollup_storage.save_many(list(counts.values()))
+
+
+def _delete_runs(
+    runs: List[InsightRun],
+    run_storage: StorageInterface[InsightRun],
+    insight_storage: StorageInterface[InsightRecord],
+    rollup_storage: Optional[StorageInterface[InsightRollup]] = None,
+    execution_storage: Optional[StorageInterface[RuleExecution]] = None
+) -> int:
+    if not runs:
+        return 0
+    run_ids = [run.id for run in runs]
+    if rollup_storage is not None:
+        records = insight_storage.get_by_attributes({"run_id": run_ids})
+        rollup_runs(runs, records, rollup_storage)
+    # Children first so an interrupted pass never leaves orphaned records.
+    insight_storage.delete_by_attributes({"run_id": run_ids})
+    if execution_storage is not None:
+        execution_storage.delete_by_attributes({"run_id": run_ids})
+    return run_storage.delete_by_attributes({"id": run_ids})
+
+
+def prune_insight_runs(
+    run_storage: StorageInterface[InsightRun],
+    insight_storage: StorageInterface[InsightRecord],
+    keep_last: int = 0,
+    max_age_days: int = 0,
+    chunk_size: int = RETENTION_CHUNK_SIZE,
+    rollup_storage: Optional[StorageInterface[InsightRollup]] = None,
+    execution_storage: Optional[StorageInterface[RuleExecution]] = None
+) -> int:
+    """
+    Deletes runs (and their records and rule timings) beyond the last `keep_last` per table and/or
+    older than `max_age_days`. The newest run of every table is never deleted.
+
+    Returns:
+        The number of runs deleted.
+    """
+    runs_table = run_storage.table_name
+    deleted = 0
+
+    if max_age_days > 0:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+        # The EXISTS clause keeps the newest run of each table; it is an indexed
+        # lookup on (namespace, table_name, run_timestamp).
+        query = f'''
+            SELECT * FROM "{runs_table}" r
+            WHERE r.run_timestamp < :cutoff
+              AND EXISTS (
+                SELECT 1 FROM "{runs_table}" n
+                WHERE n.namespace = r.namespace AND n.table_name = r.table_name
+                  AND n.run_timestamp > r.run_timestamp
+              )
+            LIMIT :chunk
+        '''
+        while True:
+            runs = run_storage.find_by_raw_query(query, {"cutoff": cutoff, "chunk": chunk_size})
+            if not runs:
+                break
+            deleted += _delete_runs(runs, run_storage, insight_storage, rollup_storage, execution_storage)
+
+    if keep_last > 0:
+        per_table = run_storage.get_aggregate("COUNT", "*", group_by=["namespace", "table_name"]) or []
+        query = f'''
+            SELECT * FROM "{runs_table}"
+            WHERE namespace = :namespace AND table_name = :table_name
+            ORDER BY run_timestamp DESC
+            LIMIT :chunk OFFSET :keep
+        '''
+        for row in per_table:
+            if row["result"] <= keep_last:
+                continue
+            params = {
+                "namespace": row["namespace"],
+                "table_name": row["table_name"],
+                "chunk": chunk_size,
+                "keep": keep_last
+            }
+            while True:
+                runs = run_storage.find_by_raw_query(query, params)
+                if not runs:
+                    break
+                deleted += _delete_runs(runs, run_storage, insight_storage, rollup_storage, execution_storage)
+
+    return deleted
+
+
+def _run_signature(run: InsightRun, records: List[InsightRecord]) -> Tuple:
+    return (
+        run.run_type,
+        tuple(sorted(run.rules_requested or [])),
+        tuple(sorted((r.code, r.severity, r.message) for r in records))
+    )
+
+
+@dataclass
+class CollapseMark:
+    """Where the collapse of a table's runs stopped: the last run examined and the window state."""
+    run: InsightRun
+    sig: Tuple
+    prev_sig: Optional[Tuple]
+
+
+# (namespace, table_name) -> mark, kept across the scheduler's cycles.
+_collapse_marks: Dict[Tuple[str, str], CollapseMark] = {}
+
+
+def collapse_identical_runs(
+    run_storage: StorageInterface[InsightRun],
+    insight_storage: StorageInterface[InsightRecord],
+    chunk_size: int = RETENTION_CHUNK_SIZE,
+    rollup_storage: Optional[StorageInterface[InsightRollup]] = None,
+    execution_storage: Optional[StorageInterface[RuleExecution]] = None,
+    marks: Optional[Dict[Tuple[str, str], CollapseMark]] = None
+) -> int:
+    """
+    Collapses streaks of consecutive runs of a table that produced identical results
+    (same rules, same insights and messages) down to the first and last run of the streak.
+    With `marks`, a table is only read past the run its previous pass stopped at, so a
+    pass costs the runs added since; a table without a mark is read from its first run.
+
+    Returns:
+        The number of runs deleted.
+    """
+    runs_table = run_storage.table_name
+    tables = run_storage.get_aggregate("COUNT", "*", group_by=["namespace", "table_name"]) or []
+    # Pages on (run_timestamp, id) so runs sharing a timestamp are not skipped; the
+    # run_timestamp range is a lookup on the (namespace, table_name, run_timestamp) index.
+    query = f'''
+        SELECT * FROM "{runs_table}"
+        WHERE namespace = :namespace AND table_name = :table_name
+          AND run_timestamp >= :after AND (run_timestamp > :after OR id > :after_id)
+        ORDER BY run_timestamp ASC, id ASC
+        LIMIT :chunk
+    '''
+    marks = {} if marks is None else marks
+    deleted = 0
+    for row in tables:
+        key = (row["namespace"], row["table_name"])
+        mark = marks.get(key)
+        if mark is None and row["result"] < 3:
+            continue
+        # prev/current form a sliding window over the table's runs in time order;
+        # a run is redundant when it matches both of its neighbours.
+        prev_sig = None
+        current: Optional[Tuple[InsightRun, Tuple]] = None
+        after, after_id = datetime(1970, 1, 1, tzinfo=timezone.utc), ""
+        if mark is not None:
+            prev_sig, current = mark.prev_sig, (mark.run, mark.sig)
+            after, after_id = mark.run.run_timestamp, mark.run.id
+        while True:
+            runs = run_storage.find_by_raw_query(query, {
+                "namespace": row["namespace"],
+                "table_name": row["table_name"],
+                "after": after,
+                "after_id": after_id,
+                "chunk": chunk_size
+            })
+            if not runs:
+                break
+            records_by_run = defaultdict(list)
+            for record in insight_storage.get_by_attributes({"run_id": [run.id for run in runs]}):
+                records_by_run[record.run_id].append(record)
+
+            redundant = []
+            for run in runs:
+                sig = _run_signature(run, records_by_run.get(run.id, []))
+                if current is not None:
+                    current_run, current_sig = current
+                    if prev_sig == current_sig == sig:
+                        redundant.append(current_run)
+                    else:
+                        prev_sig = current_sig
+                current = (run, sig)
+            after, after_id = runs[-1].run_timestamp, runs[-1].id
+            marks[key] = CollapseMark(*current, prev_sig)
+            deleted += _delete_runs(redundant, run_storage, insight_storage, rollup_storage, execution_storage)
+    return deleted
+
+
+def purge_finished_tasks(
+    task_storage: StorageInterface[QueuedTask],
+    max_age_days: int,
+    chunk_size: int = RETENTION_CHUNK_SIZE
+) -> int:
+    """Deletes completed and failed queue tasks that finished more than `max_age_days` ago."""
+    if max_age_days <= 0:
+        return 0
+    cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+    query = f'''
+        SELECT id FROM "{task_storage.table_name}"
+        WHERE status IN (:complete, :failed, :cancelled) AND finished_at < :cutoff
+        LIMIT :chunk
+    '''
+    deleted = 0
+    while True:
+        rows = task_storage.execute_raw_select_query(query, {
+            "complete": TaskStatus.COMPLETE,
+            "failed": TaskStatus.FAILED,
+            "cancelled": TaskStatus.CANCELLED,
+            "cutoff": cutoff,
+            "chunk": chunk_size
+        })
+        if not rows:
+            break
+        deleted += task_storage.delete_by_attributes({"id": [r["id"] for r in rows]})
+    return deleted
+
+
+def run_retention_cycle(
+    run_storage: StorageInterface[InsightRun],
+    insight_storage: StorageInterface[InsightRecord],
+    task_storage: StorageInterface[QueuedTask],
+    rollup_storage: Optional[StorageInterface[InsightRollup]] = None,
+    execution_storage: Optional[StorageInterface[RuleExecution]] = None
+) -> Dict[str, int]:
+    """Applies every configured retention policy once and returns the deleted row counts."""
+    result = {"collapsed_runs": 0, "pruned_runs": 0, "purged_tasks": 0}
+    if not retention_enabled():
+        return result
+
+    if RETENTION_COLLAPSE:
+        result["collapsed_runs"] = collapse_identical_runs(
+            run_storage,
+            insight_storage,
+            rollup_storage=rollup_storage if RETENTION_ROLLUP else None,
+            execution_storage=execution_storage,
+            marks=_collapse_marks
+        )
+    if RETENTION_KEEP_RUNS or RETENTION_MAX_AGE_DAYS:
+        result["pruned_runs"] = prune_insight_runs(
+            run_storage,
+            insight_storage,
+            keep_last=RETENTION_KEEP_RUNS,
+            max_age_days=RETENTION_MAX_AGE_DAYS,
+            rollup_storage=rollup_storage if RETENTION_ROLLUP else None,
+            execution_storage=execution_storage
+        )
+    result["purged_tasks"] = purge_finished_tasks(task_storage, RETENTION_TASK_MAX_AGE_DAYS)
+    logger.info(f"Retention cycle finished: {result}")
+    return result
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if not get_bool_env('PUBLIC_HEALTH_ENABLED'):
+        print("Health feature is disabled. Retention will not run.")
+        exit()
+
+    storages = [get_storage(model=model) for model in (InsightRun, InsightRecord, QueuedTask, InsightRollup, RuleExecution)]
+    for storage in storages:
+        storage.connect()
+        storage.ensure_table()
+    try:
+        print(run_retention_cycle(*storages))
+    finally:
+        for storage in storages:
+            storage.disconnect()
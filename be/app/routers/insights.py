@@ -1,12 +1,15 @@
 import logging
 from typing import List, Optional
-from fastapi import APIRouter, Query, Depends
+from fastapi import APIRouter, Query, Depends, HTTPException
 
 from app.insights.runner import InsightsRunner
 from app.insights.rules import ALL_RULES_OBJECT
 from app.dependencies import get_runner
 from app.exceptions import LVException
-from app.models import RuleOut, RuleSummaryOut, InsightRun, InsightRunOut
+from app.models import (
+    RuleOut, RuleSummaryOut, InsightRun, InsightRunOut, InsightOccurrence, TableHealthOut,
+    RunTimingOut, RulePerformanceOut
+)
 
 router = APIRouter()
 
@@ -46,6 +49,8 @@ def get_insights_summary(
     """
     Provides an aggregated summary of insights, grouped by rule.
     This is useful for dashboard views at the namespace or lakehouse level.
+    Each group carries its counts and only the top occurrences; use the
+    occurrences endpoint to page through the rest.
     """
     summary_data = runner.get_summary_by_rule(
         namespace=namespace,
@@ -54,6 +59,97 @@ def get_insights_summary(
     )
     return summary_data
 
+@router.get(
+    "/api/namespaces/{namespace}/insights/summary/{code}/occurrences",
+    response_model=List[InsightOccurrence],
+    summary="Page through the occurrences of one rule"
+)
+def get_insight_occurrences(
+    namespace: str,
+    code: str,
+    table_name: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    runner: InsightsRunner = Depends(get_runner)
+):
+    return runner.get_rule_occurrences(
+        namespace=namespace,
+        code=code,
+        table_name=table_name,
+        skip=skip,
+        limit=limit
+    )
+
+@router.get(
+    "/api/lakehouse/health/tables",
+    response_model=List[TableHealthOut],
+    summary="Rank tables by their health scorecard"
+)
+def get_tables_health(
+    namespace: str = '*',
+    sort: str = 'worst',
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    runner: InsightsRunner = Depends(get_runner)
+):
+    """
+    Returns the materialized per-table scorecards, ordered descending by `sort`:
+    worst (health score), small_files, snapshots or size.
+    """
+    try:
+        return runner.get_table_health(namespace=namespace, sort=sort, skip=skip, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/api/namespaces/{namespace}/{table_name}/health", response_model=TableHealthOut)
+def get_table_health(
+    namespace: str,
+    table_name: str,
+    runner: InsightsRunner = Depends(get_runner)
+):
+    health = runner.get_health_for_table(namespace, table_name)
+    if health is None:
+        raise HTTPException(status_code=404, detail="No health scorecard for this table yet.")
+    return health
+
+@router.get(
+    "/api/lakehouse/insights/performance/runs",
+    response_model=List[RunTimingOut],
+    summary="List the most expensive insight runs"
+)
+def get_run_performance(
+    namespace: str = '*',
+    table_name: Optional[str] = None,
+    sort: str = 'duration',
+    limit: int = Query(50, ge=1, le=500),
+    runner: InsightsRunner = Depends(get_runner)
+):
+    """
+    Returns insight runs ordered descending by `sort`: duration, load, files,
+    manifests or memory, each with its per-rule wall times in milliseconds.
+    """
+    try:
+        return runner.get_run_timings(namespace=namespace, table_name=table_name, sort=sort, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get(
+    "/api/lakehouse/insights/performance/rules",
+    response_model=List[RulePerformanceOut],
+    summary="List the slowest insight rules"
+)
+def get_rule_performance(
+    namespace: str = '*',
+    sort: str = 'avg',
+    limit: int = Query(50, ge=1, le=500),
+    runner: InsightsRunner = Depends(get_runner)
+):
+    """Returns rule wall times aggregated across runs, ordered descending by `sort`: avg, max or total."""
+    try:
+        return runner.get_rule_performance(namespace=namespace, sort=sort, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/api/lakehouse/insights/rules", response_model=List[RuleOut])
 def get_insight_rules():
     return ALL_RULES_OBJECT
\ No newline at end of file
@@ -3,16 +3,20 @@ import traceback
 from collections import defaultdict
 from datetime import datetime, timezone
 from typing import List, Optional
-from fastapi import APIRouter, BackgroundTasks, HTTPException, Response, status
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Response, status
 from croniter import croniter
 from app.insights.utils import get_namespace_and_table_name, qualified_table_name
 from app.dependencies import lv, background_job_storage, schedule_storage, queued_task_storage
 from app.insights.runner import InsightsRunner
 from app.models import JobSchedule, QueuedTask, TaskStatus
 from app.storage import get_storage
+from app.storage.engines import pool_stats
+from app.queue_analytics import get_queue_stats
+from app.worker import cancel_batch
+from app.tracing import span, current_trace_context
 from app.models import (
     RunRequest, RunResponse, StatusResponse, BackgroundJob, InsightRun, 
-    JobScheduleRequest, JobScheduleResponse, JobScheduleUpdateRequest,
+    JobScheduleRequest, JobScheduleResponse, JobScheduleUpdateRequest, QueueStatsOut,
     InsightRecord, ActiveInsight
 )
 
@@ -21,7 +25,12 @@ router = APIRouter()
 @router.post("/api/start-run", response_model=RunResponse, status_code=202)
 def start_manual_run(run_request: RunRequest):
     batch_id = str(uuid.uuid4())
-    
+    # The batch's trace starts here; workers resume it from the stored trace context.
+    with span("api.start_run", batch_id=batch_id, namespace=run_request.namespace, table=run_request.table_name):
+        _enqueue_manual_run(batch_id, run_request, current_trace_context())
+    return RunResponse(run_id=batch_id)
+
+def _enqueue_manual_run(batch_id: str, run_request: RunRequest, trace_context: Optional[str]):
     # 1. Create the Batch record
     new_batch = BackgroundJob( 
         id=batch_id, 
@@ -29,7 +38,8 @@ def start_manual_run(run_request: RunRequest):
         table_name=run_request.table_name,
         rules_requested=run_request.rules_requested, 
         status="pending",
-        details="Job is queued."
+        details="Job is queued.",
+        trace_context=trace_context
     )
     background_job_storage.save(new_batch)
 
@@ -42,7 +52,8 @@ def start_manual_run(run_request: RunRequest):
             table_name=run_request.table_name,
             rules_requested=run_request.rules_requested,
             priority=1,
-            run_type="manual"
+            run_type="manual",
+            trace_context=trace_context
         )
     else:
         print("not_table")
@@ -54,19 +65,20 @@ def start_manual_run(run_request: RunRequest):
             table_name=None,
             rules_requested=run_request.rules_requested,
             priority=1, 
-            run_type="manual"
+            run_type="manual",
+            trace_context=trace_context
         )
         
     # 3. Save the single task
     queued_task_storage.save(task)
-        
-    return RunResponse(run_id=batch_id)
 
 @router.get("/run-status/{run_id}", response_model=StatusResponse)
 def get_run_status(run_id: str): # run_id is now a batch_id
     batch_job = background_job_storage.get_by_id(run_id)
     if not batch_job:
         raise HTTPException(status_code=404, detail="Run ID not found.")
+    if batch_job.status == "cancelled":
+        return StatusResponse.from_job(batch_job)
 
     # Get task statuses
     # This could be a raw query for efficiency:
@@ -105,6 +117,20 @@ def get_run_status(run_id: str): # run_id is now a batch_id
     
     return StatusResponse.from_job(batch_job)
 
+@router.post("/api/jobs/{run_id}/cancel", response_model=StatusResponse)
+def cancel_run(run_id: str):
+    """
+    Cancels a batch: its pending tasks are skipped and its running tasks stop at
+    their next rule boundary, keeping the rules they finished as a partial run.
+    """
+    batch_job = background_job_storage.get_by_id(run_id)
+    if not batch_job:
+        raise HTTPException(status_code=404, detail="Run ID not found.")
+    if batch_job.status in ("complete", "failed", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Run is already {batch_job.status}.")
+    cancel_batch(batch_job, queued_task_storage, background_job_storage)
+    return StatusResponse.from_job(batch_job)
+
 @router.get("/api/jobs/running", response_model=List[StatusResponse])
 def get_running_jobs(namespace: str, table_name: Optional[str] = None):
     criteria = {"namespace": namespace, "status": ["pending", "running"]}
@@ -113,6 +139,16 @@ def get_running_jobs(namespace: str, table_name: Optional[str] = None):
     running_jobs = background_job_storage.get_by_attributes(criteria)
     return [StatusResponse.from_job(job) for job in running_jobs] if running_jobs else []
 
+@router.get("/api/jobs/db-pool")
+def get_db_pool_stats():
+    """Connection pool usage of the database engines shared by this API process."""
+    return pool_stats()
+
+@router.get("/api/jobs/queue-stats", response_model=QueueStatsOut)
+def read_queue_stats(window_minutes: int = Query(15, ge=1, le=1440)):
+    """Queue depth, throughput, task duration percentiles and per-batch ETAs, for sizing the worker fleet."""
+    return get_queue_stats(queued_task_storage, window_minutes)
+
 # --- Schedule Endpoints ---
 @router.post("/api/schedules", response_model=JobScheduleResponse, status_code=201)
 def create_schedule(schedule_request: JobScheduleRequest):
@@ -1,13 +1,26 @@
-from fastapi import APIRouter, Depends, Request, Response, status, HTTPException
+import asyncio
+import json
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query, Request, Response, status, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from pyiceberg.table import Table
 
 from app import config 
 from app.dependencies import get_table, lv, authz_, check_auth
-from app.api_utils import df_to_records
-from app.exceptions import LVException
+from app.api_utils import arrow_to_records, records_response, cancel_on_disconnect
+from app.exceptions import LVException, QueryCancelled, QueryPoolSaturated, ResultNotFound
+from app.profiling import ProfiledRoute, profiled, profiling_authorized, load_profile
+from app.query_cost import budget_for
+from app.query_pool import query_pool
+from app.result_store import result_store
+from app.models import PartitionStatsOut, QueryCostOut, ResultPageOut
 import logging
 
-router = APIRouter()
+router = APIRouter(route_class=ProfiledRoute)
 
 @router.get("/api/namespaces")
 def read_namespaces(refresh: bool = False):
@@ -47,32 +60,124 @@ def read_table_special_properties(table_id: str):
     return authz_.get_table_special_properties(table_id)
 
 @router.get("/api/tables/{table_id}/snapshots")
-def read_table_snapshots(table: Table = Depends(get_table)):
-    return df_to_records(lv.get_snapshot_data(table))
+def read_table_snapshots(since: datetime = None, until: datetime = None, operation: List[str] = Query(None),
+                         columns: List[str] = Query(None), limit: int = Query(None, ge=1, le=10000),
+                         cursor: str = None, table: Table = Depends(get_table)):
+    """
+    The table's snapshots, newest first, optionally committed in [since, until), with one of
+    the given operations and only some columns. With `limit`, a page of them and the
+    `next_cursor` to pass as `cursor` for the next page (null on the last page).
+    """
+    try:
+        if limit is None:
+            return records_response(lv.get_snapshot_data(table, since, until, operation, columns))
+        page, next_cursor = lv.get_snapshot_page(table, limit, cursor, since, until, operation, columns)
+    except ValueError as e:
+        raise LVException("err", str(e))
+    return JSONResponse({"rows": arrow_to_records(page), "next_cursor": next_cursor})
 
 @router.get("/api/tables/{table_id}/partitions", status_code=status.HTTP_200_OK)
-def read_table_partitions(request: Request, response: Response, table_id: str, table: Table = Depends(get_table)):
+def read_table_partitions(request: Request, response: Response, table_id: str, sort_by: str = "partition",
+                          descending: bool = False, offset: int = Query(0, ge=0),
+                          limit: int = Query(None, ge=1, le=10000), table: Table = Depends(get_table)):
+    """
+    The table's partitions sorted by partition, records, files, size or last_updated.
+    With `limit`, a page of them (the top N from offset 0) and the number of partitions.
+    """
+    if not authz_.has_access(request, response, table_id):
+        return
+    try:
+        if limit is None:
+            return records_response(lv.get_partition_data(table, sort_by, descending))
+        page, total = lv.get_partition_page(table, offset, limit, sort_by, descending)
+    except ValueError as e:
+        raise LVException("err", str(e))
+    return JSONResponse({"total_partitions": total, "offset": offset, "rows": arrow_to_records(page)})
+
+@router.get("/api/tables/{table_id}/partitions/stats", response_model=Optional[PartitionStatsOut])
+def read_partition_stats(request: Request, response: Response, table_id: str, table: Table = Depends(get_table)):
+    """Partition size and record count statistics, and a histogram of partition sizes."""
     if not authz_.has_access(request, response, table_id):
         return
-    return df_to_records(lv.get_partition_data(table))
+    return lv.get_partition_stats(table)
 
 @router.get("/api/tables/{table_id}/sample", status_code=status.HTTP_200_OK)
-def read_sample_data(request: Request, response: Response, table_id: str, sql: str = None, sample_limit: int = 100, table: Table = Depends(get_table)):
+async def read_sample_data(request: Request, response: Response, table_id: str, sql: str = None, sample_limit: int = 100, random_sample: bool = False, partition: str = None, paginate: bool = False, page_size: int = Query(100, ge=1, le=10000), table: Table = Depends(get_table), user=Depends(check_auth)):
+    if not await run_in_threadpool(authz_.has_access, request, response, table_id):
+        return
+    # The query runs on the query pool (not the shared threadpool) and is told to stop if the client goes away.
+    cancelled = threading.Event()
+
+    @profiled
+    def query():
+        # `partition` is a partition record as JSON, e.g. {"dt_day": "2024-01-02"}.
+        selected = json.loads(partition) if partition else None
+        args = (table, sql, sample_limit, cancelled, budget_for(user), random_sample)
+        if not paginate:
+            return records_response(lv.get_sample_table(*args, partition=selected, admit=query_pool.admit))
+        # The result is kept on the server; further pages are read from it by handle.
+        handle = result_store.put(lv.get_sample_table(*args, partition=selected, admit=query_pool.admit), user)
+        return _result_page(handle, user, 0, page_size)
+
+    watcher = asyncio.create_task(cancel_on_disconnect(request, cancelled))
+    try:
+        return await query_pool.run(user, query)
+    except QueryPoolSaturated as e:
+        logging.info(f"Sample query on {table_id} refused: {e}")
+        return JSONResponse(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content={"name": "busy", "message": str(e)},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except QueryCancelled:
+        logging.info(f"Client disconnected, cancelled sample query on {table_id}")
+        return Response(status_code=499)
+    except Exception as e:
+        logging.error(str(e))
+        raise LVException("err", str(e))
+    finally:
+        cancelled.set()
+        watcher.cancel()
+
+@router.get("/api/tables/{table_id}/sample/estimate", response_model=QueryCostOut)
+def estimate_sample_query(request: Request, response: Response, table_id: str, sql: str, partition: str = None, table: Table = Depends(get_table), user=Depends(check_auth)):
+    """Dry run of a sample query: the files, bytes and rows it would read, and whether the user's budget allows it."""
     if not authz_.has_access(request, response, table_id):
         return
     try:
-        res = lv.get_sample_data(table, sql, sample_limit)
-        return df_to_records(res)
+        selected = json.loads(partition) if partition else None
+        return lv.estimate_sample_query(table, sql, budget_for(user), partition=selected)
     except Exception as e:
         logging.error(str(e))
         raise LVException("err", str(e))
 
+@router.get("/api/results/{handle}", response_model=ResultPageOut)
+def read_result_page(handle: str, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=10000), sort_by: str = None, descending: bool = False, user=Depends(check_auth)):
+    """A page of a paginated sample query's result, optionally sorted by one of its columns."""
+    try:
+        return _result_page(handle, user, offset, limit, sort_by, descending)
+    except ResultNotFound:
+        raise HTTPException(status_code=404, detail="Result not found or expired; run the query again")
+    except Exception as e:
+        logging.error(str(e))
+        raise LVException("err", str(e))
+
+def _result_page(handle, user, offset, limit, sort_by=None, descending=False):
+    page, total_rows = result_store.page(handle, user, offset, limit, sort_by, descending)
+    return {
+        "handle": handle,
+        "total_rows": total_rows,
+        "offset": offset,
+        "columns": page.schema.names,
+        "rows": arrow_to_records(page)
+    }
+
 # ... Add the remaining table endpoints here ...
 # (/schema, /summary, /properties, /partition-specs, /sort-order, /data-change)
 
 @router.get("/api/tables/{table_id}/schema")
 def read_schema_data(table: Table = Depends(get_table)):
-    return df_to_records(lv.get_schema(table))
+    return records_response(lv.get_schema(table))
 
 @router.get("/api/tables/{table_id}/summary")
 def read_summary_data(table: Table = Depends(get_table)):
@@ -91,5 +196,15 @@ def read_sort_order(table: Table = Depends(get_table)):
     return lv.get_sort_order(table)
 
 @router.get("/api/tables/{table_id}/data-change")
-def read_data_change(table: Table = Depends(get_table)):
-    return df_to_records(lv.get_data_change(table))
\ No newline at end of file
+def read_data_change(since: datetime = None, until: datetime = None,
+                     bucket: str = Query(None, pattern="^(hour|day)$"), table: Table = Depends(get_table)):
+    return records_response(lv.get_data_change(table, since, until, bucket))
+
+@router.get("/api/profiles/{profile_id}")
+def read_profile(request: Request, profile_id: str):
+    if not profiling_authorized(request):
+        raise HTTPException(status_code=403, detail="Profiling not authorized")
+    profile = load_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
@@ -0,0 +1,122 @@
+"""
+Fast sampling of a table's rows for the Sample Data tab.
+
+Planning a full scan reads every manifest before the first row comes back, which
+takes tens of seconds on tables with thousands of manifests just to show 100 rows.
+Sampling instead walks the current snapshot's manifests one at a time and stops as
+soon as the data files found cover the requested rows. Those files are read with
+the limit, so reading stops after the first row groups that cover it.
+
+A random sample visits manifests and their entries in random order and takes one
+file per partition until LV_SAMPLE_PARTITIONS partitions are covered, then further
+files (of any partition) until they hold the requested rows. Each file contributes
+an equal share of the rows still missing, so a small file's shortfall is made up by
+the files after it.
+
+A sample of one partition (see app.partition_filter) skips the manifests whose
+partition summaries rule the partition out and the data files of other partitions.
+
+When the snapshot has delete files, the rows of a data file cannot be shown without
+applying its deletes, so the sample falls back to a regular (fully planned) scan.
+"""
+import math
+import random
+from typing import Iterator, List, Optional
+
+import pyarrow as pa
+from pyiceberg.expressions import AlwaysTrue
+from pyiceberg.io.pyarrow import ArrowScan
+from pyiceberg.manifest import DataFile, ManifestContent
+from pyiceberg.table import FileScanTask
+
+from app.partition_filter import PartitionSelection
+from app.utils import get_int_env
+
+SAMPLE_PARTITIONS = max(1, get_int_env("LV_SAMPLE_PARTITIONS", 10))
+
+
+def sample_files(table, limit: int, randomize: bool = False, rng: Optional[random.Random] = None,
+                 selection: Optional[PartitionSelection] = None) -> Optional[List[DataFile]]:
+    """
+    Data files of the current snapshot (in the `selection` partition, if given) that
+    together hold at least `limit` rows (or all of them), reading only as many manifests
+    as needed. None when the snapshot has delete files.
+    """
+    snapshot = table.current_snapshot()
+    if snapshot is None:
+        return []
+    manifests = list(snapshot.manifests(table.io))
+    if any(manifest.content == ManifestContent.DELETES for manifest in manifests):
+        return None
+    if selection is not None:
+        manifests = [manifest for manifest in manifests if selection.manifest_matches(manifest)]
+    rng = rng or random.Random()
+    if randomize:
+        rng.shuffle(manifests)
+
+    files: List[DataFile] = []
+    rows = 0
+    partitions = set()
+    spare: List[DataFile] = []  # random sample: more files of partitions already covered
+    wanted_partitions = min(SAMPLE_PARTITIONS, limit)
+    for manifest in manifests:
+        entries = manifest.fetch_manifest_entry(table.io, discard_deleted=True)
+        if randomize:
+            rng.shuffle(entries)
+        for entry in entries:
+            data_file = entry.data_file
+            if data_file.record_count == 0 or (selection is not None and not selection.matches(data_file)):
+                continue
+            if randomize:
+                partition = (data_file.spec_id, repr(data_file.partition))
+                if partition in partitions and len(partitions) < wanted_partitions:
+                    spare.append(data_file)
+                    continue
+                partitions.add(partition)
+            files.append(data_file)
+            rows += data_file.record_count
+            if rows >= limit and (not randomize or len(partitions) >= wanted_partitions):
+                return files
+    # The table has fewer partitions than wanted; fill the sample up from the ones it has.
+    for data_file in spare:
+        if rows >= limit:
+            break
+        files.append(data_file)
+        rows += data_file.record_count
+    return files
+
+
+def sample_batches(table, limit: int, randomize: bool = False,
+                   selection: Optional[PartitionSelection] = None) -> Iterator[pa.RecordBatch]:
+    """Up to `limit` rows of the table or of the `selection` partition, first rows or spread across partitions."""
+    row_filter = selection.row_filter if selection is not None else AlwaysTrue()
+    files = sample_files(table, limit, randomize, selection=selection)
+    if files is None:
+        if selection is None:
+            yield from table.scan(limit=limit).to_arrow_batch_reader()
+            return
+        tasks = [task for task in table.scan(row_filter=row_filter).plan_files() if selection.matches(task.file)]
+        yield from ArrowScan(table.metadata, table.io, table.schema(), row_filter, limit=limit).to_record_batches(tasks)
+        return
+
+    def read(data_files: List[DataFile], rows: int) -> Iterator[pa.RecordBatch]:
+        return ArrowScan(table.metadata, table.io, table.schema(), row_filter, limit=rows).to_record_batches(
+            [FileScanTask(data_file) for data_file in data_files]
+        )
+
+    if not randomize:
+        yield from read(files, limit)
+        return
+
+    remaining = limit
+    later_rows = sum(data_file.record_count for data_file in files)
+    for i, data_file in enumerate(files):
+        later_rows -= data_file.record_count
+        # An equal share of the rows still missing, which includes the shortfall of earlier
+        # files, and more if the files after this one hold too few rows for the rest.
+        share = max(math.ceil(remaining / (len(files) - i)), remaining - later_rows)
+        for batch in read([data_file], share):
+            remaining -= batch.num_rows
+            yield batch
+        if remaining <= 0:
+            return
@@ -3,10 +3,13 @@ from datetime import datetime, timezone
 from croniter import croniter
 from app.lakeviewer import LakeView
 from app.insights.runner import InsightsRunner
-from app.models import InsightRun, InsightRecord, JobSchedule, ActiveInsight, BackgroundJob, QueuedTask
+from app.models import InsightRun, InsightRecord, JobSchedule, ActiveInsight, BackgroundJob, QueuedTask, InsightRollup, RuleExecution
 from app.storage import get_storage, StorageInterface
 from app.utils import get_bool_env
 from app.insights.utils import get_namespace_and_table_name
+from app.retention import run_retention_cycle, retention_enabled
+from app.metrics import start_metrics_server
+from app.tracing import configure_tracing, current_trace_context, span
 import logging
 import uuid
 
@@ -41,31 +44,34 @@ def run_scheduler_cycle(schedule_storage: StorageInterface ):
     for schedule in schedules_to_run:
         print(f"Enqueuing generator task for schedule: {schedule.id}")
         
-        # 1. Create a Batch record
+        # 1. Create a Batch record; its trace starts here and is resumed by the workers.
         batch_id = str(uuid.uuid4())
-        new_batch = BackgroundJob(
-            id=batch_id,
-            namespace=schedule.namespace,
-            table_name=schedule.table_name,
-            rules_requested=schedule.rules_requested,
-            status="pending",
-            details=f"Scheduled run from schedule {schedule.id}"
-        )
-        background_job_storage.save(new_batch)
+        with span("scheduler.enqueue", batch_id=batch_id, schedule_id=schedule.id, namespace=schedule.namespace):
+            new_batch = BackgroundJob(
+                id=batch_id,
+                namespace=schedule.namespace,
+                table_name=schedule.table_name,
+                rules_requested=schedule.rules_requested,
+                status="pending",
+                details=f"Scheduled run from schedule {schedule.id}",
+                trace_context=current_trace_context()
+            )
+            background_job_storage.save(new_batch)
 
-        # 2. Create ONE QueuedTask that mirrors the schedule
-        # If table_name is None, the worker will treat it as a generator.
-        task = QueuedTask(
-            batch_id=batch_id,
-            namespace=schedule.namespace,
-            table_name=schedule.table_name,
-            rules_requested=schedule.rules_requested,
-            priority=10, 
-            run_type="auto"
-        )
-        
-        # 3. Save the single task
-        queued_task_storage.save(task)
+            # 2. Create ONE QueuedTask that mirrors the schedule
+            # If table_name is None, the worker will treat it as a generator.
+            task = QueuedTask(
+                batch_id=batch_id,
+                namespace=schedule.namespace,
+                table_name=schedule.table_name,
+                rules_requested=schedule.rules_requested,
+                priority=10, 
+                run_type="auto",
+                trace_context=current_trace_context()
+            )
+
+            # 3. Save the single task
+            queued_task_storage.save(task)
         
         # 3. Update the schedule for its next run.
         base_time = now
@@ -76,6 +82,25 @@ def run_scheduler_cycle(schedule_storage: StorageInterface ):
         schedule_storage.save(schedule) # Save the updated timestamps
         print(f"Finished job for schedule: {schedule.id}")
 
+    # Trim the history tables once per cycle
+    if retention_enabled():
+        insight_rollup_storage = get_storage(model=InsightRollup)
+        insight_rollup_storage.connect()
+        insight_rollup_storage.ensure_table()
+        rule_execution_storage = get_storage(model=RuleExecution)
+        rule_execution_storage.connect()
+        rule_execution_storage.ensure_table()
+        try:
+            run_retention_cycle(
+                insight_run_storage, insight_record_storage, queued_task_storage,
+                insight_rollup_storage, rule_execution_storage
+            )
+        except Exception as e:
+            logging.error(f"Error running retention: {str(e)}")
+        finally:
+            insight_rollup_storage.disconnect()
+            rule_execution_storage.disconnect()
+
     insight_run_storage.disconnect()
     insight_record_storage.disconnect()
     active_insight_storage.disconnect()
@@ -91,12 +116,18 @@ if __name__ == "__main__":
         print("Health feature is disabled. Scheduler will not run.")
         exit()  # Exit the script immediately
 
+    start_metrics_server()
+    configure_tracing("lakevision-scheduler")
+
+    # Held for the life of the process, so the storages each cycle opens and closes
+    # reuse its shared engine and pool instead of creating new ones.
+    schedule_storage = get_storage(model=JobSchedule)
+    schedule_storage.connect()
+    schedule_storage.ensure_table()
+
     while True:
         try:
             print("Checking schedules to run")
-            schedule_storage = get_storage(model=JobSchedule)
-            schedule_storage.connect()
-            schedule_storage.ensure_table()
             run_scheduler_cycle(schedule_storage)
             print("Finish checking schedules to run")
             time.sleep(600) # Wait for 600 seconds
@@ -0,0 +1,210 @@
+"""
+Projection, filter and LIMIT pushdown for the sample query.
+
+The SQL a user runs on the Sample Data tab names the table as `namespace.table`.
+The query is parsed with sqlglot: the table reference is rewritten to `df` (the
+daft frame the query runs on), and for a plain SELECT over the table the columns it
+references, the conjuncts of its WHERE clause that translate to pyiceberg
+expressions and its LIMIT are extracted. Those go into the Iceberg scan as
+`selected_fields`, `row_filter` and `limit`, so manifests and data files that cannot
+match are pruned while planning and unused columns are never read. The query itself
+still runs unchanged on the scanned rows, so a filter that is pushed only in part
+(say `dt = '2024-01-01' AND lower(name) = 'x'`) stays correct.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pyiceberg.expressions import (
+    AlwaysTrue, And, BooleanExpression, EqualTo, GreaterThan, GreaterThanOrEqual, In, IsNull,
+    LessThan, LessThanOrEqual, Not, NotEqualTo, Or
+)
+from pyiceberg.expressions.visitors import bind
+from pyiceberg.schema import Schema
+from sqlglot import exp, parse_one
+
+DF_NAME = "df"
+
+_COMPARISONS = {
+    exp.EQ: (EqualTo, EqualTo),
+    exp.NEQ: (NotEqualTo, NotEqualTo),
+    exp.GT: (GreaterThan, LessThan),
+    exp.GTE: (GreaterThanOrEqual, LessThanOrEqual),
+    exp.LT: (LessThan, GreaterThan),
+    exp.LTE: (LessThanOrEqual, GreaterThanOrEqual),
+}  # sqlglot node -> (column op literal, literal op column)
+
+
+class _NotPushable(Exception):
+    pass
+
+
+@dataclass
+class ScanPushdown:
+    """What a sample query needs from the Iceberg scan, plus the query rewritten to run on `df`."""
+    sql: str
+    selected_fields: Tuple[str, ...] = ("*",)
+    row_filter: BooleanExpression = field(default_factory=AlwaysTrue)
+    limit: Optional[int] = None
+
+    @property
+    def prunes(self) -> bool:
+        """True when the scan reads less than the whole table."""
+        return self.row_filter != AlwaysTrue() or self.limit is not None
+
+
+def analyze_sample_sql(sql: str, table_identifier: Sequence[str], schema: Schema) -> ScanPushdown:
+    """
+    Rewrites `sql` to run on `df` and extracts what can be pushed into the scan of the
+    table named by `table_identifier` (its full identifier, e.g. ("db", "events")).
+    """
+    query = parse_one(sql)
+    references = [t for t in query.find_all(exp.Table) if _names_table(t, table_identifier)]
+    for reference in references:
+        alias = reference.alias
+        reference.replace(exp.to_table(DF_NAME).as_(alias) if alias else exp.to_table(DF_NAME))
+    pushdown = ScanPushdown(sql=query.sql())
+
+    select = query if isinstance(query, exp.Select) else None
+    if select is None or len(references) != 1 or not _single_source(select):
+        return pushdown
+
+    fields = {f.name.lower(): f.name for f in schema.fields}
+    pushdown.selected_fields = _selected_fields(select, fields)
+
+    pushed, complete = [], True
+    where = select.args.get("where")
+    for conjunct in _conjuncts(where.this) if where else []:
+        predicate = _to_predicate(conjunct, fields, schema)
+        if predicate is not None:
+            pushed.append(predicate)
+        # Negations match NULLs in pyiceberg but not in SQL, so the scan may return extra rows.
+        if predicate is None or conjunct.find(exp.Not, exp.NEQ) is not None:
+            complete = False
+    if pushed:
+        pushdown.row_filter = And(*pushed) if len(pushed) > 1 else pushed[0]
+    if complete:
+        pushdown.limit = _limit(select)
+    return pushdown
+
+
+def _names_table(table: exp.Table, table_identifier: Sequence[str]) -> bool:
+    parts = [p.name.lower() for p in table.parts]
+    if parts == [DF_NAME]:
+        return True
+    identifier = [p.lower() for p in table_identifier]
+    return len(parts) <= len(identifier) and identifier[-len(parts):] == parts
+
+
+def _single_source(select: exp.Select) -> bool:
+    """A SELECT reading straight from the table: no joins, subqueries, CTEs or set operations."""
+    if select.args.get("joins") or select.args.get("with") or select.args.get("laterals"):
+        return False
+    nested = (node for node in select.find_all(exp.Subquery, exp.Union, exp.Select) if node is not select)
+    return next(nested, None) is None
+
+
+def _selected_fields(select: exp.Select, fields: Dict[str, str]) -> Tuple[str, ...]:
+    """The table columns the query reads, or ("*",) when it reads all of them (or cannot tell)."""
+    if any(not isinstance(star.parent, exp.Count) for star in select.find_all(exp.Star)):
+        return ("*",)
+    aliases = {alias.alias.lower() for alias in select.expressions if isinstance(alias, exp.Alias)}
+    selected: List[str] = []
+    for column in select.find_all(exp.Column):
+        name = fields.get(column.name.lower())
+        if name is None:
+            if column.name.lower() in aliases and not column.table:
+                continue
+            return ("*",)  # nested or unknown fields: leave the projection to the query
+        if name not in selected:
+            selected.append(name)
+    return tuple(selected) if selected else ("*",)
+
+
+def _conjuncts(node: exp.Expression) -> Iterable[exp.Expression]:
+    node = node.unnest()
+    if isinstance(node, exp.And):
+        for child in node.flatten():
+            yield from _conjuncts(child)
+    else:
+        yield node
+
+
+def _to_predicate(node: exp.Expression, fields: Dict[str, str], schema: Schema) -> Optional[BooleanExpression]:
+    """The pyiceberg equivalent of a WHERE conjunct, or None when it has none."""
+    try:
+        predicate = _convert(node, fields)
+        # Binding checks the literals against the column types, e.g. a date column to '2024-01-01'.
+        bind(schema, predicate, case_sensitive=True)
+        return predicate
+    except Exception:
+        return None
+
+
+def _convert(node: exp.Expression, fields: Dict[str, str]) -> BooleanExpression:
+    node = node.unnest()
+    if isinstance(node, exp.And):
+        return And(_convert(node.left, fields), _convert(node.right, fields))
+    if isinstance(node, exp.Or):
+        return Or(_convert(node.left, fields), _convert(node.right, fields))
+    if isinstance(node, exp.Not):
+        return Not(_convert(node.this, fields))
+    if type(node) in _COMPARISONS:
+        column_first, literal_first = _COMPARISONS[type(node)]
+        if isinstance(node.left.unnest(), exp.Column):
+            return column_first(_field(node.left, fields), _literal(node.right))
+        return literal_first(_field(node.right, fields), _literal(node.left))
+    if isinstance(node, exp.In):
+        if node.args.get("query") or node.args.get("unnest"):
+            raise _NotPushable(node.sql())
+        return In(_field(node.this, fields), {_literal(value) for value in node.expressions})
+    if isinstance(node, exp.Is) and isinstance(node.expression, exp.Null):
+        return IsNull(_field(node.this, fields))
+    if isinstance(node, exp.Between):
+        name = _field(node.this, fields)
+        return And(GreaterThanOrEqual(name, _literal(node.args["low"])),
+                   LessThanOrEqual(name, _literal(node.args["high"])))
+    raise _NotPushable(node.sql())
+
+
+def _field(node: exp.Expression, fields: Dict[str, str]) -> str:
+    node = node.unnest()
+    if not isinstance(node, exp.Column) or node.name.lower() not in fields:
+        raise _NotPushable(node.sql())
+    return fields[node.name.lower()]
+
+
+def _literal(node: exp.Expression):
+    node = node.unnest()
+    if isinstance(node, exp.Cast):
+        # DATE '2024-01-01', TIMESTAMP '...': pyiceberg converts the string to the column type.
+        node = node.this
+    if isinstance(node, exp.Neg):
+        return -_literal(node.this)
+    if isinstance(node, exp.Boolean):
+        return node.this
+    if isinstance(node, exp.Literal):
+        if node.is_string:
+            return node.this
+        value = node.this
+        return int(value) if value.lstrip("-").isdigit() else float(value)
+    raise _NotPushable(node.sql())
+
+
+def _limit(select: exp.Select) -> Optional[int]:
+    """The LIMIT to push, if the rows the scan returns first are rows of the result."""
+    limit = select.args.get("limit")
+    if limit is None:
+        return None
+    if any(select.args.get(arg) for arg in ("group", "having", "order", "distinct", "qualify")):
+        return None
+    if select.find(exp.AggFunc, exp.Window) is not None:
+        return None
+    expression = limit.expression
+    if not isinstance(expression, exp.Literal) or not expression.is_int:
+        return None
+    offset = select.args.get("offset")
+    if offset is not None:
+        if not isinstance(offset.expression, exp.Literal) or not offset.expression.is_int:
+            return None
+        return int(expression.this) + int(offset.expression.this)
+    return int(expression.this)
@@ -4,14 +4,19 @@ from typing import Optional, Type
 from app.storage.interface import StorageInterface, T
 from app.storage.sqlalchemy_adapter import SQLAlchemyStorage
 from app.storage.noop_adapter import NoOpStorage
-from app.utils import get_bool_env
+from app.utils import get_bool_env, get_float_env
 
 def get_storage(
     model: Type[T],
-    db_url: Optional[str] = None
+    db_url: Optional[str] = None,
+    read_replica: bool = False
 ) -> StorageInterface[T]:
     """
     Factory to select a model-aware storage backend.
+
+    With read_replica=True, read-only queries are routed to the comma-separated
+    replicas in LAKEVISION_DATABASE_READ_URL (if set), tolerating up to
+    LAKEVISION_READ_MAX_STALENESS_SECONDS of replication lag.
     """
     # Check the feature flag first
     if not get_bool_env('PUBLIC_HEALTH_ENABLED'):
@@ -24,4 +29,13 @@ def get_storage(
         # This error is now correct: health is ON but DB_URL is missing
         raise ValueError("Health feature is enabled, but LAKEVISION_DATABASE_URL is not provided or set.")
 
-    return SQLAlchemyStorage(db_url, model)
\ No newline at end of file
+    read_urls = []
+    if read_replica:
+        read_urls = [url.strip() for url in os.getenv('LAKEVISION_DATABASE_READ_URL', '').split(',') if url.strip()]
+
+    return SQLAlchemyStorage(
+        db_url,
+        model,
+        read_urls=read_urls,
+        max_staleness_seconds=get_float_env('LAKEVISION_READ_MAX_STALENESS_SECONDS', 5.0)
+    )
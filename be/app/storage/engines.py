@@ -0,0 +1,103 @@
+"""
+Process-wide registry of SQLAlchemy engines, one per database URL.
+
+Every storage used to create its own engine and connection pool, so a process held
+one pool per model. Storages now acquire the engine for their URL from here and
+release it on disconnect; the engine is disposed when its last user releases it.
+In-memory SQLite URLs are never shared, since each engine is its own database.
+"""
+import threading
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+
+from app.metrics import instrument_engine
+from app.tracing import trace_engine
+from app.utils import get_int_env
+
+DB_POOL_SIZE = get_int_env("LAKEVISION_DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = get_int_env("LAKEVISION_DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = get_int_env("LAKEVISION_DB_POOL_TIMEOUT", 30)
+
+_lock = threading.Lock()
+# url -> (engine, number of storages holding it)
+_engines: Dict[str, Tuple[Engine, int]] = {}
+
+
+def _is_private(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def _create_engine(url: str) -> Engine:
+    options: Dict[str, Any] = {
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,  # 30 minutes
+    }
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    engine = create_engine(url, **options)
+    instrument_engine(engine)
+    trace_engine(engine)
+    return engine
+
+
+def acquire_engine(url: str) -> Engine:
+    """Returns the shared engine for `url`, creating it on first use."""
+    if _is_private(url):
+        return _create_engine(url)
+    with _lock:
+        engine, users = _engines.get(url, (None, 0))
+        if engine is None:
+            engine = _create_engine(url)
+        _engines[url] = (engine, users + 1)
+        return engine
+
+
+def release_engine(engine: Engine) -> None:
+    """Releases one use of `engine`, disposing of its pool when nobody uses it anymore."""
+    with _lock:
+        for url, (shared, users) in _engines.items():
+            if shared is engine:
+                if users > 1:
+                    _engines[url] = (shared, users - 1)
+                    return
+                del _engines[url]
+                break
+    engine.dispose()
+
+
+def dispose_inherited_engines() -> None:
+    """
+    For use in a forked child process: drops the pooled connections inherited from
+    the parent without closing them, since they still belong to the parent.
+    """
+    with _lock:
+        engines = [engine for engine, _ in _engines.values()]
+    for engine in engines:
+        engine.dispose(close=False)
+
+
+def pool_stats() -> List[Dict[str, Any]]:
+    """Connection pool usage of every shared engine in this process."""
+    with _lock:
+        engines = list(_engines.values())
+    stats = []
+    for engine, users in engines:
+        pool = engine.pool
+        stats.append({
+            "url": engine.url.render_as_string(hide_password=True),
+            "storages": users,
+            "pool": type(pool).__name__,
+            "size": getattr(pool, "size", lambda: None)(),
+            "checked_in": getattr(pool, "checkedin", lambda: None)(),
+            "checked_out": getattr(pool, "checkedout", lambda: None)(),
+            "overflow": getattr(pool, "overflow", lambda: None)(),
+            "status": pool.status(),
+        })
+    return stats
@@ -84,6 +84,14 @@ class StorageInterface(Generic[T], ABC):
         """Delete an item by its ID."""
         pass
 
+    @abstractmethod
+    def build_where_clause(self, criteria: dict[str, Any]) -> tuple[str, dict[str, Any]]:
+        """
+        Builds the WHERE clause and parameters matching all criteria, for raw queries
+        on this table. Empty criteria give an empty clause.
+        """
+        pass
+
     @abstractmethod
     def execute_raw_select_query(self, sql_query: str, params: dict[str, Any] | None = None) -> List[dict[str, Any]]:
         """Executes a raw, parameterized SELECT query and returns the results."""
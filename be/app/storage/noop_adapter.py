@@ -56,6 +56,9 @@ class NoOpStorage(StorageInterface[T]):
     ) -> List[T]:
         return None
     
+    def build_where_clause(self, criteria: dict[str, Any]) -> tuple[str, dict[str, Any]]:
+        return "", {}
+
     def execute_raw_select_query(self, sql_query: str, params: dict[str, Any] | None = None) -> List[dict[str, Any]]:
         return False
 
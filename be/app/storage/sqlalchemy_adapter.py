@@ -1,24 +1,64 @@
 import dataclasses
+import itertools
 import json
+import logging
+import threading
+import time
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Type, Union, get_args, get_origin
 
-from sqlalchemy import (TIMESTAMP, Boolean, Column, Float, Integer, MetaData,
-                          String, Table, Text, create_engine, inspect, text, bindparam)
+from sqlalchemy import (TIMESTAMP, BigInteger, Boolean, Column, Float, Index, Integer, MetaData,
+                          String, Table, Text, inspect, text, bindparam)
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 from contextlib import contextmanager
+from app.storage.engines import acquire_engine, release_engine
 from app.storage.interface import AggregateFunction, StorageInterface, T
 
+logger = logging.getLogger(__name__)
+
+# How long a measured replica lag is trusted before probing the replica again.
+REPLICA_LAG_PROBE_INTERVAL_SECONDS = 5.0
+
+# Replication lag in seconds, 0 when the replica has replayed everything it received.
+POSTGRES_REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END AS lag
+"""
+
+# Monotonic time of the last write this process made to each primary database.
+# Shared by all storages on that database, since a write to one table (e.g. a new
+# batch) is usually followed by a read of another (its queued tasks).
+_last_write_at: Dict[str, float] = {}
+
 class SQLAlchemyStorage(StorageInterface[T]):
     """
     Stores a dataclass in a table with columns matching the dataclass fields.
     """
-    def __init__(self, db_url: str, model: Type[T]):
+    def __init__(
+        self,
+        db_url: str,
+        model: Type[T],
+        read_urls: Optional[List[str]] = None,
+        max_staleness_seconds: float = 0.0
+    ):
         super().__init__(model)
         self._db_url = db_url
         self._engine: Optional[Engine] = None
+        # Optional read replicas for get_*/find_by_raw_query/execute_raw_select_query.
+        # Reads go to the primary while a replica may still miss this process's last
+        # write, or when its measured lag exceeds max_staleness_seconds.
+        self._read_urls = [url for url in (read_urls or []) if url]
+        self._max_staleness = max_staleness_seconds
+        self._read_engines: List[Engine] = []
+        self._read_cycle = None
+        self._replica_lag: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
         self._field_names = {f.name for f in dataclasses.fields(self.model)}
         
         self._complex_fields = set()
@@ -49,6 +89,9 @@ class SQLAlchemyStorage(StorageInterface[T]):
         This method is a context manager. It yields a connection
         wrapped in a 'BEGIN' call. It automatically calls 'COMMIT'
         on a successful exit or 'ROLLBACK' if an exception occurs.
+
+        Writes made directly on this connection are not tracked for read-replica
+        routing; only the worker writes this way and it never reads from replicas.
         """
         engine = self._get_engine()
         with engine.begin() as conn: # This starts the transaction
@@ -63,21 +106,78 @@ class SQLAlchemyStorage(StorageInterface[T]):
         # The connection is automatically returned to the pool
 
     def connect(self) -> None:
+        # Engines (and their pools) are shared by all storages on the same URL.
         if not self._engine:
-            self._engine = create_engine(
-                self._db_url,
-                pool_pre_ping=True,
-                pool_recycle=1800  # 30 minutes
-            )
+            self._engine = acquire_engine(self._db_url)
+            self._read_engines = [acquire_engine(url) for url in self._read_urls]
+            self._read_cycle = itertools.cycle(self._read_engines) if self._read_engines else None
 
     def disconnect(self) -> None:
         if self._engine:
-            self._engine.dispose()
+            release_engine(self._engine)
+            self._engine = None
+        for engine in self._read_engines:
+            release_engine(engine)
+        self._read_engines = []
+        self._read_cycle = None
 
     def _get_engine(self) -> Engine:
         if not self._engine:
             raise ConnectionError("Database not connected.")
         return self._engine
+
+    def _mark_write(self) -> None:
+        _last_write_at[self._db_url] = time.monotonic()
+
+    def _measure_replica_lag(self, engine: Engine) -> Optional[float]:
+        """
+        Returns the replica's lag in seconds (cached for a few seconds), None when it
+        cannot be measured for this dialect, or infinity when the replica is unreachable.
+        """
+        if engine.dialect.name != "postgresql":
+            return None
+        now = time.monotonic()
+        cached = self._replica_lag.get(id(engine))
+        if cached and now - cached[0] < REPLICA_LAG_PROBE_INTERVAL_SECONDS:
+            return cached[1]
+        try:
+            with engine.connect() as conn:
+                lag = float(conn.execute(text(POSTGRES_REPLICA_LAG_SQL)).scalar() or 0)
+        except Exception as e:
+            logger.warning(f"Replica lag probe failed, reading from primary: {e}")
+            lag = float("inf")
+        self._replica_lag[id(engine)] = (now, lag)
+        return lag
+
+    def _get_read_engine(self) -> Engine:
+        """Picks the engine for a read-only query: a fresh enough replica, else the primary."""
+        primary = self._get_engine()
+        if not self._read_cycle:
+            return primary
+        with self._lock:
+            replica = next(self._read_cycle)
+        lag = self._measure_replica_lag(replica)
+        if lag is not None and lag > self._max_staleness:
+            return primary
+        # Without a measurement, assume the replica may be as stale as the tolerance allows.
+        assumed_lag = self._max_staleness if lag is None else lag
+        last_write = _last_write_at.get(self._db_url)
+        if last_write is not None and time.monotonic() - last_write <= assumed_lag:
+            return primary  # read-your-writes
+        return replica
+
+    def _read(self, stmt, params: Optional[Dict[str, Any]] = None):
+        """Runs a read-only statement, retrying on the primary if the replica is unreachable."""
+        engine = self._get_read_engine()
+        try:
+            with engine.connect() as conn:
+                return conn.execute(stmt, params or {}).mappings().all()
+        except OperationalError:
+            if engine is self._engine:
+                raise
+            logger.warning("Read replica unavailable, retrying on primary.")
+            with self._get_engine().connect() as conn:
+                return conn.execute(stmt, params or {}).mappings().all()
     
     def _map_type(self, py_type: Type) -> Any:
         """Maps Python types to SQLAlchemy types, correctly handling Optional[T]."""
@@ -89,7 +189,8 @@ class SQLAlchemyStorage(StorageInterface[T]):
             if len(args) == 1:
                 py_type = args[0]
 
-        if py_type is int: return Integer
+        # BigInteger so byte sizes and file counts don't overflow 32-bit columns
+        if py_type is int: return BigInteger
         if py_type is float: return Float
         if py_type is bool: return Boolean
         # --- CHANGE 1: Natively map datetime to TIMESTAMP ---
@@ -128,18 +229,43 @@ class SQLAlchemyStorage(StorageInterface[T]):
 
     def ensure_table(self) -> None:
         engine = self._get_engine()
+        metadata = MetaData()
+        columns = []
+        for field in dataclasses.fields(self.model):
+            is_primary_key = field.name == 'id'
+            # --- CHANGE 3: Use the improved _map_type for all fields ---
+            # Use String(255) for the ID for better indexing, otherwise map the type.
+            sqlalchemy_type = String(255) if is_primary_key else self._map_type(field.type)
+            columns.append(Column(field.name, sqlalchemy_type, primary_key=is_primary_key))
+        table = Table(self.table_name, metadata, *columns)
+
+        # Models may declare secondary indexes as a class attribute, e.g.
+        # __indexes__ = [("namespace", "table_name", "run_timestamp")]
+        indexes = [
+            Index(f"ix_{self.table_name}_{'_'.join(cols)}", *[table.c[col] for col in cols])
+            for cols in getattr(self.model, "__indexes__", ())
+        ]
+
         if not inspect(engine).has_table(self.table_name):
-            metadata = MetaData()
-            columns = []
-            for field in dataclasses.fields(self.model):
-                is_primary_key = field.name == 'id'
-                # --- CHANGE 3: Use the improved _map_type for all fields ---
-                # Use String(255) for the ID for better indexing, otherwise map the type.
-                sqlalchemy_type = String(255) if is_primary_key else self._map_type(field.type)
-                columns.append(Column(field.name, sqlalchemy_type, primary_key=is_primary_key))
-            Table(self.table_name, metadata, *columns)
             metadata.create_all(engine)
             print(f"Table '{self.table_name}' created with schema.")
+        else:
+            # Existing deployments get any columns and indexes added since the table was created.
+            self._add_missing_columns(engine, table)
+            for index in indexes:
+                index.create(engine, checkfirst=True)
+
+    def _add_missing_columns(self, engine: Engine, table: Table) -> None:
+        """Adds model fields missing from an existing table as nullable columns."""
+        existing = {col["name"] for col in inspect(engine).get_columns(self.table_name)}
+        missing = [col for col in table.columns if col.name not in existing]
+        if not missing:
+            return
+        with engine.begin() as conn:
+            for col in missing:
+                col_type = col.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{self.table_name}" ADD COLUMN "{col.name}" {col_type}'))
+                print(f"Column '{col.name}' added to table '{self.table_name}'.")
 
     # ... The rest of your methods (save, save_many, get_by_id, etc.) remain unchanged ...
     # They will work correctly with this new setup.
@@ -206,28 +332,60 @@ class SQLAlchemyStorage(StorageInterface[T]):
             
             # SQLAlchemy's execute method handles a list of dicts as a bulk "executemany"
             conn.execute(insert_stmt, serialized_items)
+        self._mark_write()
 
     def get_by_id(self, item_id: Any) -> Optional[T]:
-        engine = self._get_engine()
-        with engine.connect() as conn:
-            stmt = text(f"SELECT * FROM {self.table_name} WHERE id = :id")
-            result = conn.execute(stmt, {"id": item_id}).mappings().first()
+        stmt = text(f"SELECT * FROM {self.table_name} WHERE id = :id")
+        results = self._read(stmt, {"id": item_id})
         
-        if not result:
+        if not results:
             return None
         
-        deserialized_result = self._deserialize_row(dict(result))
+        deserialized_result = self._deserialize_row(dict(results[0]))
         return self.model(**deserialized_result)
 
     def get_all(self) -> List[T]:
-        engine = self._get_engine()
-        with engine.connect() as conn:
-            stmt = text(f"SELECT * FROM {self.table_name}")
-            results = conn.execute(stmt).mappings().all()
+        stmt = text(f"SELECT * FROM {self.table_name}")
+        results = self._read(stmt)
         
         deserialized_results = [self._deserialize_row(dict(row)) for row in results]
         return [self.model(**row) for row in deserialized_results]
 
+    def build_where_clause(self, criteria: dict[str, Any]) -> tuple[str, dict[str, Any]]:
+        """
+        Builds a WHERE clause matching all criteria. List values become IN clauses
+        (an empty list matches nothing) and None becomes IS NULL.
+        """
+        if not criteria:
+            return "", {}
+
+        params = {}
+        clauses = []
+        # Build clauses and params together to handle IN lists correctly
+        for attr, value in criteria.items():
+            if isinstance(value, list):
+                if not value:
+                    # If the list is empty, create a condition that is always false
+                    clauses.append("1=0")
+                    continue
+
+                # Create unique placeholders like :status_0, :status_1, etc.
+                param_names = [f"{attr}_{i}" for i in range(len(value))]
+                # Create the IN clause string: e.g., "status IN (:status_0, :status_1)"
+                clauses.append(f'"{attr}" IN ({", ".join(":" + p for p in param_names)})')
+                
+                # Add the individual values to the params dict
+                for p_name, p_value in zip(param_names, value):
+                    params[p_name] = p_value
+            elif value is None:
+                clauses.append(f'"{attr}" IS NULL')
+            else:
+                # Handle standard equals (=) clause for non-list values
+                clauses.append(f'"{attr}" = :{attr}')
+                params[attr] = json.dumps(value) if attr in self._complex_fields else value
+        
+        return "WHERE " + " AND ".join(clauses), params
+
     def get_by_attributes(
         self,
         criteria: dict[str, Any],
@@ -244,35 +402,7 @@ class SQLAlchemyStorage(StorageInterface[T]):
                 raise ValueError(f"'{attribute}' is not a valid field in {self.model.__name__}")
 
         # 2. Build the WHERE clause and parameters dynamically
-        params = {}
-        if not criteria:
-            where_clause = ""
-        else:
-            clauses = []
-            # Build clauses and params together to handle IN lists correctly
-            for attr, value in criteria.items():
-                if isinstance(value, list):
-                    if not value:
-                        # If the list is empty, create a condition that is always false
-                        clauses.append("1=0")
-                        continue
-
-                    # Create unique placeholders like :status_0, :status_1, etc.
-                    param_names = [f"{attr}_{i}" for i in range(len(value))]
-                    # Create the IN clause string: e.g., "status IN (:status_0, :status_1)"
-                    clauses.append(f'"{attr}" IN ({", ".join(":" + p for p in param_names)})')
-                    
-                    # Add the individual values to the params dict
-                    for p_name, p_value in zip(param_names, value):
-                        params[p_name] = p_value
-                elif value is None:
-                    clauses.append(f'"{attr}" IS NULL')
-                else:
-                    # Handle standard equals (=) clause for non-list values
-                    clauses.append(f'"{attr}" = :{attr}')
-                    params[attr] = json.dumps(value) if attr in self._complex_fields else value
-            
-            where_clause = "WHERE " + " AND ".join(clauses)
+        where_clause, params = self.build_where_clause(criteria)
                 
         # 3. Construct the final SQL statement
         sql_query = f'SELECT * FROM "{self.table_name}" {where_clause}'
@@ -290,11 +420,8 @@ class SQLAlchemyStorage(StorageInterface[T]):
             sql_query += " OFFSET :skip"
             params['skip'] = skip
 
-        engine = self._get_engine()
-        with engine.connect() as conn:
-            stmt = text(sql_query)
-            # 4. Execute with the correctly built parameters
-            results = conn.execute(stmt, params).mappings().all()
+        # 4. Execute with the correctly built parameters
+        results = self._read(text(sql_query), params)
 
         deserialized_results = [self._deserialize_row(dict(row)) for row in results]
         return [self.model(**row) for row in deserialized_results]
@@ -313,6 +440,7 @@ class SQLAlchemyStorage(StorageInterface[T]):
             func: The aggregate function to use ('MIN', 'MAX', 'AVG', 'SUM', 'COUNT').
             column: The column to apply the function to. Use '*' for COUNT(*).
             criteria: Optional dictionary to filter rows with a WHERE clause.
+                      Supports IN clauses for list values and IS NULL for None.
             group_by: Optional list of columns to group the results by.
 
         Returns:
@@ -344,28 +472,19 @@ class SQLAlchemyStorage(StorageInterface[T]):
             for attr in criteria.keys():
                 if attr not in self._field_names:
                     raise ValueError(f"'{attr}' is not a valid criteria field.")
-            
-            clauses = [f'"{attr}" = :{attr}' for attr in criteria.keys()]
-            where_clause = "WHERE " + " AND ".join(clauses)
-            params = {
-                attr: json.dumps(value) if attr in self._complex_fields else value
-                for attr, value in criteria.items()
-            }
+            where_clause, params = self.build_where_clause(criteria)
 
         # GROUP BY clause
         group_by_clause = f"GROUP BY {', '.join(group_by)}" if group_by else ""
 
         # 3. --- Assemble and Execute ---
-        engine = self._get_engine()
-        with engine.connect() as conn:
-            sql_query = f"""
-                SELECT {select_columns}
-                FROM "{self.table_name}"
-                {where_clause}
-                {group_by_clause}
-            """
-            stmt = text(sql_query)
-            results = conn.execute(stmt, params).mappings().all()
+        sql_query = f"""
+            SELECT {select_columns}
+            FROM "{self.table_name}"
+            {where_clause}
+            {group_by_clause}
+        """
+        results = self._read(text(sql_query), params)
 
         # 4. --- Format and Return Result ---
         if not results:
@@ -425,11 +544,7 @@ class SQLAlchemyStorage(StorageInterface[T]):
         if not sql_query.strip().lower().startswith("select"):
             raise ValueError("This method only supports SELECT queries.")
 
-        engine = self._get_engine()
-        with engine.connect() as conn:
-            stmt = text(sql_query)
-            result = conn.execute(stmt, params or {})
-            return [dict(row) for row in result.mappings().all()]
+        return [dict(row) for row in self._read(text(sql_query), params)]
 
     def get_by_attribute(
         self,
@@ -446,6 +561,7 @@ class SQLAlchemyStorage(StorageInterface[T]):
         with engine.begin() as conn:
             stmt = text(f'DELETE FROM "{self.table_name}" WHERE id = :id')
             conn.execute(stmt, {"id": item_id})
+        self._mark_write()
     
     def delete_by_attributes(self, criteria: dict[str, Any]) -> int:
         """
@@ -494,4 +610,5 @@ class SQLAlchemyStorage(StorageInterface[T]):
         engine = self._get_engine()
         with engine.begin() as conn:
             result = conn.execute(stmt, params)
-            return result.rowcount # rowcount returns the number of deleted rows
\ No newline at end of file
+        self._mark_write()
+        return result.rowcount # rowcount returns the number of deleted rows
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+Tracing of health runs across the API, the task queue and the workers.
+
+A run's trace starts where its batch is enqueued (the start-run request or the
+scheduler) and travels with the batch as a W3C traceparent in the `trace_context`
+column of BackgroundJob and QueuedTask. Workers resume it for every task they claim,
+so one trace shows the queue wait, child-task generation, each table run with its
+catalog calls, file planning and rules, and the database statements underneath.
+
+Spans are built with OpenTelemetry and exported to LV_TRACE_FILE (one JSON span per
+line) and/or an OTLP/HTTP collector at LV_OTLP_ENDPOINT. Without either setting, or
+without the opentelemetry packages, every helper here is a no-op.
+"""
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+try:
+    from opentelemetry import context as otel_context, trace
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+    from opentelemetry.trace import Status, StatusCode
+    from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+except ImportError:  # tracing is optional
+    trace = None
+
+logger = logging.getLogger(__name__)
+
+TRACE_FILE = os.getenv("LV_TRACE_FILE", "")
+OTLP_ENDPOINT = os.getenv("LV_OTLP_ENDPOINT", "")
+MAX_STATEMENT_LENGTH = 500
+
+
+def _tracer():
+    return trace.get_tracer("lakevision")
+
+
+def configure_tracing(service_name: str) -> bool:
+    """Installs the span exporters for this process; returns False when tracing stays off."""
+    if trace is None or not (TRACE_FILE or OTLP_ENDPOINT):
+        return False
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    if TRACE_FILE:
+        provider.add_span_processor(BatchSpanProcessor(_JsonLinesSpanExporter(TRACE_FILE)))
+    if OTLP_ENDPOINT:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=OTLP_ENDPOINT)))
+    trace.set_tracer_provider(provider)
+    logger.info(f"Tracing {service_name} to {TRACE_FILE or OTLP_ENDPOINT}")
+    return True
+
+
+if trace is not None:
+    class _JsonLinesSpanExporter(SpanExporter):
+        """Appends finished spans to a file, one JSON object per line."""
+
+        def __init__(self, path: str):
+            self.path = path
+            self._lock = threading.Lock()
+
+        def export(self, spans) -> "SpanExportResult":
+            lines = "".join(json.dumps(json.loads(s.to_json())) + "\n" for s in spans)
+            with self._lock, open(self.path, "a") as f:
+                f.write(lines)
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self) -> None:
+            pass
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Runs the block in a child span of the current trace; None-valued attributes are dropped."""
+    if trace is None:
+        yield None
+        return
+    with _tracer().start_as_current_span(
+        name, attributes={k: v for k, v in attributes.items() if v is not None}
+    ) as current:
+        yield current
+
+
+def _ns(ts: datetime) -> int:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp() * 1e9)
+
+
+def record_span(name: str, start: datetime, end: datetime, **attributes) -> None:
+    """Records an interval that has already happened, such as a task's wait in the queue."""
+    if trace is None:
+        return
+    finished = _tracer().start_span(
+        name, start_time=_ns(start), attributes={k: v for k, v in attributes.items() if v is not None}
+    )
+    finished.end(end_time=_ns(end))
+
+
+def current_trace_context() -> Optional[str]:
+    """The traceparent of the current span, to be stored with queued work."""
+    if trace is None:
+        return None
+    carrier = {}
+    TraceContextTextMapPropagator().inject(carrier)
+    return carrier.get("traceparent")
+
+
+@contextmanager
+def resumed_trace(trace_context: Optional[str]):
+    """Makes spans opened in the block children of the span that enqueued the work."""
+    if trace is None or not trace_context:
+        yield
+        return
+    token = otel_context.attach(TraceContextTextMapPropagator().extract({"traceparent": trace_context}))
+    try:
+        yield
+    finally:
+        otel_context.detach(token)
+
+
+def trace_engine(engine) -> None:
+    """Opens a span around every statement executed through `engine`."""
+    if trace is None:
+        return
+    from sqlalchemy import event
+
+    from app.metrics import statement_type
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        statement_span = _tracer().start_span(
+            f"db.{statement_type(statement)}",
+            attributes={"db.system": engine.dialect.name, "db.statement": statement[:MAX_STATEMENT_LENGTH]},
+        )
+        conn.info.setdefault("lv_query_spans", []).append(statement_span)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("lv_query_spans")
+        if spans:
+            spans.pop().end()
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("lv_query_spans") if conn is not None else None
+        if spans:
+            failed = spans.pop()
+            failed.set_status(Status(StatusCode.ERROR, str(exception_context.original_exception)))
+            failed.end()
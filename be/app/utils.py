@@ -3,4 +3,18 @@ import os
 # Helper function to parse 'true', 'True', '1' as boolean True
 def get_bool_env(var_name: str) -> bool:
     """Gets a boolean value from an environment variable."""
-    return os.getenv(var_name, 'false').lower() in ('true', '1')
\ No newline at end of file
+    return os.getenv(var_name, 'false').lower() in ('true', '1')
+
+def get_int_env(var_name: str, default: int) -> int:
+    """Gets an integer value from an environment variable, falling back to default."""
+    try:
+        return int(os.getenv(var_name, default))
+    except (TypeError, ValueError):
+        return default
+
+def get_float_env(var_name: str, default: float) -> float:
+    """Gets a float value from an environment variable, falling back to default."""
+    try:
+        return float(os.getenv(var_name, default))
+    except (TypeError, ValueError):
+        return default
@@ -1,22 +1,62 @@
 import time
+import functools
 import uuid
+import random
+import signal
+import threading
 import traceback
-from typing import Optional
+from typing import Callable, Optional
 from datetime import datetime, timezone, timedelta
 from app.storage import get_storage, StorageInterface
 from app.models import (
     QueuedTask, TaskStatus, InsightRun, InsightRecord, 
-    ActiveInsight, BackgroundJob
+    ActiveInsight, BackgroundJob, TableHealth, RuleExecution
 )
 from app.insights.utils import get_namespace_and_table_name, qualified_table_name
 from app.lakeviewer import LakeView
 from app.insights.runner import InsightsRunner
-from app.utils import get_bool_env
+from app.insights.budget import (
+    OUTCOME_CANCELLED, TaskStopped, isolation_enabled, run_table_task, run_table_task_isolated
+)
+from app.utils import get_bool_env, get_float_env
+from app.metrics import (
+    QUEUE_DEPTH, QUEUE_CLAIM_SECONDS, QUEUE_WAIT_SECONDS, QUEUE_LOST_RACES, WORKER_IDLE_POLL_SECONDS,
+    start_metrics_server
+)
+from app.tracing import configure_tracing, current_trace_context, record_span, resumed_trace, span
 from sqlalchemy import text
 from collections import defaultdict
 
 WORKER_ID = str(uuid.uuid4())
 JOB_TIMEOUT_MINUTES = 30 # Max time a job can be "running" before it's considered stale
+# Idle polling backs off from the minimum to the maximum interval while the queue stays empty.
+POLL_MIN_SECONDS = get_float_env("LV_WORKER_POLL_MIN_SECONDS", 1.0)
+POLL_MAX_SECONDS = get_float_env("LV_WORKER_POLL_MAX_SECONDS", 30.0)
+
+# Set on SIGTERM/SIGINT: the worker finishes its current task and exits without claiming another.
+drain_requested = threading.Event()
+
+
+class PollBackoff:
+    """
+    Wait before the next queue poll: none after a task (busy workers chain tasks
+    back to back), and an exponentially growing, jittered wait while polls come back
+    empty or fail, so an idle fleet spreads out its polls instead of hitting the
+    database in lockstep.
+    """
+
+    def __init__(self, minimum: float = POLL_MIN_SECONDS, maximum: float = POLL_MAX_SECONDS):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.idle_polls = 0
+
+    def next_delay(self, work_done: bool) -> float:
+        if work_done:
+            self.idle_polls = 0
+            return 0.0
+        ceiling = min(self.maximum, self.minimum * (2 ** self.idle_polls))
+        self.idle_polls += 1
+        return random.uniform(ceiling / 2, ceiling)
 
 def update_batch_status(
     batch_id: str, 
@@ -67,19 +107,91 @@ def update_batch_status(
     # Only update if it's not already marked as complete
     if batch_job.status in ["pending", "running"]:
         if failed_count > 0:
-            batch_job.status = "failed"
-            batch_job.details = f"Job finished with {failed_count} / {total_tasks} tasks failed."
+            status = "failed"
+            details = f"Job finished with {failed_count} / {total_tasks} tasks failed."
         else:
-            batch_job.status = "complete"
-            batch_job.details = f"Job finished successfully. ({complete_count} / {total_tasks} tasks)"
-            
-        batch_job.finished_at = datetime.now(timezone.utc)
-        
-        # 4. Save the final status
-        batch_storage.save(batch_job)
-        print(f"Updated batch {batch_id} status to {batch_job.status}.")
-    else:
-        print(f"Batch {batch_id} status already set to {batch_job.status}. Skipping update.")
+            status = "complete"
+            details = f"Job finished successfully. ({complete_count} / {total_tasks} tasks)"
+
+        # 4. Save the final status, unless the batch was cancelled since it was read
+        if finish_batch(batch_storage, batch_id, status, details, datetime.now(timezone.utc)):
+            print(f"Updated batch {batch_id} status to {status}.")
+            return
+        batch_job = batch_storage.get_by_id(batch_id)  # it finished since it was read
+    print(f"Batch {batch_id} status already set to {batch_job.status}. Skipping update.")
+
+def finish_batch(
+    batch_storage: StorageInterface[BackgroundJob],
+    batch_id: str,
+    status: str,
+    details: str,
+    finished_at: datetime
+) -> bool:
+    """
+    Gives a batch that is still pending or running its final status in one conditional
+    UPDATE, so a completion and a cancellation racing each other cannot overwrite one
+    another. False when the batch had already finished.
+    """
+    with batch_storage.db_session() as session:
+        finish_query = """
+            UPDATE {table}
+            SET status = :status, details = :details, finished_at = :finished_at
+            WHERE id = :batch_id AND status IN ('pending', 'running')
+        """.format(table=batch_storage.table_name)
+        result = session.execute(text(finish_query), {
+            "status": status,
+            "details": details,
+            "finished_at": finished_at,
+            "batch_id": batch_id
+        })
+    return result.rowcount == 1
+
+def batch_cancelled(batch_storage: StorageInterface[BackgroundJob], batch_id: str) -> bool:
+    batch_job = batch_storage.get_by_id(batch_id)
+    return batch_job is not None and batch_job.status == "cancelled"
+
+def cancel_batch(
+    batch_job: BackgroundJob,
+    task_storage: StorageInterface[QueuedTask],
+    batch_storage: StorageInterface[BackgroundJob]
+) -> int:
+    """
+    Marks a batch cancelled and skips all of its pending tasks in one UPDATE.
+    Running tasks notice the cancellation at their next rule boundary, and a
+    generator task still listing tables enqueues nothing. Returns the number of
+    pending tasks that were cancelled; 0 when the batch finished first, in which
+    case `batch_job` is updated to its final state.
+    """
+    now = datetime.now(timezone.utc)
+    # The batch goes first, so a task claimed meanwhile is skipped by the worker.
+    if not finish_batch(batch_storage, batch_job.id, "cancelled", "Cancelled.", now):
+        finished = batch_storage.get_by_id(batch_job.id)
+        batch_job.status, batch_job.details, batch_job.finished_at = (
+            finished.status, finished.details, finished.finished_at
+        )
+        return 0
+    batch_job.status = "cancelled"
+    batch_job.finished_at = now
+
+    with task_storage.db_session() as session:
+        cancel_query = """
+            UPDATE {table}
+            SET status = :cancelled_status, finished_at = :now
+            WHERE batch_id = :batch_id AND status = :pending_status
+        """.format(table=task_storage.table_name)
+        result = session.execute(text(cancel_query), {
+            "cancelled_status": TaskStatus.CANCELLED,
+            "now": now,
+            "batch_id": batch_job.id,
+            "pending_status": TaskStatus.PENDING
+        })
+    batch_job.details = f"Cancelled. {result.rowcount} pending tasks were skipped."
+    with batch_storage.db_session() as session:
+        session.execute(
+            text("UPDATE {table} SET details = :details WHERE id = :batch_id".format(table=batch_storage.table_name)),
+            {"details": batch_job.details, "batch_id": batch_job.id}
+        )
+    return result.rowcount
 
 def get_atomic_job(task_storage: StorageInterface[QueuedTask]) -> Optional[QueuedTask]:
     """
@@ -90,6 +202,7 @@ def get_atomic_job(task_storage: StorageInterface[QueuedTask]) -> Optional[Queue
     2. Claim a 'pending' job.
     """
     stale_time = datetime.now(timezone.utc) - timedelta(minutes=JOB_TIMEOUT_MINUTES)
+    claim_started = time.perf_counter()
     
     try:
         # task_storage.db_session() handles the transaction commit/rollback
@@ -121,6 +234,8 @@ def get_atomic_job(task_storage: StorageInterface[QueuedTask]) -> Optional[Queue
             }).fetchone()
             
             if not job_to_run_raw:
+                QUEUE_DEPTH.set(0)
+                QUEUE_CLAIM_SECONDS.labels("empty").observe(time.perf_counter() - claim_started)
                 return None # No jobs in queue
             
             job_id = job_to_run_raw.id
@@ -157,35 +272,59 @@ def get_atomic_job(task_storage: StorageInterface[QueuedTask]) -> Optional[Queue
                 task_object.status = TaskStatus.RUNNING
                 task_object.started_at = lock_time
                 task_object.worker_id = lock_worker_id
+
+                # Indexed on (status, priority, created_at), so this is a cheap count.
+                depth_query = "SELECT COUNT(*) FROM {table} WHERE status = :pending_status".format(
+                    table=task_storage.table_name
+                )
+                QUEUE_DEPTH.set(session.execute(text(depth_query), {"pending_status": TaskStatus.PENDING}).scalar() or 0)
+                QUEUE_CLAIM_SECONDS.labels("claimed").observe(time.perf_counter() - claim_started)
+                if task_object.created_at:
+                    created_at = task_object.created_at
+                    if isinstance(created_at, str):
+                        created_at = datetime.fromisoformat(created_at)
+                    if created_at.tzinfo is None:
+                        created_at = created_at.replace(tzinfo=timezone.utc)
+                    QUEUE_WAIT_SECONDS.observe(max(0.0, (lock_time - created_at).total_seconds()))
                 
                 return task_object
                 
             else:
                 # We "lost" the race. Another worker got the job
                 # between our SELECT and UPDATE.
+                QUEUE_LOST_RACES.inc()
+                QUEUE_CLAIM_SECONDS.labels("lost").observe(time.perf_counter() - claim_started)
                 return None
                 
     except Exception as e:
         print(f"Error fetching/locking job: {e}")
+        QUEUE_CLAIM_SECONDS.labels("error").observe(time.perf_counter() - claim_started)
         return None
 
 def execute_table_task(
     task: QueuedTask, 
-    runner: InsightsRunner
+    runner: InsightsRunner,
+    cancelled: Optional[Callable[[], bool]] = None
 ):
     """
     Executes a single table-level insight run.
     This was the original logic of run_worker_cycle.
+    `cancelled` is checked between rules; when it fires the task stops and ends cancelled.
     """
     print(f"[{WORKER_ID}] Executing job {task.id} for {task.namespace}.{task.table_name}")
     try:
-        runner.run_for_table(
-            table_identifier=f"{task.namespace}.{task.table_name}",
-            rule_ids=task.rules_requested,
-            type=task.run_type
-        )
+        if isolation_enabled():
+            # Time and memory budgets are enforced on a child process (see app.insights.budget)
+            run_table_task_isolated(runner, task, cancelled=cancelled)
+        else:
+            run_table_task(runner, task, cancelled)
         task.status = TaskStatus.COMPLETE
         task.error_details = None
+
+    except TaskStopped as e:
+        print(f"[{WORKER_ID}] Job {task.id} stopped early ({e.outcome}): {e}")
+        task.status = TaskStatus.CANCELLED if e.outcome == OUTCOME_CANCELLED else TaskStatus.FAILED
+        task.error_details = str(e)
         
     except Exception as e:
         print(f"[{WORKER_ID}] Job {task.id} FAILED: {e}")
@@ -201,10 +340,12 @@ def execute_table_task(
 def execute_generator_task(
     task: QueuedTask, 
     task_storage: StorageInterface[QueuedTask], 
-    lv: LakeView
+    lv: LakeView,
+    cancelled: Optional[Callable[[], bool]] = None
 ):
     """
     Generates and enqueues all child tasks for a namespace or '*' job.
+    Nothing is enqueued if `cancelled` fires while the tables are being listed.
     """
     print(f"[{WORKER_ID}] Generating child tasks for job {task.id} (Namespace: {task.namespace})")
     try:
@@ -232,11 +373,16 @@ def execute_generator_task(
                 table_name=tbl,
                 rules_requested=task.rules_requested,
                 priority=task.priority, # Inherit priority
-                run_type=task.run_type    # Inherit run type
+                run_type=task.run_type,   # Inherit run type
+                trace_context=current_trace_context() # Children are spans of this generator task
                 # All other fields get defaults (new ID, PENDING status, etc.)
             ))
         print(f"have list of new tasks {len(new_child_tasks)}")
-        # 3. Save new tasks to the queue
+        # 3. Save new tasks to the queue, unless the batch was cancelled meanwhile
+        if cancelled is not None and cancelled():
+            print(f"Batch {task.batch_id} was cancelled, not enqueueing its child tasks.")
+            task.status = TaskStatus.CANCELLED
+            return
         if new_child_tasks:
             # This could be a large save, but it's happening in the worker,
             # not blocking the API.
@@ -257,6 +403,15 @@ def execute_generator_task(
         print(f"[{WORKER_ID}] Finished generator task {task.id} with status {task.status}")
 
 
+def _record_queue_wait(task: QueuedTask):
+    created_at = task.created_at
+    if not created_at or not task.started_at:
+        return
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    record_span("queue.wait", created_at, task.started_at, task_id=task.id, priority=task.priority)
+
+
 def run_worker_cycle(
     task_storage: StorageInterface[QueuedTask], 
     batch_storage: StorageInterface[BackgroundJob],
@@ -269,14 +424,28 @@ def run_worker_cycle(
     if not task:
         return False # No work done
 
+    cancelled = functools.partial(batch_cancelled, batch_storage, task.batch_id)
+
     try:
-        # 2. Decide what kind of task it is
-        if task.table_name is not None:
-            # It's an "execution task"
-            execute_table_task(task, runner)
-        else:
-            # It's a "generator task" (table_name is None)
-            execute_generator_task(task, task_storage, lv)
+        # 2. Skip the task if its batch was cancelled after it was queued
+        if cancelled():
+            print(f"[{WORKER_ID}] Batch {task.batch_id} was cancelled, skipping task {task.id}")
+            task.status = TaskStatus.CANCELLED
+            task.finished_at = datetime.now(timezone.utc)
+            return True
+
+        # 3. Decide what kind of task it is, continuing the trace of whoever enqueued it
+        with resumed_trace(task.trace_context):
+            _record_queue_wait(task)
+            kind = "table" if task.table_name is not None else "generator"
+            with span(f"worker.{kind}_task", task_id=task.id, batch_id=task.batch_id,
+                      namespace=task.namespace, table=task.table_name, worker_id=WORKER_ID):
+                if task.table_name is not None:
+                    # It's an "execution task"
+                    execute_table_task(task, runner, cancelled)
+                else:
+                    # It's a "generator task" (table_name is None)
+                    execute_generator_task(task, task_storage, lv, cancelled)
             
     except Exception as e:
         # This is a safety net, but execute functions have their own try/except
@@ -286,13 +455,43 @@ def run_worker_cycle(
         task.finished_at = datetime.now(timezone.utc)
         
     finally:
-        # 3. Save the final state OF THIS TASK (generator or table)
+        # 4. Save the final state OF THIS TASK (generator or table)
         task_storage.save(task)
         
-        # 4. Check if the *entire batch* is complete
+        # 5. Check if the *entire batch* is complete
         update_batch_status(task.batch_id, task_storage, batch_storage)
 
         return True # Indicates work was done
+
+
+def run_worker_loop(
+    task_storage: StorageInterface[QueuedTask],
+    batch_storage: StorageInterface[BackgroundJob],
+    runner: InsightsRunner,
+    lv: LakeView,
+    backoff: Optional[PollBackoff] = None
+):
+    """Processes tasks until a drain is requested, adapting the poll interval to the backlog."""
+    backoff = backoff or PollBackoff()
+    while not drain_requested.is_set():
+        try:
+            work_done = run_worker_cycle(task_storage, batch_storage, runner, lv)
+        except Exception as e:
+            print(f"[{WORKER_ID}] Unhandled error in worker loop: {e}")
+            work_done = False
+        delay = backoff.next_delay(work_done)
+        WORKER_IDLE_POLL_SECONDS.set(delay)
+        if delay:
+            # Returns early when a drain is requested.
+            drain_requested.wait(delay)
+    print(f"[{WORKER_ID}] Drained, exiting.")
+
+
+def request_drain(signum, frame):
+    print(f"[{WORKER_ID}] Received signal {signum}, finishing the current task before exiting.")
+    drain_requested.set()
+
+
 if __name__ == "__main__":
     print(f"Starting worker process {WORKER_ID}")
 
@@ -301,10 +500,15 @@ if __name__ == "__main__":
         print("Health feature is disabled. Worker will not run.")
         exit()  # Exit the script immediately
     
+    start_metrics_server()
+    configure_tracing("lakevision-worker")
+
     # These storages are opened once and passed to the runner
     run_storage = get_storage(model=InsightRun)
     insight_record_storage = get_storage(model=InsightRecord)
     active_insight_storage = get_storage(model=ActiveInsight)
+    health_storage = get_storage(model=TableHealth)
+    execution_storage = get_storage(model=RuleExecution)
     task_storage = get_storage(model=QueuedTask)
     batch_storage = get_storage(model=BackgroundJob)
     
@@ -312,6 +516,8 @@ if __name__ == "__main__":
     run_storage.connect()
     insight_record_storage.connect()
     active_insight_storage.connect()
+    health_storage.connect()
+    execution_storage.connect()
     task_storage.connect()
     batch_storage.connect()
     
@@ -319,6 +525,8 @@ if __name__ == "__main__":
     run_storage.ensure_table()
     insight_record_storage.ensure_table()
     active_insight_storage.ensure_table()
+    health_storage.ensure_table()
+    execution_storage.ensure_table()
     task_storage.ensure_table()
     batch_storage.ensure_table()
     
@@ -329,20 +537,16 @@ if __name__ == "__main__":
         lakeview=LakeView(),
         run_storage=run_storage,
         insight_storage=insight_record_storage,
-        active_insight_storage=active_insight_storage
+        active_insight_storage=active_insight_storage,
+        health_storage=health_storage,
+        execution_storage=execution_storage
     )
 
-    # This is the worker's main loop. It runs *fast*.
-    while True:
-        try:
-            work_done = run_worker_cycle(task_storage, batch_storage, runner, lv)
-            if not work_done:
-                # No jobs found, sleep longer to avoid spamming the DB
-                time.sleep(5) # Poll every 5 seconds
-            else:
-                # Work was done, check for more immediately
-                time.sleep(0.1) 
-                
-        except Exception as e:
-            print(f"[{WORKER_ID}] Unhandled error in worker loop: {e}")
-            time.sleep(15) # Wait a bit before retrying on major error
\ No newline at end of file
+    signal.signal(signal.SIGTERM, request_drain)
+    signal.signal(signal.SIGINT, request_drain)
+
+    run_worker_loop(task_storage, batch_storage, runner, lv)
+
+    for storage in (run_storage, insight_record_storage, active_insight_storage, health_storage,
+                    execution_storage, task_storage, batch_storage):
+        storage.disconnect()
@@ -0,0 +1,106 @@
+# tests/insights/test_budget.py
+
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.insights.budget import (
+    RunBudget, TaskStopped, run_table_task, run_table_task_isolated,
+    OUTCOME_CANCELLED, OUTCOME_TIMED_OUT, OUTCOME_MEMORY_EXCEEDED
+)
+from app.models import Insight, InsightRun, ActiveInsight, QueuedTask
+from tests.insights.test_rules import MockLakeView, create_mock_runner
+
+
+def make_rule(rule_id, delay=0.0):
+    def method(table):
+        time.sleep(delay)
+        return Insight(code=rule_id, table="namespace1.table1", message="m", severity="Warning", suggested_action="a")
+    return SimpleNamespace(id=rule_id, method=method)
+
+
+def test_run_stops_between_rules_when_budget_expires(storage_adapter_factory):
+    """Rules left when the deadline passes are skipped; their active insights are kept."""
+    run_storage = storage_adapter_factory(InsightRun)
+    active_storage = storage_adapter_factory(ActiveInsight)
+    active_storage.save(ActiveInsight(
+        table_name="table1", code="RULE_C", namespace="namespace1", severity="Warning",
+        message="from an earlier run", suggested_action="a", last_seen_run_id="old"
+    ))
+    runner = create_mock_runner(MockLakeView(), run_storage, MagicMock(), active_storage)
+    rules = [make_rule("RULE_A"), make_rule("RULE_B", delay=0.2), make_rule("RULE_C")]
+
+    with patch("app.insights.runner.ALL_RULES_OBJECT", rules):
+        results = runner.run_for_table("namespace1.table1", budget=RunBudget(0.1))
+
+    assert [r.code for r in results] == ["RULE_A", "RULE_B"]
+    (run,) = run_storage.get_all()
+    assert run.outcome == OUTCOME_TIMED_OUT
+    assert run.timed_out_rules == ["RULE_C"]
+    active = {a.code: a.last_seen_run_id for a in active_storage.get_all()}
+    assert active == {"RULE_A": run.id, "RULE_B": run.id, "RULE_C": "old"}
+
+
+def test_run_stops_at_rule_boundary_when_cancelled(storage_adapter_factory):
+    """A cancellation seen between rules ends the task as cancelled, keeping the rules that finished."""
+    run_storage = storage_adapter_factory(InsightRun)
+    runner = create_mock_runner(MockLakeView(), run_storage, MagicMock(), storage_adapter_factory(ActiveInsight))
+    rules = [make_rule("RULE_A"), make_rule("RULE_B"), make_rule("RULE_C")]
+    task = QueuedTask(namespace="namespace1", table_name="table1", rules_requested=None, batch_id="b1")
+    checks = iter([False, True])
+
+    with patch("app.insights.runner.ALL_RULES_OBJECT", rules), pytest.raises(TaskStopped) as exc:
+        run_table_task(runner, task, cancelled=lambda: next(checks))
+
+    assert exc.value.outcome == OUTCOME_CANCELLED
+    (run,) = run_storage.get_all()
+    assert run.outcome == OUTCOME_CANCELLED
+    assert run.timed_out_rules == ["RULE_B", "RULE_C"]
+
+
+class HangingRunner:
+    """Finishes one rule, then hangs in the next one like a runaway plan_files()."""
+
+    def __init__(self, failure=None):
+        self.failure = failure
+        self.record_partial_run = MagicMock(return_value=SimpleNamespace(id="partial-run"))
+
+    def run_for_table(self, table_identifier, rule_ids, type, budget, progress):
+        progress("rule_started", "RULE_A", None)
+        progress("rule_finished", "RULE_A", (None, 1.0))
+        progress("rule_started", "RULE_B", None)
+        if self.failure:
+            raise self.failure
+        time.sleep(60)
+
+
+@pytest.fixture
+def table_task():
+    return QueuedTask(namespace="namespace1", table_name="table1", rules_requested=None, batch_id="b1")
+
+
+def test_isolated_task_is_killed_when_a_rule_overruns(table_task):
+    runner = HangingRunner()
+    started = time.monotonic()
+
+    with pytest.raises(TaskStopped) as exc:
+        run_table_task_isolated(runner, table_task, rule_timeout=0.5, task_timeout=0, memory_limit_mb=0)
+
+    assert time.monotonic() - started < 10
+    assert exc.value.outcome == OUTCOME_TIMED_OUT
+    assert "RULE_B" in str(exc.value) and "partial-run" in str(exc.value)
+    partial = runner.record_partial_run.call_args.kwargs
+    assert partial["finished"] == {"RULE_A": (None, 1.0)}
+    assert partial["outcome"] == OUTCOME_TIMED_OUT
+
+
+def test_isolated_task_records_memory_exhaustion(table_task):
+    runner = HangingRunner(failure=MemoryError())
+
+    with pytest.raises(TaskStopped) as exc:
+        run_table_task_isolated(runner, table_task, rule_timeout=0, task_timeout=30, memory_limit_mb=0)
+
+    assert exc.value.outcome == OUTCOME_MEMORY_EXCEEDED
+    assert runner.record_partial_run.call_args.kwargs["finished"] == {"RULE_A": (None, 1.0)}
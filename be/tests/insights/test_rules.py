@@ -13,12 +13,13 @@ from pyiceberg.types import (
 )
 from pyiceberg.schema import Schema
 # Import the real rules file to test the standalone function
-from app.insights.rules import search_for_uuid_column
+from app.insights.rules import search_for_uuid_column, plan_data_files
 # Import the utility function that the runner uses
 from app.insights.utils import get_namespace_and_table_name
 # Import all the models we need to mock and verify
-from app.models import Insight, InsightRun, InsightRecord, ActiveInsight, InsightRunOut, RuleSummaryOut, InsightOccurrence
+from app.models import Insight, InsightRun, InsightRecord, ActiveInsight, InsightRunOut, RuleSummaryOut, InsightOccurrence, TableHealth, RuleExecution
 from types import SimpleNamespace
+from datetime import datetime, timezone, timedelta
 
 # --- Fixtures -----------------------------------------------------------------
 
@@ -178,6 +179,8 @@ def create_mock_runner(lakeview, run_storage_mock, insight_storage_mock, active_
         runner.run_storage = run_storage_mock
         runner.insight_storage = insight_storage_mock
         runner.active_insight_storage = active_insight_storage_mock
+        runner.health_storage = None
+        runner.execution_storage = None
     return runner
 
 # --- Existing Tests -----------------------------------------------------------
@@ -365,33 +368,51 @@ def test_get_summary_by_rule_no_data(run_storage_mock, insight_storage_mock, act
     lakeview = MockLakeView()
     runner = create_mock_runner(lakeview, run_storage_mock, insight_storage_mock, active_insight_storage_mock)
     
-    active_insight_storage_mock.get_by_attributes.return_value = []
+    active_insight_storage_mock.get_aggregate.return_value = []
     
     results = runner.get_summary_by_rule(namespace="namespace1")
     
     assert results == []
-    active_insight_storage_mock.get_by_attributes.assert_called_once_with({'namespace': 'namespace1'})
+    active_insight_storage_mock.get_aggregate.assert_called_once_with(
+        "COUNT", "*", criteria={'namespace': 'namespace1'}, group_by=["code", "namespace", "severity"]
+    )
+    active_insight_storage_mock.find_by_raw_query.assert_not_called()
 
 def test_get_summary_by_rule_with_grouping(run_storage_mock, insight_storage_mock, active_insight_storage_mock):
     """
-    Tests the get_summary_by_rule method, checking its grouping logic.
+    Tests the get_summary_by_rule method, checking how SQL counts and top occurrences are combined.
     """
     lakeview = MockLakeView()
     runner = create_mock_runner(lakeview, run_storage_mock, insight_storage_mock, active_insight_storage_mock)
+    active_insight_storage_mock.table_name = "activeinsights"
 
-    # 1. Mock ActiveInsight data
-    active_1 = ActiveInsight(namespace="ns1", table_name="table1", code="SMALL_FILES", message="msg1", severity="LOW", suggested_action="Action A", last_seen_run_id="r1")
+    # 1. Mock the aggregate counts and the top-N occurrences
+    active_insight_storage_mock.get_aggregate.return_value = [
+        {"code": "SMALL_FILES", "namespace": "ns1", "severity": "LOW", "result": 40},
+        {"code": "SMALL_FILES", "namespace": "ns1", "severity": "HIGH", "result": 2},
+        {"code": "LARGE_FILES", "namespace": "ns1", "severity": "HIGH", "result": 1},
+    ]
+    active_1 = ActiveInsight(namespace="ns1", table_name="table1", code="SMALL_FILES", message="msg1", severity="HIGH", suggested_action="Action A", last_seen_run_id="r1")
     active_2 = ActiveInsight(namespace="ns1", table_name="table2", code="SMALL_FILES", message="msg2", severity="LOW", suggested_action="Action A", last_seen_run_id="r2")
     active_3 = ActiveInsight(namespace="ns1", table_name="table3", code="LARGE_FILES", message="msg3", severity="HIGH", suggested_action="Action B", last_seen_run_id="r3")
-    active_4 = ActiveInsight(namespace="ns2", table_name="table4", code="SMALL_FILES", message="msg4", severity="LOW", suggested_action="Action A", last_seen_run_id="r4")
-    
-    active_insight_storage_mock.get_by_attributes.return_value = [active_1, active_2, active_3]
+    active_insight_storage_mock.find_by_raw_query.return_value = [active_1, active_2, active_3]
+    active_insight_storage_mock.build_where_clause.return_value = (
+        'WHERE "namespace" = :namespace AND "code" IN (:code_0, :code_1)',
+        {"namespace": "ns1", "code_0": "SMALL_FILES", "code_1": "LARGE_FILES"},
+    )
     
     # 2. Call for "ns1"
-    results = runner.get_summary_by_rule(namespace="ns1")
+    results = runner.get_summary_by_rule(namespace="ns1", rule_codes=["SMALL_FILES", "LARGE_FILES"], top_n=2)
     
-    # 3. Check filtering
-    active_insight_storage_mock.get_by_attributes.assert_called_once_with({'namespace': 'ns1'})
+    # 3. Check filtering is pushed to SQL
+    active_insight_storage_mock.build_where_clause.assert_called_once_with(
+        {"namespace": "ns1", "code": ["SMALL_FILES", "LARGE_FILES"]}
+    )
+    query, params = active_insight_storage_mock.find_by_raw_query.call_args[0]
+    assert "ROW_NUMBER() OVER" in query
+    assert '"namespace" = :namespace' in query
+    assert '"code" IN (:code_0, :code_1)' in query
+    assert params == {"namespace": "ns1", "code_0": "SMALL_FILES", "code_1": "LARGE_FILES", "top_n": 2}
     
     # 4. Check grouping
     assert len(results) == 2 # One group for SMALL_FILES, one for LARGE_FILES
@@ -406,12 +427,106 @@ def test_get_summary_by_rule_with_grouping(run_storage_mock, insight_storage_moc
     assert large_files_summary.code == "LARGE_FILES"
     assert large_files_summary.namespace == "ns1"
     assert large_files_summary.suggested_action == "Action B"
+    assert large_files_summary.total_occurrences == 1
     assert len(large_files_summary.occurrences) == 1
     assert large_files_summary.occurrences[0].table_name == "table3"
     
     assert small_files_summary.code == "SMALL_FILES"
     assert small_files_summary.namespace == "ns1"
     assert small_files_summary.suggested_action == "Action A"
-    assert len(small_files_summary.occurrences) == 2
-    assert {o.table_name for o in small_files_summary.occurrences} == {"table1", "table2"}
-    assert isinstance(small_files_summary.occurrences[0], InsightOccurrence)
\ No newline at end of file
+    assert small_files_summary.total_occurrences == 42
+    assert small_files_summary.severity_counts == {"LOW": 40, "HIGH": 2}
+    assert [o.table_name for o in small_files_summary.occurrences] == ["table1", "table2"]
+
+def test_get_summary_by_rule_against_database(storage_adapter_factory):
+    """
+    Runs the summary queries against a real database: top-N per group is ordered
+    by severity, then recency, and the occurrences endpoint pages past it.
+    """
+    active_storage = storage_adapter_factory(ActiveInsight)
+    runner = create_mock_runner(MockLakeView(), MagicMock(), MagicMock(), active_storage)
+
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    active_storage.save_many([
+        ActiveInsight(namespace="ns1", table_name=f"t{i}", code="SMALL_FILES", message=f"m{i}",
+                      severity="Critical" if i == 0 else "Info", suggested_action="Act",
+                      last_seen_run_id=f"r{i}", last_seen_timestamp=base + timedelta(minutes=i))
+        for i in range(5)
+    ] + [
+        ActiveInsight(namespace="ns2", table_name="x", code="SMALL_FILES", message="m", severity="Info",
+                      suggested_action="Act", last_seen_run_id="r", last_seen_timestamp=base),
+    ])
+
+    summary = {s.namespace: s for s in runner.get_summary_by_rule(namespace="*", top_n=2)}
+
+    assert summary["ns1"].total_occurrences == 5
+    assert summary["ns1"].severity_counts == {"Critical": 1, "Info": 4}
+    assert [o.table_name for o in summary["ns1"].occurrences] == ["t0", "t4"]
+    assert summary["ns2"].total_occurrences == 1
+
+    page = runner.get_rule_occurrences(namespace="ns1", code="SMALL_FILES", skip=2, limit=2)
+    assert [o.table_name for o in page] == ["t3", "t2"]
+
+def test_run_for_table_updates_health_scorecard(storage_adapter_factory):
+    """
+    A run rewrites the table's scorecard from its active insights, and the file
+    metrics reuse the plan the rules already made instead of planning again.
+    """
+    active_storage = storage_adapter_factory(ActiveInsight)
+    health_storage = storage_adapter_factory(TableHealth)
+    lakeview = MockLakeView()
+    table = make_mock_table(name="table1", file_count=4, file_size=50_000)
+    table.metadata.snapshots = [1, 2, 3]
+    table.current_snapshot.return_value = SimpleNamespace(snapshot_id=99, summary={"total-records": "10"})
+    lakeview.tables["namespace1.table1"] = table
+
+    def planning_rule(code, severity):
+        rule = MagicMock()
+        rule.id = code
+        rule.method = lambda t: plan_data_files(t) and Insight(
+            table="namespace1.table1", code=code, message="m", severity=severity, suggested_action="a")
+        return rule
+
+    runner = create_mock_runner(lakeview, MagicMock(), MagicMock(), active_storage)
+    runner.health_storage = health_storage
+    rules = [planning_rule("SMALL_FILES", "Warning"), planning_rule("NO_ROWS_TABLE", "Critical")]
+
+    with patch("app.insights.runner.ALL_RULES_OBJECT", rules):
+        runner.run_for_table("namespace1.table1")
+
+    table.scan.assert_called_once()
+    health = runner.get_health_for_table("namespace1", "table1")
+    assert (health.critical_count, health.warning_count, health.health_score) == (1, 1, 110)
+    assert (health.snapshot_id, health.snapshot_count, health.record_count) == ("99", 3, 10)
+    assert (health.file_count, health.small_file_count, health.total_size_bytes) == (4, 4, 200_000)
+
+    health_storage.save(TableHealth(namespace="namespace1", table_name="big", total_size_bytes=10**12))
+    assert [h.table_name for h in runner.get_table_health(sort="size")] == ["big", "table1"]
+    with pytest.raises(ValueError):
+        runner.get_table_health(sort="unknown")
+
+def test_run_for_table_records_timings(storage_adapter_factory):
+    """Each run stores its load time, duration and plan size, and every rule's wall time."""
+    run_storage = storage_adapter_factory(InsightRun)
+    execution_storage = storage_adapter_factory(RuleExecution)
+    lakeview = MockLakeView()
+    runner = create_mock_runner(lakeview, run_storage, MagicMock(), MagicMock())
+    runner.execution_storage = execution_storage
+
+    slow_rule = MagicMock()
+    slow_rule.id = "SLOW_RULE"
+    slow_rule.method = lambda t: plan_data_files(t) and None
+    with patch("app.insights.runner.ALL_RULES_OBJECT", mock_rules_list + [slow_rule]):
+        runner.run_for_table("namespace1.table1")
+        runner.run_for_table("namespace1.table2", rule_ids=["SLOW_RULE"])
+
+    runs = runner.get_run_timings(sort="files")
+    assert [(r.table_name, r.files_scanned) for r in runs] == [("table1", 200), ("table2", 10)]
+    assert runs[0].duration_ms >= runs[0].load_time_ms >= 0
+    assert set(runs[0].rule_timings) == all_rule_ids | {"SLOW_RULE"}
+    assert list(runs[1].rule_timings) == ["SLOW_RULE"]
+
+    performance = {p.rule_id: p for p in runner.get_rule_performance(sort="total")}
+    assert performance["SLOW_RULE"].executions == 2
+    with pytest.raises(ValueError):
+        runner.get_rule_performance(sort="unknown")
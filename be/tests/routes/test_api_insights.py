@@ -5,7 +5,7 @@ from datetime import datetime, timezone
 
 from app.api import app
 from app.dependencies import get_runner
-from app.models import RuleOut, InsightRunOut, RuleSummaryOut, InsightOccurrence
+from app.models import RuleOut, InsightRunOut, RuleSummaryOut, InsightOccurrence, TableHealth, RulePerformanceOut
 
 # Mock runner to be used in tests
 mock_runner = MagicMock()
@@ -87,6 +87,54 @@ def test_get_insights_summary_for_table_with_rules_filter(client: TestClient):
         namespace="ns1", table_name="tableB", rule_codes=['RULE_A', 'RULE_B']
     )
 
+def test_get_insight_occurrences_paginated(client: TestClient):
+    """Test paging through the occurrences of a single rule."""
+    mock_runner.get_rule_occurrences.return_value = [
+        InsightOccurrence(table_name="table9", severity="Info", message="msg", timestamp=datetime.now(timezone.utc))
+    ]
+
+    response = client.get("/api/namespaces/ns1/insights/summary/SMALL_FILES/occurrences?skip=20&limit=10")
+
+    assert response.status_code == 200
+    assert response.json()[0]['table_name'] == "table9"
+    mock_runner.get_rule_occurrences.assert_called_once_with(
+        namespace="ns1", code="SMALL_FILES", table_name=None, skip=20, limit=10
+    )
+
+def test_get_tables_health_ranking(client: TestClient):
+    """Test ranking tables by their health scorecard."""
+    mock_runner.get_table_health.return_value = [
+        TableHealth(namespace="ns1", table_name="table1", warning_count=2, health_score=20)
+    ]
+
+    response = client.get("/api/lakehouse/health/tables?sort=small_files&limit=5")
+
+    assert response.status_code == 200
+    assert response.json()[0]['table_name'] == "table1"
+    assert response.json()[0]['health_score'] == 20
+    mock_runner.get_table_health.assert_called_once_with(namespace="*", sort="small_files", skip=0, limit=5)
+
+def test_get_tables_health_invalid_sort(client: TestClient):
+    """An unknown sort key is rejected with a 400."""
+    mock_runner.get_table_health.side_effect = ValueError("Invalid sort 'foo'")
+
+    response = client.get("/api/lakehouse/health/tables?sort=foo")
+
+    assert response.status_code == 400
+    mock_runner.get_table_health.side_effect = None
+
+def test_get_rule_performance(client: TestClient):
+    """Test listing the slowest rules."""
+    mock_runner.get_rule_performance.return_value = [
+        RulePerformanceOut(rule_id="SKEWED_OR_LARGEST_PARTITIONS_TABLE", executions=3, avg_ms=900.0, max_ms=2000.0, total_ms=2700.0)
+    ]
+
+    response = client.get("/api/lakehouse/insights/performance/rules?sort=max&limit=10")
+
+    assert response.status_code == 200
+    assert response.json()[0]["max_ms"] == 2000.0
+    mock_runner.get_rule_performance.assert_called_once_with(namespace="*", sort="max", limit=10)
+
 @patch('app.api.insights.ALL_RULES_OBJECT')
 def test_get_insight_rules(mock_all_rules, client: TestClient):
     """Test the endpoint that returns all available insight rules."""
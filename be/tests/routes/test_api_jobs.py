@@ -4,7 +4,7 @@ from fastapi.testclient import TestClient
 from datetime import datetime, timezone
 
 # These models are needed to construct mock return values and request bodies
-from app.models import BackgroundJob, JobSchedule, StatusResponse
+from app.models import BackgroundJob, JobSchedule, StatusResponse, QueueStatsOut
 
 # The 'client' fixture is provided by conftest.py
 
@@ -57,6 +57,29 @@ def test_get_run_status_not_found(client: TestClient):
     assert response.status_code == 404
     assert response.json()["detail"] == "Run ID not found."
 
+def test_cancel_run(client: TestClient):
+    """Cancelling a running batch skips its pending tasks; finished batches cannot be cancelled."""
+    mock_job = BackgroundJob(
+        id="job-123", status="running", details="Processing...",
+        namespace="ns1", table_name=None, rules_requested=[]
+    )
+    with patch("app.api.jobs.background_job_storage", MagicMock()) as mock_job_storage,\
+        patch("app.api.jobs.queued_task_storage", MagicMock()) as mock_queue_storage,\
+        patch("app.api.jobs.cancel_batch") as mock_cancel:
+        mock_job_storage.get_by_id.return_value = mock_job
+        response = client.post(f"/api/jobs/{mock_job.id}/cancel")
+
+        mock_job.status = "complete"
+        already_finished = client.post(f"/api/jobs/{mock_job.id}/cancel")
+
+        mock_job_storage.get_by_id.return_value = None
+        missing = client.post("/api/jobs/job-not-found/cancel")
+
+    assert response.status_code == 200
+    mock_cancel.assert_called_once_with(mock_job, mock_queue_storage, mock_job_storage)
+    assert already_finished.status_code == 409
+    assert missing.status_code == 404
+
 def test_create_schedule_success(client: TestClient):
     """Test creating a valid job schedule."""
     schedule_request = {
@@ -130,3 +153,26 @@ def test_list_schedules_for_lakehouse(client: TestClient):
     # Check that it correctly queries for schedules with no table_name
     mock_schedule_storage.get_by_attributes.assert_called_once_with({"table_name": None})
 
+def test_get_db_pool_stats(client: TestClient):
+    """Test the endpoint exposing the shared connection pools."""
+    stats = [{"url": "postgresql://u:***@db/lv", "storages": 7, "pool": "QueuePool", "checked_out": 1}]
+    with patch("app.api.jobs.pool_stats", return_value=stats):
+        response = client.get("/api/jobs/db-pool")
+
+    assert response.status_code == 200
+    assert response.json()[0]["storages"] == 7
+
+def test_read_queue_stats(client: TestClient):
+    """Test the queue analytics endpoint and its window validation."""
+    stats = QueueStatsOut(
+        window_minutes=30, pending=4, running=1, depth_by_priority=[], batches=[],
+        completed_in_window=60, failed_in_window=0, throughput_per_minute=2.0, workers=[]
+    )
+    with patch("app.api.jobs.get_queue_stats", return_value=stats) as mock_stats:
+        response = client.get("/api/jobs/queue-stats?window_minutes=30")
+        invalid = client.get("/api/jobs/queue-stats?window_minutes=0")
+
+    assert response.status_code == 200
+    assert response.json()["throughput_per_minute"] == 2.0
+    assert mock_stats.call_args[0][1] == 30
+    assert invalid.status_code == 422
@@ -1,10 +1,16 @@
+import time
+from datetime import datetime
+
 import pytest
 from unittest.mock import MagicMock, patch
 from fastapi.testclient import TestClient
 import pandas as pd
+import pyarrow as pa
 
 from app.api import app
 from app.dependencies import get_table, check_auth
+from app.exceptions import QueryCancelled, QueryPoolSaturated
+from app.models import QueryCostOut
 
 # The 'client' fixture is provided by conftest.py
 
@@ -57,15 +63,13 @@ def test_read_tables_for_namespace(client: TestClient):
 # --- Table Detail Endpoint Tests ---
 
 @patch('app.api.tables.lv')
-@patch('app.api.tables.df_to_records')
-def test_read_table_snapshots(mock_df_to_records, mock_lv, client: TestClient):
+def test_read_table_snapshots(mock_lv, client: TestClient):
     """Test retrieving snapshot data for a table."""
     mock_table_obj = MagicMock()
     # Mock the `get_table` dependency to return our mock table
     app.dependency_overrides[get_table] = lambda: mock_table_obj
 
-    # Mock the return value of the function that converts a DataFrame to JSON
-    mock_df_to_records.return_value = [{"snapshot_id": 123, "records": 100}]
+    mock_lv.get_snapshot_data.return_value = pa.table({"snapshot_id": [123], "records": [100]})
     
     response = client.get("/api/tables/ns1.table1/snapshots")
 
@@ -73,8 +77,28 @@ def test_read_table_snapshots(mock_df_to_records, mock_lv, client: TestClient):
     assert response.json() == [{"snapshot_id": 123, "records": 100}]
     
     # Verify that the catalog was called with the mock table from the dependency
-    mock_lv.get_snapshot_data.assert_called_once_with(mock_table_obj)
-    mock_df_to_records.assert_called_once()
+    mock_lv.get_snapshot_data.assert_called_once_with(mock_table_obj, None, None, None, None)
+
+@patch('app.api.tables.lv')
+def test_read_table_snapshots_page(mock_lv, client: TestClient):
+    """With a limit, a page of snapshots is returned with the cursor of the next page."""
+    mock_table_obj = MagicMock()
+    app.dependency_overrides[get_table] = lambda: mock_table_obj
+    mock_lv.get_snapshot_page.return_value = (pa.table({"snapshot_id": [123], "id": [0]}), "1700000000000:123")
+
+    response = client.get(
+        "/api/tables/ns1.table1/snapshots?limit=1&operation=append&operation=overwrite&columns=snapshot_id"
+    )
+    mock_lv.get_snapshot_page.side_effect = ValueError("abc is not a valid snapshot cursor")
+    rejected = client.get("/api/tables/ns1.table1/snapshots?limit=1&cursor=abc")
+    app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.json() == {"rows": [{"snapshot_id": 123, "id": 0}], "next_cursor": "1700000000000:123"}
+    mock_lv.get_snapshot_page.assert_any_call(
+        mock_table_obj, 1, None, None, None, ["append", "overwrite"], ["snapshot_id"]
+    )
+    assert rejected.status_code == 418
 
     app.dependency_overrides.clear()
 
@@ -84,16 +108,85 @@ def test_read_schema_data(mock_lv, client: TestClient):
     mock_table_obj = MagicMock()
     app.dependency_overrides[get_table] = lambda: mock_table_obj
     
-    # Mock the underlying catalog and conversion functions
-    with patch('app.api.tables.df_to_records') as mock_df_to_records:
-        mock_df_to_records.return_value = [{"field": "id", "type": "long"}]
-        response = client.get("/api/tables/ns1.table1/schema")
+    mock_lv.get_schema.return_value = pa.table({"field": ["id"], "type": ["long"]})
+    response = client.get("/api/tables/ns1.table1/schema")
 
     assert response.status_code == 200
     assert response.json() == [{"field": "id", "type": "long"}]
     mock_lv.get_schema.assert_called_once_with(mock_table_obj)
     app.dependency_overrides.clear()
 
+@patch('app.api.tables.lv')
+def test_read_partitions_page_and_stats(mock_lv, client: TestClient):
+    """Partitions can be paged in a sort order, and summarized."""
+    mock_table_obj = MagicMock()
+    app.dependency_overrides[get_table] = lambda: mock_table_obj
+    mock_lv.get_partition_page.return_value = (pa.table({"partition": [{"dt": 1}], "record_count": [10]}), 3)
+    mock_lv.get_partition_stats.return_value = {
+        "partitions": 3,
+        "size": {"min": 1, "median": 2, "p99": 3, "max": 3},
+        "records": {"min": 10, "median": 10, "p99": 10, "max": 10},
+        "size_histogram": [{"from": 1, "to": 2, "partitions": 1}, {"from": 2, "to": 4, "partitions": 2}],
+    }
+
+    with patch('app.api.tables.authz_') as mock_authz:
+        mock_authz.has_access.return_value = True
+        page = client.get("/api/tables/ns1.table1/partitions?sort_by=records&descending=true&limit=1")
+        stats = client.get("/api/tables/ns1.table1/partitions/stats")
+    app.dependency_overrides.clear()
+
+    assert page.json() == {"total_partitions": 3, "offset": 0, "rows": [{"partition": {"dt": 1}, "record_count": 10}]}
+    mock_lv.get_partition_page.assert_called_once_with(mock_table_obj, 0, 1, "records", True)
+    assert stats.status_code == 200
+    assert stats.json() == mock_lv.get_partition_stats.return_value
+
+def test_read_partition_stats_authz_failure(client: TestClient):
+    """Partition statistics need access to the table, like its partitions."""
+    app.dependency_overrides[get_table] = lambda: MagicMock()
+
+    with patch('app.api.tables.authz_') as mock_authz, patch('app.api.tables.lv') as mock_lv:
+        def auth_fail(request, response, table_id):
+            response.status_code = 403
+            return None
+        mock_authz.has_access.side_effect = auth_fail
+        response = client.get("/api/tables/ns1.table1/partitions/stats")
+    app.dependency_overrides.clear()
+
+    assert response.status_code == 403
+    mock_lv.get_partition_stats.assert_not_called()
+
+@patch('app.api.tables.lv')
+def test_read_data_change_window_and_buckets(mock_lv, client: TestClient):
+    """The data-change window and bucket are passed on; unknown buckets are rejected."""
+    mock_table_obj = MagicMock()
+    app.dependency_overrides[get_table] = lambda: mock_table_obj
+    mock_lv.get_data_change.return_value = pa.table(
+        {"committed_at": ["2024-01-02 00:00:00"], "snapshots": [3], "added-records": [9]}
+    )
+
+    response = client.get("/api/tables/ns1.table1/data-change?since=2024-01-01T00:00:00&bucket=day")
+    rejected = client.get("/api/tables/ns1.table1/data-change?bucket=week")
+    app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.json() == [{"committed_at": "2024-01-02 00:00:00", "snapshots": 3, "added-records": 9}]
+    mock_lv.get_data_change.assert_called_once_with(mock_table_obj, datetime(2024, 1, 1), None, "day")
+    assert rejected.status_code == 422
+
+@patch('app.api.tables.lv')
+def test_metrics_record_route_template(mock_lv, client: TestClient):
+    """Table handler latencies are exported per route template, not per table id."""
+    app.dependency_overrides[get_table] = lambda: MagicMock()
+    mock_lv.get_schema.return_value = pa.table({})
+    client.get("/api/tables/ns1.table1/schema")
+    app.dependency_overrides.clear()
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert 'route="/api/tables/{table_id}/schema"' in response.text
+    assert "ns1.table1" not in response.text
+
 # --- Authorization Tests ---
 
 def test_read_sample_data_authz_success(client: TestClient):
@@ -103,19 +196,116 @@ def test_read_sample_data_authz_success(client: TestClient):
 
     # Patch the dependencies used within the endpoint
     with patch('app.api.tables.authz_') as mock_authz, \
-         patch('app.api.tables.lv') as mock_lv, \
-         patch('app.api.tables.df_to_records') as mock_df_to_records:
+         patch('app.api.tables.lv') as mock_lv:
         
         # Simulate successful authorization check
         mock_authz.has_access.return_value = True
-        mock_df_to_records.return_value = [{"col_a": 1, "col_b": "xyz"}]
+        mock_lv.get_sample_table.return_value = pa.table({"col_a": [1], "col_b": ["xyz"]})
         
         response = client.get("/api/tables/ns1.table1/sample")
 
     assert response.status_code == 200
     assert response.json() == [{"col_a": 1, "col_b": "xyz"}]
     mock_authz.has_access.assert_called_once()
-    mock_lv.get_sample_data.assert_called_once()
+    mock_lv.get_sample_table.assert_called_once()
+    app.dependency_overrides.clear()
+
+
+def test_estimate_sample_query(client: TestClient):
+    """The dry run returns the estimate for the caller's budget."""
+    app.dependency_overrides[get_table] = lambda: MagicMock()
+    estimate = QueryCostOut(
+        files=2, bytes=2048, rows=10, estimated_seconds=0.1, planned=True, row_filter="AlwaysTrue()",
+        selected_fields=["id"], limit=None, max_files=1, max_bytes=0, within_budget=False,
+        budget_message="too many files"
+    )
+
+    with patch('app.api.tables.authz_') as mock_authz, \
+         patch('app.api.tables.lv') as mock_lv:
+        mock_authz.has_access.return_value = True
+        mock_lv.estimate_sample_query.return_value = estimate
+
+        response = client.get("/api/tables/ns1.table1/sample/estimate?sql=select id from ns1.table1")
+
+    assert response.status_code == 200
+    assert response.json() == estimate.model_dump()
+    assert mock_lv.estimate_sample_query.call_args.args[1] == "select id from ns1.table1"
+    app.dependency_overrides.clear()
+
+
+def test_read_sample_data_cancelled_query(client: TestClient):
+    """A sample query aborted because its client went away answers 499 instead of an error."""
+    app.dependency_overrides[get_table] = lambda: MagicMock()
+
+    with patch('app.api.tables.authz_') as mock_authz, \
+         patch('app.api.tables.lv') as mock_lv:
+        mock_authz.has_access.return_value = True
+        mock_lv.get_sample_table.side_effect = QueryCancelled("Query cancelled")
+
+        response = client.get("/api/tables/ns1.table1/sample?sql=select * from ns1.table1")
+
+    assert response.status_code == 499
+    cancelled = mock_lv.get_sample_table.call_args.args[3]
+    assert cancelled.is_set()
+    app.dependency_overrides.clear()
+
+
+def test_read_sample_data_of_partition(client: TestClient):
+    """The partition record is passed on decoded; a malformed one is reported as an error."""
+    app.dependency_overrides[get_table] = lambda: MagicMock()
+
+    with patch('app.api.tables.authz_') as mock_authz, \
+         patch('app.api.tables.lv') as mock_lv:
+        mock_authz.has_access.return_value = True
+        mock_lv.get_sample_table.return_value = pa.table({})
+
+        response = client.get('/api/tables/ns1.table1/sample?partition={"dt_day": "2024-01-02"}')
+        malformed = client.get('/api/tables/ns1.table1/sample?partition={dt_day')
+
+    assert response.status_code == 200
+    assert mock_lv.get_sample_table.call_args.kwargs["partition"] == {"dt_day": "2024-01-02"}
+    assert malformed.status_code == 418
+    app.dependency_overrides.clear()
+
+
+def test_read_sample_data_pool_saturated(client: TestClient):
+    """A query the query pool cannot take is refused with 429 and a Retry-After."""
+    app.dependency_overrides[get_table] = lambda: MagicMock()
+
+    with patch('app.api.tables.authz_') as mock_authz, \
+         patch('app.api.tables.lv') as mock_lv, \
+         patch('app.api.tables.query_pool.run', side_effect=QueryPoolSaturated("busy", 5)):
+        mock_authz.has_access.return_value = True
+
+        response = client.get("/api/tables/ns1.table1/sample?sql=select * from ns1.table1")
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
+    assert response.json()["message"] == "busy"
+    mock_lv.get_sample_table.assert_not_called()
+    app.dependency_overrides.clear()
+
+
+def test_paginated_sample_query_is_paged_from_the_stored_result(client: TestClient):
+    """The query runs once; later pages come from the stored result."""
+    app.dependency_overrides[get_table] = lambda: MagicMock()
+
+    with patch('app.api.tables.authz_') as mock_authz, \
+         patch('app.api.tables.lv') as mock_lv:
+        mock_authz.has_access.return_value = True
+        mock_lv.get_sample_table.return_value = pa.table({"id": list(range(25))})
+
+        first = client.get("/api/tables/ns1.table1/sample?sql=select id from ns1.table1&paginate=true&page_size=10")
+        handle = first.json()["handle"]
+        sorted_page = client.get(f"/api/results/{handle}?offset=10&limit=10&sort_by=id&descending=true")
+        missing = client.get("/api/results/unknown")
+
+    assert first.status_code == 200
+    assert first.json()["total_rows"] == 25
+    assert [row["id"] for row in first.json()["rows"]] == list(range(10))
+    assert [row["id"] for row in sorted_page.json()["rows"]] == list(range(14, 4, -1))
+    assert missing.status_code == 404
+    mock_lv.get_sample_table.assert_called_once()
     app.dependency_overrides.clear()
 
 
@@ -142,3 +332,28 @@ def test_read_partitions_authz_failure(client: TestClient):
     assert response.status_code == 403
     app.dependency_overrides.clear()
 
+
+
+@patch('app.api.tables.lv')
+def test_request_profiling_with_token(mock_lv, client: TestClient, tmp_path):
+    """An authorized profiling request stores a speedscope profile of the handler's thread."""
+    app.dependency_overrides[get_table] = lambda: MagicMock()
+    mock_lv.get_schema.side_effect = lambda table: time.sleep(0.1) or pa.table({})
+
+    with patch('app.profiling.PROFILING_TOKEN', "secret"), \
+         patch('app.profiling.PROFILE_DIR', str(tmp_path)):
+        unprofiled = client.get("/api/tables/ns1.table1/schema", headers={"X-Profile-Token": "wrong"})
+        response = client.get("/api/tables/ns1.table1/schema", headers={"X-Profile-Token": "secret"})
+        profile_id = response.headers["X-Profile-Id"]
+        forbidden = client.get(f"/api/profiles/{profile_id}")
+        profile = client.get(f"/api/profiles/{profile_id}", headers={"X-Profile-Token": "secret"})
+    app.dependency_overrides.clear()
+
+    assert "X-Profile-Id" not in unprofiled.headers
+    assert forbidden.status_code == 403
+    assert profile.status_code == 200
+    body = profile.json()
+    assert body["profiles"][0]["type"] == "sampled"
+    assert body["profiles"][0]["samples"]
+    frame_names = {frame["name"] for frame in body["shared"]["frames"]}
+    assert "read_schema_data" in frame_names
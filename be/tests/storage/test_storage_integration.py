@@ -1,5 +1,11 @@
 import pytest
+from dataclasses import field, make_dataclass
 from datetime import datetime, timezone
+from typing import Optional
+
+from app.storage import sqlalchemy_adapter
+from app.storage.engines import pool_stats
+from app.storage.sqlalchemy_adapter import SQLAlchemyStorage
 
 # Note: The dataclass definitions and all fixtures are now in conftest.py
 # We don't need to define them here.
@@ -344,6 +350,21 @@ def test_find_by_raw_query_deserializes(complex_item_storage, complex_item_model
     assert retrieved.tags == ["raw", "sql"]
     assert isinstance(retrieved.created_at, datetime)
 
+def test_build_where_clause_in_raw_query(complex_item_storage, complex_item_model):
+    """Test that raw queries filter like get_by_attributes: IS NULL, empty IN lists and JSON fields."""
+    storage = complex_item_storage
+    item1 = complex_item_model(id="where:1", name="Tagged", age=1, metadata={"k": "v"})
+    item2 = complex_item_model(id="where:2", name="Active", age=1, status="active", metadata={"k": "v"})
+    storage.save_many([item1, item2])
+
+    where_sql, params = storage.build_where_clause({"status": None, "metadata": {"k": "v"}})
+    results = storage.find_by_raw_query(f"SELECT * FROM {storage.table_name} {where_sql}", params)
+    assert results == [item1]
+
+    where_sql, params = storage.build_where_clause({"name": []})
+    assert storage.find_by_raw_query(f"SELECT * FROM {storage.table_name} {where_sql}", params) == []
+    assert storage.build_where_clause({}) == ("", {})
+
 def test_execute_raw_select_query_non_select_raises(storage_adapter):
     """Test that execute_raw_select_query blocks non-SELECT statements."""
     storage = storage_adapter
@@ -354,3 +375,109 @@ def test_execute_raw_select_query_non_select_raises(storage_adapter):
         
     with pytest.raises(ValueError, match="only supports SELECT queries"):
         storage.execute_raw_select_query(f"  UPDATE {table_name} SET name = 'hacked'")
+
+# --- Tests for Read-Replica Routing -----------------------------------------
+
+@pytest.fixture
+def replicated_storage(tmp_path, user_model, monkeypatch):
+    """A primary/replica pair of SQLite files holding different rows, to see where reads go."""
+    monkeypatch.setattr(sqlalchemy_adapter, "_last_write_at", {})
+    primary_url = f"sqlite:///{tmp_path / 'primary.db'}"
+    replica_url = f"sqlite:///{tmp_path / 'replica.db'}"
+
+    replica = SQLAlchemyStorage(replica_url, user_model)
+    replica.connect()
+    replica.ensure_table()
+    replica.save(user_model(id="user:replica", name="Replica", email="r@example.com"))
+    sqlalchemy_adapter._last_write_at.clear()
+
+    def _factory(read_urls=(replica_url,), max_staleness_seconds=60.0):
+        storage = SQLAlchemyStorage(primary_url, user_model, read_urls=list(read_urls),
+                                    max_staleness_seconds=max_staleness_seconds)
+        storage.connect()
+        storage.ensure_table()
+        created.append(storage)
+        return storage
+
+    created = [replica]
+    yield _factory
+    for storage in created:
+        storage.disconnect()
+
+def test_reads_go_to_replica(replicated_storage):
+    """Without a recent local write, get_* and raw selects are served by the replica."""
+    storage = replicated_storage()
+
+    assert [u.id for u in storage.get_all()] == ["user:replica"]
+    assert storage.get_aggregate("COUNT", "*") == 1
+    assert storage.execute_raw_select_query(f"SELECT id FROM {storage.table_name}") == [{"id": "user:replica"}]
+
+def test_reads_after_local_write_go_to_primary(replicated_storage, user_model):
+    """A write pins reads to the primary for the staleness window (read-your-writes)."""
+    storage = replicated_storage(max_staleness_seconds=60.0)
+    storage.save(user_model(id="user:primary", name="Primary", email="p@example.com"))
+    assert storage.get_by_id("user:primary") is not None
+
+    zero_window = replicated_storage(max_staleness_seconds=0.0)
+    assert zero_window.get_by_id("user:primary") is None
+
+def test_unreachable_replica_falls_back_to_primary(replicated_storage, tmp_path):
+    """A replica that cannot be reached does not fail the read."""
+    storage = replicated_storage(read_urls=[f"sqlite:///{tmp_path / 'missing' / 'replica.db'}"])
+
+    assert storage.get_all() == []
+
+# --- Tests for the Shared Engine Registry ------------------------------------
+
+def test_storages_share_one_engine_per_url(tmp_path, user_model, complex_item_model):
+    """Storages on the same URL share an engine until the last one disconnects."""
+    url = f"sqlite:///{tmp_path / 'shared.db'}"
+    users = SQLAlchemyStorage(url, user_model)
+    items = SQLAlchemyStorage(url, complex_item_model)
+    users.connect()
+    items.connect()
+
+    assert users._get_engine() is items._get_engine()
+    stats = [s for s in pool_stats() if s["url"] == url]
+    assert len(stats) == 1 and stats[0]["storages"] == 2
+
+    users.disconnect()
+    assert [s["storages"] for s in pool_stats() if s["url"] == url] == [1]
+    items.disconnect()
+    assert not [s for s in pool_stats() if s["url"] == url]
+
+def test_in_memory_storages_do_not_share_engines(user_model):
+    """Each in-memory SQLite storage keeps its own private database."""
+    first = SQLAlchemyStorage("sqlite:///:memory:", user_model)
+    second = SQLAlchemyStorage("sqlite:///:memory:", user_model)
+    first.connect()
+    second.connect()
+    try:
+        assert first._get_engine() is not second._get_engine()
+    finally:
+        first.disconnect()
+        second.disconnect()
+
+def test_ensure_table_adds_missing_columns(tmp_path, user_model, complex_item_model):
+    """New model fields become nullable columns on a table created by an older version."""
+    url = f"sqlite:///{tmp_path / 'migrate.db'}"
+    old = SQLAlchemyStorage(url, user_model)
+    old.connect()
+    old.ensure_table()
+    old.save(user_model(id="user:1", name="Alice", email="a@example.com"))
+
+    # Same table name, one more field
+    ExtendedUser = make_dataclass("User", [
+        ("id", str), ("name", str), ("email", str), ("is_active", bool, field(default=True)),
+        ("age", Optional[int], field(default=None)),
+    ])
+    new = SQLAlchemyStorage(url, ExtendedUser)
+    new.connect()
+    try:
+        new.ensure_table()
+        assert new.get_by_id("user:1").age is None
+        new.save(ExtendedUser(id="user:2", name="Bob", email="b@example.com", age=30))
+        assert new.get_by_id("user:2").age == 30
+    finally:
+        new.disconnect()
+        old.disconnect()
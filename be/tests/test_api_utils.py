@@ -0,0 +1,50 @@
+import datetime as dt
+import decimal
+import math
+
+import pyarrow as pa
+
+from app.api_utils import arrow_to_records
+
+
+def test_values_are_converted_to_json_values():
+    table = pa.table({
+        "ts": pa.array([dt.datetime(2024, 1, 2, 3, 4, 5), None], pa.timestamp("us")),
+        "day": pa.array([dt.date(2024, 1, 2), None]),
+        "amount": pa.array([decimal.Decimal("1.50"), None], pa.decimal128(10, 2)),
+        "payload": pa.array([b"\x00\x01", None]),
+        "ratio": pa.array([math.nan, 0.5]),
+        "name": pa.array(["a", None]),
+    })
+
+    assert arrow_to_records(table) == [
+        {"ts": "2024-01-02 03:04:05.000000", "day": "2024-01-02", "amount": 1.5,
+         "payload": "__binary_data__", "ratio": None, "name": "a"},
+        {"ts": None, "day": None, "amount": None, "payload": None, "ratio": 0.5, "name": None},
+    ]
+
+
+def test_nested_values_are_converted_through_their_children():
+    table = pa.table({
+        "point": pa.array([{"at": dt.date(2024, 1, 2), "v": math.inf}, None]),
+        "tags": pa.array([[("k", b"v")], None], pa.map_(pa.string(), pa.binary())),
+        "days": pa.array([[dt.date(2024, 1, 2), None], []]),
+    })
+
+    assert arrow_to_records(table) == [
+        {"point": {"at": "2024-01-02", "v": None}, "tags": [("k", "__binary_data__")],
+         "days": ["2024-01-02", None]},
+        {"point": None, "tags": None, "days": []},
+    ]
+
+
+def test_sliced_and_chunked_tables_keep_their_rows():
+    table = pa.concat_tables([
+        pa.table({"days": pa.array([[dt.date(2024, 1, d)] for d in range(1, 4)])}),
+        pa.table({"days": pa.array([None, [dt.date(2024, 1, 9)]], pa.list_(pa.date32()))}),
+    ])
+
+    assert arrow_to_records(table.slice(2, 3)) == [
+        {"days": ["2024-01-03"]}, {"days": None}, {"days": ["2024-01-09"]},
+    ]
+    assert arrow_to_records(table.slice(0, 0)) == []
@@ -0,0 +1,66 @@
+import datetime as dt
+from unittest.mock import patch
+
+import pyarrow as pa
+
+from app import data_change
+from app.lakeviewer import LakeView
+from tests.test_sql_pushdown import make_events_table
+
+HOUR_MS = 3_600_000
+
+
+def history(*summaries) -> pa.Table:
+    """Snapshots committed an hour apart, like Table.inspect.snapshots()."""
+    return pa.table({
+        "committed_at": pa.array([i * HOUR_MS for i in range(len(summaries))], pa.timestamp("ms")),
+        "summary": pa.array([list(s.items()) for s in summaries], pa.map_(pa.string(), pa.string())),
+    })
+
+
+def test_summaries_are_exploded_into_typed_columns():
+    changes = data_change.explode_summaries(history(
+        {"added-records": "3", "total-records": "3", "engine": "spark"},
+        {"deleted-records": "1", "total-records": "2"},
+    ))
+
+    assert changes.column_names == ["committed_at", "added-records", "total-records", "engine", "deleted-records"]
+    assert changes["added-records"].type == pa.int64()
+    assert changes.drop(["committed_at"]).to_pylist() == [
+        {"added-records": 3, "total-records": 3, "engine": "spark", "deleted-records": None},
+        {"added-records": None, "total-records": 2, "engine": None, "deleted-records": 1},
+    ]
+
+
+def test_buckets_sum_changes_and_keep_the_last_totals():
+    changes = data_change.explode_summaries(history(*(
+        {"added-records": str(i), "total-records": str(i * 10), "engine": "spark"} for i in range(1, 27)
+    )))
+
+    days = data_change.downsample(changes, "day")
+
+    assert days.column_names == ["committed_at", "snapshots", "added-records", "total-records"]
+    assert days.drop(["committed_at"]).to_pylist() == [
+        {"snapshots": 24, "added-records": sum(range(1, 25)), "total-records": 240},
+        {"snapshots": 2, "added-records": 25 + 26, "total-records": 260},
+    ]
+
+
+def test_history_is_cut_to_the_window_and_cached_per_metadata_location(tmp_path):
+    table = make_events_table(tmp_path)
+    lv = LakeView()
+    committed = table.inspect.snapshots()["committed_at"].to_pylist()
+    data_change._cache.clear()
+
+    assert lv.get_data_change(table)["added-records"].to_pylist() == [3, 3, 3]
+    with patch.object(type(table), "inspect") as inspect:
+        window = lv.get_data_change(table, since=committed[1], until=committed[2])
+        whole = lv.get_data_change(table, bucket="day")
+    inspect.snapshots.assert_not_called()
+
+    assert window["total-records"].to_pylist() == [6]
+    assert whole["snapshots"].to_pylist() == [3]
+    assert whole["added-records"].to_pylist() == [9]
+    assert whole["total-records"].to_pylist() == [9]
+    assert whole["committed_at"].to_pylist() == [committed[0].strftime("%Y-%m-%d 00:00:00")]
+    assert window["committed_at"].to_pylist() == [committed[1].strftime("%Y-%m-%d %H:%M:%S")]
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app.lakeviewer import LakeView
+
+BE_DIR = Path(__file__).resolve().parents[1]
+
+# Dependencies only the API's table endpoints need; importing a process entry point
+# must not pull them in.
+HEAVY_MODULES = ("daft", "pandas", "sqlglot", "humanize", "google.auth")
+
+
+def imported_heavy_modules(module: str):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(BE_DIR), str(BE_DIR / "app")]))
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=BE_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    last_line = (result.stdout.strip().splitlines() or [""])[-1]
+    return [m for m in last_line.split(",") if m]
+
+
+@pytest.mark.parametrize("module", ["app.worker", "app.scheduler"])
+def test_entry_points_do_not_import_heavy_dependencies(module):
+    assert imported_heavy_modules(module) == []
+
+
+def test_lakeview_loads_catalog_on_first_use():
+    with patch("app.lakeviewer.catalog.load_catalog") as load_catalog:
+        lv = LakeView()
+        load_catalog.assert_not_called()
+
+        lv.get_tables("ns1")
+        lv.get_tables("ns1")
+
+    load_catalog.assert_called_once_with("default")
@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from pyiceberg.catalog.sql import SqlCatalog
+from pyiceberg.expressions import And, EqualTo, GreaterThanOrEqual, LessThan, StartsWith
+from pyiceberg.io.pyarrow import ArrowScan
+from pyiceberg.partitioning import PartitionField, PartitionSpec
+from pyiceberg.schema import Schema
+from pyiceberg.transforms import BucketTransform, DayTransform, HourTransform, MonthTransform, TruncateTransform
+from pyiceberg.types import LongType, NestedField, StringType, TimestampType
+
+from app.api_utils import arrow_to_records
+from app.lakeviewer import LakeView
+from app.partition_filter import partition_selection
+from app.sampling import sample_files
+from tests.test_sql_pushdown import make_events_table
+
+MICROS_PER_HOUR = 3_600_000_000
+
+
+@pytest.fixture
+def clicks(tmp_path):
+    """A table partitioned by transforms of its columns, without data."""
+    catalog = SqlCatalog("test", uri=f"sqlite:///{tmp_path}/catalog.db", warehouse=f"file://{tmp_path}/warehouse")
+    catalog.create_namespace("db")
+    schema = Schema(
+        NestedField(1, "id", LongType()),
+        NestedField(2, "ts", TimestampType()),
+        NestedField(3, "url", StringType()),
+    )
+    return catalog.create_table("db.clicks", schema, partition_spec=PartitionSpec(
+        PartitionField(2, 1000, DayTransform(), "ts_day"),
+        PartitionField(2, 1001, HourTransform(), "ts_hour"),
+        PartitionField(2, 1002, MonthTransform(), "ts_month"),
+        PartitionField(3, 1003, TruncateTransform(4), "url_trunc"),
+        PartitionField(1, 1004, TruncateTransform(100), "id_trunc"),
+        PartitionField(1, 1005, BucketTransform(8), "id_bucket"),
+    ))
+
+
+@pytest.mark.parametrize("partition, row_filter", [
+    ({"ts_day": "2024-01-02"},  # 19724 days since the epoch
+     And(GreaterThanOrEqual("ts", 19724 * 24 * MICROS_PER_HOUR), LessThan("ts", 19725 * 24 * MICROS_PER_HOUR))),
+    ({"ts_hour": 10}, And(GreaterThanOrEqual("ts", 10 * MICROS_PER_HOUR), LessThan("ts", 11 * MICROS_PER_HOUR))),
+    ({"ts_month": 13},  # 1971-02
+     And(GreaterThanOrEqual("ts", 396 * 24 * MICROS_PER_HOUR), LessThan("ts", 424 * 24 * MICROS_PER_HOUR))),
+    ({"url_trunc": "http"}, StartsWith("url", "http")),
+    ({"url_trunc": "ftp"}, EqualTo("url", "ftp")),
+    ({"id_trunc": "200"}, And(GreaterThanOrEqual("id", 200), LessThan("id", 300))),
+])
+def test_transformed_partitions_become_source_column_filters(clicks, partition, row_filter):
+    assert partition_selection(clicks, partition).row_filter == row_filter
+
+
+def test_bucket_partitions_are_matched_on_the_partition_value(clicks):
+    selection = partition_selection(clicks, {"ts_day": "2024-01-02", "id_bucket": "3"})
+
+    assert selection.filtered == {"ts_day"}
+    in_bucket = SimpleNamespace(spec_id=0, partition=[19724, 0, 0, "a", 0, 3])
+    other_bucket = SimpleNamespace(spec_id=0, partition=[19724, 0, 0, "a", 0, 4])
+    assert selection.matches(in_bucket)
+    assert not selection.matches(other_bucket)
+
+
+def test_unknown_fields_and_bad_values_are_rejected(clicks):
+    with pytest.raises(ValueError, match="not a partition field"):
+        partition_selection(clicks, {"ts": "2024-01-02"})
+    with pytest.raises(ValueError, match="not a valid value"):
+        partition_selection(clicks, {"ts_day": "yesterday"})
+
+
+def test_partition_sample_reads_only_its_manifest_and_file(tmp_path):
+    table = make_events_table(tmp_path)
+    selection = partition_selection(table, {"dt": "2024-01-02"})
+
+    manifests = table.current_snapshot().manifests(table.io)
+    assert [selection.manifest_matches(manifest) for manifest in manifests].count(True) == 1
+    assert len(sample_files(table, 100, selection=selection)) == 1
+    result = arrow_to_records(LakeView().get_sample_table(table, None, 100, partition={"dt": "2024-01-02"}))
+    assert sorted(row["id"] for row in result) == [20, 21, 22]
+
+
+def test_partition_sample_query_scans_only_the_partition(tmp_path):
+    table = make_events_table(tmp_path)
+
+    read = ArrowScan.to_record_batches
+    with patch.object(ArrowScan, "to_record_batches", autospec=True, side_effect=read) as scanned:
+        result = LakeView().get_sample_table(
+            table, "select id from db.events order by id", 100, partition={"dt": "2024-01-03"}
+        )
+
+    assert arrow_to_records(result) == [{"id": 30}, {"id": 31}, {"id": 32}]
+    assert len(scanned.call_args.args[1]) == 1
@@ -0,0 +1,65 @@
+from unittest.mock import patch
+
+import pyarrow as pa
+import pytest
+
+from pyiceberg.catalog.sql import SqlCatalog
+
+from app import partition_stats
+from app.lakeviewer import LakeView
+from tests.test_sql_pushdown import make_events_table
+
+
+def test_partitions_are_paged_in_the_requested_order(tmp_path):
+    table = make_events_table(tmp_path)
+    lv = LakeView()
+
+    page, total = lv.get_partition_page(table, 1, 2, sort_by="partition", descending=True)
+    assert total == 3
+    assert [p["partition"]["dt"].isoformat() for p in page.to_pylist()] == ["2024-01-02", "2024-01-01"]
+    top, _ = lv.get_partition_page(table, 0, 1, sort_by="last_updated", descending=True)
+    assert top["partition"].to_pylist()[0]["dt"].isoformat() == "2024-01-03"
+    with pytest.raises(ValueError, match="sort_by"):
+        lv.get_partition_data(table, sort_by="name")
+
+
+def test_unpartitioned_tables_have_their_one_partition_in_any_order(tmp_path):
+    catalog = SqlCatalog("test", uri=f"sqlite:///{tmp_path}/catalog.db", warehouse=f"file://{tmp_path}/warehouse")
+    catalog.create_namespace("db")
+    table = catalog.create_table("db.plain", pa.schema([("id", pa.int64())]))
+    table.append(pa.table({"id": [1, 2]}))
+    lv = LakeView()
+
+    assert lv.get_partition_data(table)["record_count"].to_pylist() == [2]
+    page, total = lv.get_partition_page(table, 0, 10, sort_by="partition", descending=True)
+    assert (page.num_rows, total) == (1, 1)
+    assert lv.get_partition_stats(table)["records"]["max"] == 2
+
+
+def test_partitions_are_read_once_per_snapshot(tmp_path):
+    table = make_events_table(tmp_path)
+    lv = LakeView()
+    partition_stats._cache.clear()
+
+    lv.get_partition_data(table)
+    with patch.object(type(table), "inspect") as inspect:
+        lv.get_partition_page(table, 0, 1, sort_by="size")
+        lv.get_partition_stats(table)
+    inspect.partitions.assert_not_called()
+
+    table.append(table.scan(limit=1).to_arrow())
+    assert lv.get_partition_stats(table)["records"]["max"] == 4
+
+
+def test_stats_summarize_sizes_and_records():
+    sizes = pa.chunked_array([[0, 1, 3, 1024, 1500, 5000]])
+
+    assert partition_stats._summary(sizes) == {"min": 0, "median": 3, "p99": 5000, "max": 5000}
+    assert partition_stats._histogram(sizes) == [
+        {"from": 0, "to": 1, "partitions": 1},
+        {"from": 1, "to": 2, "partitions": 1},
+        {"from": 2, "to": 4, "partitions": 1},
+        {"from": 1024, "to": 2048, "partitions": 2},
+        {"from": 4096, "to": 8192, "partitions": 1},
+    ]
+    assert partition_stats._summary(pa.chunked_array([], pa.int64())) is None
@@ -0,0 +1,101 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.api_utils import arrow_to_records
+from app.exceptions import QueryBudgetExceeded
+from app.lakeviewer import LakeView
+from app.query_cost import QueryBudget, budget_for, estimate_scan
+from app.sql_pushdown import analyze_sample_sql
+from tests.test_sql_pushdown import make_events_table
+
+
+def estimate(table, sql):
+    return estimate_scan(table, analyze_sample_sql(sql, table.name(), table.schema()))
+
+
+def test_estimate_comes_from_the_pruned_plan(tmp_path):
+    table = make_events_table(tmp_path)
+
+    narrow = estimate(table, "select id from db.events where dt = '2024-01-02'")
+    wide = estimate(table, "select * from db.events where dt = '2024-01-02'")
+
+    assert (narrow.files, narrow.rows, narrow.planned) == (1, 3, True)
+    assert 0 < narrow.bytes < wide.bytes
+    assert narrow.estimated_seconds > 0
+
+
+def test_limit_caps_the_estimate(tmp_path):
+    table = make_events_table(tmp_path)
+
+    cost = estimate(table, "select * from db.events limit 2")
+
+    assert (cost.files, cost.rows) == (1, 2)
+    assert len(cost.tasks) == 1
+
+
+def test_limit_with_a_filter_counts_every_planned_file(tmp_path):
+    """Each file has one matching row, so the first file's record count does not cover the limit."""
+    table = make_events_table(tmp_path)
+
+    cost = estimate(table, "select * from db.events where name = 'b' limit 2")
+
+    assert (cost.files, cost.rows) == (3, 2)
+    assert len(cost.tasks) == 3
+
+
+def test_unpruned_query_is_estimated_from_the_snapshot_summary(tmp_path):
+    table = make_events_table(tmp_path)
+
+    cost = estimate(table, "select name, count(*) from db.events group by name")
+
+    assert (cost.files, cost.rows, cost.planned) == (3, 9, False)
+    assert cost.tasks is None
+
+
+def test_unpruned_query_budget_counts_scan_tasks_not_small_files(tmp_path):
+    """read_iceberg merges small files, as in a streaming table, into a few scan tasks."""
+    table = make_events_table(tmp_path)
+    cost = estimate(table, "select name, count(*) from db.events group by name")
+
+    assert cost.scan_tasks == 1
+    assert QueryBudget(max_files=2).violation(cost) is None
+    with patch("app.query_cost.DAFT_SCAN_TASK_BYTES", 1):
+        cost = estimate(table, "select name, count(*) from db.events group by name")
+    assert cost.scan_tasks == 3
+    assert "3 scan tasks" in QueryBudget(max_files=2).violation(cost)
+
+
+def test_filtered_query_budget_counts_scan_tasks_not_small_files(tmp_path):
+    """A filter that prunes no file still has its small files merged into scan tasks."""
+    table = make_events_table(tmp_path)
+
+    cost = estimate(table, "select * from db.events where id > 0 limit 10")
+
+    assert (cost.files, cost.scan_tasks, cost.planned) == (3, 1, True)
+    assert QueryBudget(max_files=2).violation(cost) is None
+
+
+def test_query_over_budget_is_refused(tmp_path):
+    table = make_events_table(tmp_path)
+    lv = LakeView()
+
+    with patch("app.query_cost.DAFT_SCAN_TASK_BYTES", 1):  # one scan task per file
+        report = lv.estimate_sample_query(table, "select * from db.events where dt < '2024-01-03'", QueryBudget(1, 0))
+        assert report.files == 2 and not report.within_budget
+        with pytest.raises(QueryBudgetExceeded):
+            lv.get_sample_table(table, "select * from db.events where dt < '2024-01-03'", budget=QueryBudget(1, 0))
+
+        result = arrow_to_records(
+            lv.get_sample_table(table, "select * from db.events where dt = '2024-01-03'", budget=QueryBudget(1, 0))
+        )
+    assert len(result) == 3
+
+
+def test_budget_for_applies_user_overrides():
+    overrides = '{"analyst@example.com": {"max_files": 2000}}'
+    with patch("app.query_cost.QUERY_USER_BUDGETS", overrides), \
+         patch("app.query_cost.QUERY_MAX_FILES", 300), patch("app.query_cost.QUERY_MAX_BYTES", 10):
+        assert budget_for("analyst@example.com") == QueryBudget(max_files=2000, max_bytes=10)
+        assert budget_for("someone@example.com") == QueryBudget(max_files=300, max_bytes=10)
+        assert budget_for(None) == QueryBudget(max_files=300, max_bytes=10)
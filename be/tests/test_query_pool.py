@@ -0,0 +1,88 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.exceptions import QueryBudgetExceeded, QueryPoolSaturated
+from app.query_pool import QueryPool
+
+MB = 1024 * 1024
+
+
+def blocking(started: list, name: str, release: threading.Event):
+    def fn():
+        started.append(name)
+        release.wait(5)
+        return name
+    return fn
+
+
+def test_waiting_queries_start_in_turns_across_users():
+    pool = QueryPool(concurrency=1, queue_size=10, queue_timeout=5)
+    started, release = [], threading.Event()
+
+    async def scenario():
+        first = asyncio.ensure_future(pool.run("a", blocking(started, "a1", release)))
+        await asyncio.sleep(0.05)
+        queued = [asyncio.ensure_future(pool.run(user, blocking(started, name, release)))
+                  for user, name in (("a", "a2"), ("a", "a3"), ("b", "b1"))]
+        await asyncio.sleep(0.05)
+        assert started == ["a1"]
+        release.set()
+        return await asyncio.gather(first, *queued)
+
+    assert asyncio.run(scenario()) == ["a1", "a2", "a3", "b1"]
+    assert started == ["a1", "a2", "b1", "a3"]
+
+
+def test_full_queue_refuses_queries():
+    pool = QueryPool(concurrency=1, queue_size=1, queue_timeout=5)
+    started, release = [], threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run("a", blocking(started, "a1", release)))
+        waiting = asyncio.ensure_future(pool.run("b", blocking(started, "b1", release)))
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(QueryPoolSaturated) as refused:
+                await pool.run("c", lambda: "c1")
+        finally:
+            release.set()
+        await asyncio.gather(running, waiting)
+        return refused.value
+
+    assert asyncio.run(scenario()).retry_after > 0
+    assert started == ["a1", "b1"]
+
+
+def test_query_waiting_too_long_is_refused_without_running():
+    pool = QueryPool(concurrency=1, queue_size=10, queue_timeout=0.05)
+    started, release = [], threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(pool.run("a", blocking(started, "a1", release)))
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(QueryPoolSaturated, match="waited"):
+                await pool.run("b", blocking(started, "b1", release))
+        finally:
+            release.set()
+        await running
+
+    asyncio.run(scenario())
+    assert started == ["a1"]
+
+
+def test_memory_is_admitted_from_the_cost_estimate():
+    pool = QueryPool(concurrency=2, queue_size=10, queue_timeout=0.05, memory_mb=10)
+
+    with pytest.raises(QueryBudgetExceeded):
+        with pool.admit(SimpleNamespace(bytes=3 * MB)):  # about 12 MB in memory
+            pass
+    with pool.admit(SimpleNamespace(bytes=2 * MB)):
+        with pytest.raises(QueryPoolSaturated, match="memory"):
+            with pool.admit(SimpleNamespace(bytes=1 * MB)):
+                pass
+    with pool.admit(SimpleNamespace(bytes=2 * MB)):
+        pass
@@ -0,0 +1,92 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.models import QueuedTask, TaskStatus
+from app.queue_analytics import get_queue_stats, track_queue_backlog
+
+# The storage_adapter_factory fixture is provided by conftest.py
+
+NOW = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def task_storage(storage_adapter_factory):
+    return storage_adapter_factory(QueuedTask)
+
+
+def make_task(batch_id, status, priority=10, created_minutes_ago=30, duration_seconds=None,
+              finished_minutes_ago=None, worker_id=None):
+    task = QueuedTask(
+        namespace="ns1", table_name="t", rules_requested=[], batch_id=batch_id,
+        status=status, priority=priority, created_at=NOW - timedelta(minutes=created_minutes_ago),
+        worker_id=worker_id
+    )
+    if finished_minutes_ago is not None:
+        task.finished_at = NOW - timedelta(minutes=finished_minutes_ago)
+        task.started_at = task.finished_at - timedelta(seconds=duration_seconds)
+    return task
+
+
+def test_queue_stats(task_storage):
+    tasks = [
+        make_task("b1", TaskStatus.PENDING, priority=1, created_minutes_ago=20),
+        make_task("b1", TaskStatus.PENDING, priority=10, created_minutes_ago=5),
+        make_task("b1", TaskStatus.RUNNING, worker_id="w1"),
+        make_task("b2", TaskStatus.PENDING, priority=10, created_minutes_ago=1),
+        # Finished inside the 10 minute window: 4 tasks of b1, 10s to 40s each
+        make_task("b1", TaskStatus.COMPLETE, duration_seconds=10, finished_minutes_ago=1, worker_id="w1"),
+        make_task("b1", TaskStatus.COMPLETE, duration_seconds=20, finished_minutes_ago=2, worker_id="w1"),
+        make_task("b1", TaskStatus.COMPLETE, duration_seconds=30, finished_minutes_ago=3, worker_id="w2"),
+        make_task("b1", TaskStatus.FAILED, duration_seconds=40, finished_minutes_ago=4, worker_id="w2"),
+        # Outside the window
+        make_task("b0", TaskStatus.COMPLETE, duration_seconds=500, finished_minutes_ago=60, worker_id="w3"),
+    ]
+    task_storage.save_many(tasks)
+
+    stats = get_queue_stats(task_storage, window_minutes=10, now=NOW)
+
+    assert stats.pending == 3
+    assert stats.running == 1
+    assert [(d.priority, d.pending) for d in stats.depth_by_priority] == [(1, 1), (10, 2)]
+    assert stats.oldest_pending_age_seconds == pytest.approx(20 * 60)
+    assert stats.completed_in_window == 3
+    assert stats.failed_in_window == 1
+    assert stats.throughput_per_minute == pytest.approx(0.4)
+    assert stats.p50_duration_seconds == pytest.approx(25)
+    assert stats.p95_duration_seconds == pytest.approx(38.5)
+    assert {w.worker_id: (w.completed, w.failed) for w in stats.workers} == {"w1": (2, 0), "w2": (1, 1)}
+
+    batches = {b.batch_id: b for b in stats.batches}
+    assert set(batches) == {"b1", "b2"}
+    # b1: 3 tasks left at its own rate of 4 per 10 minutes
+    assert batches["b1"].finished_in_window == 4
+    assert batches["b1"].eta_seconds == pytest.approx(3 / (4 / 600))
+    # b2 has finished nothing yet, so it is estimated at the whole queue's rate
+    assert batches["b2"].eta_seconds == pytest.approx(1 / (4 / 600))
+    assert stats.eta_seconds == pytest.approx(4 / (4 / 600))
+
+
+def test_queue_stats_empty_queue(task_storage):
+    stats = get_queue_stats(task_storage, window_minutes=5, now=NOW)
+
+    assert stats.pending == 0
+    assert stats.oldest_pending_age_seconds is None
+    assert stats.p50_duration_seconds is None
+    assert stats.eta_seconds == 0.0
+    assert stats.batches == [] and stats.workers == []
+
+
+def test_backlog_gauges_read_the_queue_on_scrape(task_storage):
+    task_storage.save_many([
+        make_task("b1", TaskStatus.PENDING, created_minutes_ago=10),
+        make_task("b1", TaskStatus.RUNNING),
+        make_task("b1", TaskStatus.COMPLETE, duration_seconds=1, finished_minutes_ago=1),
+    ])
+
+    track_queue_backlog(task_storage, cache_seconds=0)
+
+    assert REGISTRY.get_sample_value("lakevision_queue_backlog_tasks") == 2
+    # created_at is relative to the fixed NOW, so the age is at least 10 minutes
+    assert REGISTRY.get_sample_value("lakevision_queue_oldest_pending_age_seconds") >= 600
@@ -0,0 +1,64 @@
+import os
+from unittest.mock import patch
+
+import pyarrow as pa
+import pytest
+
+from app.exceptions import ResultNotFound
+from app.result_store import ResultStore
+
+
+def numbers(n: int) -> pa.Table:
+    return pa.table({"id": list(range(n)), "name": [f"row {i}" for i in range(n)]})
+
+
+def test_pages_are_served_in_order_and_sorted(tmp_path):
+    store = ResultStore(spill_dir=str(tmp_path))
+    handle = store.put(numbers(10), "alice")
+
+    page, total = store.page(handle, "alice", 4, 3)
+    assert total == 10
+    assert page["id"].to_pylist() == [4, 5, 6]
+
+    page, _ = store.page(handle, "alice", 0, 3, sort_by="id", descending=True)
+    assert page["id"].to_pylist() == [9, 8, 7]
+    with pytest.raises(ValueError):
+        store.page(handle, "alice", 0, 3, sort_by="missing")
+
+
+def test_results_are_private_to_their_owner(tmp_path):
+    store = ResultStore(spill_dir=str(tmp_path))
+    handle = store.put(numbers(3), "alice")
+
+    with pytest.raises(ResultNotFound):
+        store.page(handle, "bob", 0, 3)
+
+
+def test_least_recently_used_results_are_spilled_then_dropped(tmp_path):
+    table = numbers(50_000)
+    store = ResultStore(spill_dir=str(tmp_path))
+    store.memory_bytes = table.nbytes  # room for one result in memory
+    store.disk_bytes = table.nbytes  # and one on disk
+
+    first = store.put(table, None)
+    second = store.put(table, None)
+    assert len(os.listdir(tmp_path)) == 1  # the first result was spilled
+
+    page, total = store.page(first, None, 49_998, 5)
+    assert total == 50_000
+    assert page["id"].to_pylist() == [49_998, 49_999]
+
+    store.put(table, None)  # spills the second result, which is then dropped as less recently used
+    assert len(os.listdir(tmp_path)) == 1
+    with pytest.raises(ResultNotFound):
+        store.page(second, None, 0, 1)
+    assert store.page(first, None, 0, 1)[0]["id"].to_pylist() == [0]
+
+
+def test_results_expire_after_their_ttl(tmp_path):
+    store = ResultStore(ttl_seconds=60, spill_dir=str(tmp_path))
+    handle = store.put(numbers(3), None)
+
+    with patch("app.result_store.time.monotonic", return_value=10 ** 9):
+        with pytest.raises(ResultNotFound):
+            store.page(handle, None, 0, 1)
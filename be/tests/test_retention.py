@@ -0,0 +1,132 @@
+from datetime import datetime, timezone, timedelta
+
+import pytest
+from unittest.mock import patch
+
+from app.models import InsightRun, InsightRecord, InsightRollup, QueuedTask, TaskStatus
+from app.retention import (
+    prune_insight_runs, collapse_identical_runs, purge_finished_tasks
+)
+
+# The storage_adapter_factory fixture is provided by conftest.py
+
+@pytest.fixture
+def run_storage(storage_adapter_factory):
+    return storage_adapter_factory(InsightRun)
+
+@pytest.fixture
+def record_storage(storage_adapter_factory):
+    return storage_adapter_factory(InsightRecord)
+
+@pytest.fixture
+def rollup_storage(storage_adapter_factory):
+    return storage_adapter_factory(InsightRollup)
+
+def make_runs(run_storage, record_storage, table_name, timestamps, codes=("SMALL_FILES",), message="msg"):
+    runs = []
+    records = []
+    for ts in timestamps:
+        run = InsightRun(namespace="ns1", table_name=table_name, rules_requested=["SMALL_FILES"], run_type="auto", run_timestamp=ts)
+        runs.append(run)
+        for code in codes:
+            records.append(InsightRecord(run_id=run.id, code=code, table=f"ns1.{table_name}", message=message, severity="Warning", suggested_action="..."))
+    run_storage.save_many(runs)
+    if records:
+        record_storage.save_many(records)
+    return runs
+
+def test_prune_keep_last_runs_per_table(run_storage, record_storage):
+    """Only the newest N runs of each table survive, with their records."""
+    now = datetime.now(timezone.utc)
+    t1 = make_runs(run_storage, record_storage, "t1", [now - timedelta(hours=i) for i in range(5)])
+    t2 = make_runs(run_storage, record_storage, "t2", [now - timedelta(hours=i) for i in range(2)])
+
+    deleted = prune_insight_runs(run_storage, record_storage, keep_last=2, chunk_size=2)
+
+    assert deleted == 3
+    remaining = {run.id for run in run_storage.get_all()}
+    assert remaining == {t1[0].id, t1[1].id, t2[0].id, t2[1].id}
+    assert {r.run_id for r in record_storage.get_all()} == remaining
+
+def test_prune_by_age_keeps_latest_run(run_storage, record_storage):
+    """Runs older than the max age are removed, except the most recent run of a table."""
+    now = datetime.now(timezone.utc)
+    fresh = make_runs(run_storage, record_storage, "t1", [now, now - timedelta(days=40)])
+    stale = make_runs(run_storage, record_storage, "t2", [now - timedelta(days=50), now - timedelta(days=60)])
+
+    deleted = prune_insight_runs(run_storage, record_storage, max_age_days=30)
+
+    assert deleted == 2
+    assert {run.id for run in run_storage.get_all()} == {fresh[0].id, stale[0].id}
+
+def test_prune_rolls_up_daily_counts(run_storage, record_storage, rollup_storage):
+    """Deleted runs are folded into per-day, per-rule occurrence counts."""
+    day = datetime(2024, 3, 1, 8, tzinfo=timezone.utc)
+    make_runs(run_storage, record_storage, "t1",
+              [day + timedelta(days=5), day, day + timedelta(hours=2)],
+              codes=("SMALL_FILES", "LARGE_FILES"))
+
+    prune_insight_runs(run_storage, record_storage, keep_last=1, rollup_storage=rollup_storage)
+    # A second pass over an already pruned table must not double count
+    prune_insight_runs(run_storage, record_storage, keep_last=1, rollup_storage=rollup_storage)
+
+    rollups = {r.code: r for r in rollup_storage.get_all()}
+    assert set(rollups) == {"SMALL_FILES", "LARGE_FILES"}
+    assert rollups["SMALL_FILES"].day == "2024-03-01"
+    assert rollups["SMALL_FILES"].occurrences == 2
+
+def test_collapse_identical_runs_keeps_streak_edges(run_storage, record_storage):
+    """Identical consecutive runs collapse to the first and last run of the streak."""
+    base = datetime.now(timezone.utc) - timedelta(days=1)
+    same = make_runs(run_storage, record_storage, "t1", [base + timedelta(minutes=i) for i in range(4)])
+    changed = make_runs(run_storage, record_storage, "t1", [base + timedelta(minutes=10)], message="other")
+
+    deleted = collapse_identical_runs(run_storage, record_storage, chunk_size=2)
+
+    assert deleted == 2
+    assert {run.id for run in run_storage.get_all()} == {same[0].id, same[3].id, changed[0].id}
+
+def test_collapse_pages_past_runs_sharing_a_timestamp(run_storage, record_storage):
+    """A chunk ending inside a group of runs with the same timestamp resumes within the group."""
+    base = datetime.now(timezone.utc) - timedelta(days=1)
+    runs = make_runs(run_storage, record_storage, "t1", [base] * 5)
+    first, *middle, last = sorted(runs, key=lambda run: run.id)
+
+    deleted = collapse_identical_runs(run_storage, record_storage, chunk_size=2)
+
+    assert deleted == 3
+    assert {run.id for run in run_storage.get_all()} == {first.id, last.id}
+
+def test_collapse_resumes_from_its_mark(run_storage, record_storage, rollup_storage):
+    """A later pass reads only the runs since the last one examined, and rolls up what it removes."""
+    base = datetime(2024, 3, 1, 8, tzinfo=timezone.utc)
+    old = make_runs(run_storage, record_storage, "t1", [base + timedelta(minutes=i) for i in range(3)])
+    marks = {}
+    assert collapse_identical_runs(run_storage, record_storage, rollup_storage=rollup_storage, marks=marks) == 1
+
+    new = make_runs(run_storage, record_storage, "t1", [base + timedelta(minutes=10 + i) for i in range(2)])
+    read = record_storage.get_by_attributes
+    with patch.object(record_storage, "get_by_attributes", side_effect=read) as records_read:
+        deleted = collapse_identical_runs(run_storage, record_storage, rollup_storage=rollup_storage, marks=marks)
+
+    assert deleted == 2
+    assert {run.id for run in run_storage.get_all()} == {old[0].id, new[1].id}
+    assert records_read.call_args_list[0].args[0] == {"run_id": [run.id for run in new]}
+    assert [r.occurrences for r in rollup_storage.get_all()] == [3]
+
+def test_purge_finished_tasks(storage_adapter_factory):
+    """Old finished tasks are deleted; pending and recent ones are kept."""
+    task_storage = storage_adapter_factory(QueuedTask)
+    old = datetime.now(timezone.utc) - timedelta(days=10)
+    tasks = [
+        QueuedTask(namespace="ns1", table_name="t1", rules_requested=[], batch_id="b1", status=TaskStatus.COMPLETE, finished_at=old),
+        QueuedTask(namespace="ns1", table_name="t2", rules_requested=[], batch_id="b1", status=TaskStatus.FAILED, finished_at=old),
+        QueuedTask(namespace="ns1", table_name="t3", rules_requested=[], batch_id="b2", status=TaskStatus.COMPLETE, finished_at=datetime.now(timezone.utc)),
+        QueuedTask(namespace="ns1", table_name="t4", rules_requested=[], batch_id="b2", status=TaskStatus.PENDING),
+    ]
+    task_storage.save_many(tasks)
+
+    deleted = purge_finished_tasks(task_storage, max_age_days=7, chunk_size=1)
+
+    assert deleted == 2
+    assert {t.table_name for t in task_storage.get_all()} == {"t3", "t4"}
@@ -0,0 +1,60 @@
+import random
+from collections import Counter
+from unittest.mock import patch
+
+import pyarrow as pa
+from pyiceberg.catalog.sql import SqlCatalog
+from pyiceberg.manifest import ManifestFile
+
+from app.api_utils import arrow_to_records
+from app.lakeviewer import LakeView
+from app.sampling import sample_files
+from tests.test_sql_pushdown import make_events_table
+
+
+def test_first_rows_read_only_the_manifests_needed(tmp_path):
+    """Each append of the test table adds a manifest; two rows only need the first one."""
+    table = make_events_table(tmp_path)
+
+    fetch = ManifestFile.fetch_manifest_entry
+    with patch.object(ManifestFile, "fetch_manifest_entry", autospec=True, side_effect=fetch) as fetched:
+        result = arrow_to_records(LakeView().get_sample_table(table, None, 2))
+
+    assert len(result) == 2
+    assert fetched.call_count == 1
+
+
+def test_random_sample_spreads_rows_across_partitions(tmp_path):
+    table = make_events_table(tmp_path)
+
+    with patch("app.sampling.SAMPLE_PARTITIONS", 3):
+        files = sample_files(table, 6, randomize=True, rng=random.Random(7))
+        result = arrow_to_records(LakeView().get_sample_table(table, None, 6, random_sample=True))
+
+    assert len({f.partition[0] for f in files}) == 3
+    assert len(result) == 6
+    assert list(Counter(row["dt"] for row in result).values()) == [2, 2, 2]
+
+
+def test_random_sample_of_unpartitioned_table_reads_enough_files(tmp_path):
+    catalog = SqlCatalog("test", uri=f"sqlite:///{tmp_path}/catalog.db", warehouse=f"file://{tmp_path}/warehouse")
+    catalog.create_namespace("db")
+    table = catalog.create_table("db.plain", pa.schema([("id", pa.int64())]))
+    for i in range(10):
+        table.append(pa.table({"id": list(range(i * 5, i * 5 + 5))}))
+    table.append(pa.table({"id": [100]}))  # a small file, whose shortfall later files make up
+
+    result = arrow_to_records(LakeView().get_sample_table(table, None, 30, random_sample=True))
+
+    assert len(result) == 30
+    assert len({row["id"] for row in result}) == 30
+
+
+def test_sample_of_empty_table_has_the_table_columns(tmp_path):
+    table = make_events_table(tmp_path)
+    table.delete()
+
+    result = LakeView().get_sample_table(table, None, 10)
+
+    assert arrow_to_records(result) == []
+    assert result.column_names == ["id", "dt", "name"]
@@ -0,0 +1,49 @@
+from unittest.mock import patch
+
+import pytest
+
+from app.lakeviewer import LakeView
+from tests.test_sql_pushdown import make_events_table
+
+
+def test_snapshot_pages_follow_their_cursor(tmp_path):
+    table = make_events_table(tmp_path)
+    lv = LakeView()
+    newest_first = [s.snapshot_id for s in sorted(table.snapshots(), key=lambda s: s.timestamp_ms, reverse=True)]
+
+    first, cursor = lv.get_snapshot_page(table, 2, columns=["snapshot_id"])
+    assert first.column_names == ["snapshot_id", "id"]
+    assert first["snapshot_id"].to_pylist() == newest_first[:2]
+
+    table.append(table.scan(limit=1).to_arrow())  # a new snapshot does not shift the pages
+    second, cursor = lv.get_snapshot_page(table, 2, cursor, columns=["snapshot_id"])
+    assert second["snapshot_id"].to_pylist() == newest_first[2:]
+    assert cursor is None
+
+
+def test_snapshots_are_filtered_by_time_and_operation(tmp_path):
+    table = make_events_table(tmp_path)
+    lv = LakeView()
+    oldest_first = table.inspect.snapshots().sort_by("committed_at")
+    committed = oldest_first["committed_at"].to_pylist()
+
+    window = lv.get_snapshot_data(table, since=committed[1], until=committed[2])
+    assert window["snapshot_id"].to_pylist() == [oldest_first["snapshot_id"][1].as_py()]
+    assert lv.get_snapshot_data(table, operations=["append"]).num_rows == 3
+    assert lv.get_snapshot_data(table, operations=["delete"]).num_rows == 0
+    with pytest.raises(ValueError, match="Unknown snapshot columns"):
+        lv.get_snapshot_data(table, columns=["nope"])
+    with pytest.raises(ValueError, match="not a valid snapshot cursor"):
+        lv.get_snapshot_page(table, 2, "yesterday")
+
+
+def test_snapshot_pages_reuse_the_cached_snapshots_table(tmp_path):
+    table = make_events_table(tmp_path)
+    lv = LakeView()
+
+    first, cursor = lv.get_snapshot_page(table, 1)
+    with patch.object(type(table), "inspect") as inspect:
+        second, _ = lv.get_snapshot_page(table, 1, cursor)
+        lv.get_data_change(table)
+    inspect.snapshots.assert_not_called()
+    assert second["snapshot_id"].to_pylist() != first["snapshot_id"].to_pylist()
@@ -0,0 +1,114 @@
+from datetime import date
+from unittest.mock import patch
+
+import pyarrow as pa
+import pytest
+from pyiceberg.catalog.sql import SqlCatalog
+from pyiceberg.expressions import AlwaysTrue, And, EqualTo, GreaterThan, In
+from pyiceberg.io.pyarrow import ArrowScan
+from pyiceberg.partitioning import PartitionField, PartitionSpec
+from pyiceberg.schema import Schema
+from pyiceberg.transforms import IdentityTransform
+from pyiceberg.types import DateType, LongType, NestedField, StringType
+
+from app.api_utils import arrow_to_records
+from app.lakeviewer import LakeView
+from app.sql_pushdown import analyze_sample_sql
+
+SCHEMA = Schema(
+    NestedField(1, "id", LongType()),
+    NestedField(2, "dt", DateType()),
+    NestedField(3, "name", StringType()),
+)
+IDENTIFIER = ("db", "events")
+
+
+def test_filters_projection_and_limit_are_extracted():
+    pushdown = analyze_sample_sql(
+        "select ID, name from db.events where dt = '2024-01-02' and id > 3 limit 10", IDENTIFIER, SCHEMA
+    )
+
+    assert pushdown.sql == "SELECT ID, name FROM df WHERE dt = '2024-01-02' AND id > 3 LIMIT 10"
+    assert pushdown.selected_fields == ("id", "name", "dt")
+    assert pushdown.row_filter == And(EqualTo("dt", "2024-01-02"), GreaterThan("id", 3))
+    assert pushdown.limit == 10
+
+
+def test_only_translatable_conjuncts_are_pushed():
+    """An untranslatable conjunct stays with the query and keeps the LIMIT from being pushed."""
+    pushdown = analyze_sample_sql(
+        "select * from events e where lower(e.name) = 'x' and id in (1, 2) limit 5", IDENTIFIER, SCHEMA
+    )
+
+    assert pushdown.sql == "SELECT * FROM df AS e WHERE LOWER(e.name) = 'x' AND id IN (1, 2) LIMIT 5"
+    assert pushdown.selected_fields == ("*",)
+    assert pushdown.row_filter == In("id", {1, 2})
+    assert pushdown.limit is None
+
+
+@pytest.mark.parametrize("sql", [
+    "select name, count(*) from db.events group by name limit 5",
+    "select * from db.events order by id limit 5",
+    "select * from db.events where name = 5 limit 5",
+])
+def test_limit_is_not_pushed_when_it_applies_after_the_scan(sql):
+    pushdown = analyze_sample_sql(sql, IDENTIFIER, SCHEMA)
+    assert pushdown.limit is None
+
+
+def test_nothing_is_pushed_into_joins():
+    pushdown = analyze_sample_sql(
+        "select a.id from db.events a join db.events b on a.id = b.id where a.id = 1", IDENTIFIER, SCHEMA
+    )
+
+    assert pushdown.sql == "SELECT a.id FROM df AS a JOIN df AS b ON a.id = b.id WHERE a.id = 1"
+    assert pushdown.row_filter == AlwaysTrue()
+    assert not pushdown.prunes
+
+
+def make_events_table(tmp_path):
+    """A table partitioned by day with three days of three rows, one data file per day."""
+    catalog = SqlCatalog(
+        "test", uri=f"sqlite:///{tmp_path}/catalog.db", warehouse=f"file://{tmp_path}/warehouse"
+    )
+    catalog.create_namespace("db")
+    table = catalog.create_table(
+        "db.events", SCHEMA,
+        partition_spec=PartitionSpec(PartitionField(2, 1000, IdentityTransform(), "dt"))
+    )
+    arrow_schema = pa.schema([("id", pa.int64()), ("dt", pa.date32()), ("name", pa.string())])
+    for day in (1, 2, 3):
+        table.append(pa.table({
+            "id": [day * 10 + i for i in range(3)],
+            "dt": [date(2024, 1, day)] * 3,
+            "name": ["a", "b", "c"],
+        }, schema=arrow_schema))
+    return table
+
+
+def test_sample_query_reads_only_matching_partition(tmp_path):
+    table = make_events_table(tmp_path)
+
+    read = ArrowScan.to_record_batches
+    with patch.object(ArrowScan, "to_record_batches", autospec=True, side_effect=read) as scanned:
+        result = LakeView().get_sample_table(
+            table, "select id from db.events where dt = '2024-01-02' and name <> 'c' order by id", 100
+        )
+
+    assert arrow_to_records(result) == [{"id": 20}, {"id": 21}]
+    tasks = scanned.call_args.args[1]
+    assert len(tasks) == 1
+
+
+def test_aggregate_sample_query_streams_the_planned_files(tmp_path):
+    """Without a limit, each planned file is read as daft pulls it rather than all up front."""
+    table = make_events_table(tmp_path)
+
+    read = ArrowScan.to_record_batches
+    with patch.object(ArrowScan, "to_record_batches", autospec=True, side_effect=read) as scanned, \
+         patch.object(LakeView, "_scan") as whole_scan:
+        result = LakeView().get_sample_table(table, "select count(*) as n from db.events where id > 10", 100)
+
+    assert arrow_to_records(result) == [{"n": 8}]
+    assert [len(call.args[1]) for call in scanned.call_args_list] == [1, 1, 1]
+    whole_scan.assert_not_called()
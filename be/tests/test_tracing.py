@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from app.tracing import span, current_trace_context, resumed_trace, record_span
+
+
+@pytest.fixture
+def exported_spans():
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    with patch("app.tracing._tracer", lambda: provider.get_tracer("test")):
+        yield exporter
+
+
+def test_queued_work_continues_the_enqueuing_trace(exported_spans):
+    """A worker resuming a stored trace context opens its spans under the span that enqueued it."""
+    with span("api.start_run", batch_id="b1"):
+        trace_context = current_trace_context()
+
+    created_at = datetime.now(timezone.utc)
+    with resumed_trace(trace_context):
+        record_span("queue.wait", created_at, created_at + timedelta(seconds=2))
+        with span("worker.table_task", table=None):
+            pass
+
+    spans = {s.name: s for s in exported_spans.get_finished_spans()}
+    root = spans["api.start_run"]
+    assert trace_context.split("-")[1] == format(root.context.trace_id, "032x")
+    for name in ("queue.wait", "worker.table_task"):
+        assert spans[name].context.trace_id == root.context.trace_id
+        assert spans[name].parent.span_id == root.context.span_id
+    assert spans["queue.wait"].end_time - spans["queue.wait"].start_time == 2_000_000_000
+    assert "table" not in spans["worker.table_task"].attributes
+
+
+def test_no_trace_context_starts_a_new_trace(exported_spans):
+    with resumed_trace(None):
+        with span("worker.generator_task"):
+            pass
+
+    (finished,) = exported_spans.get_finished_spans()
+    assert finished.parent is None
@@ -0,0 +1,94 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app import worker
+from app.models import BackgroundJob, QueuedTask, TaskStatus
+from app.worker import PollBackoff, cancel_batch, run_worker_cycle, run_worker_loop
+
+
+@pytest.fixture(autouse=True)
+def reset_drain():
+    worker.drain_requested.clear()
+    yield
+    worker.drain_requested.clear()
+
+
+def test_poll_backoff_grows_while_idle_and_resets_after_work():
+    backoff = PollBackoff(minimum=1, maximum=8)
+
+    idle_delays = [backoff.next_delay(False) for _ in range(6)]
+    for delay, ceiling in zip(idle_delays, [1, 2, 4, 8, 8, 8]):
+        assert ceiling / 2 <= delay <= ceiling
+
+    assert backoff.next_delay(True) == 0.0
+    assert backoff.next_delay(False) <= 1
+
+
+def test_worker_loop_chains_tasks_and_drains():
+    """Busy cycles run back to back; a drain request ends the loop instead of polling again."""
+    cycles = []
+
+    def cycle(*args):
+        cycles.append(len(cycles))
+        if len(cycles) == 3:
+            worker.drain_requested.set()
+            return False
+        return True
+
+    backoff = MagicMock(wraps=PollBackoff(minimum=60, maximum=60))
+    with patch("app.worker.run_worker_cycle", side_effect=cycle):
+        run_worker_loop(MagicMock(), MagicMock(), MagicMock(), MagicMock(), backoff=backoff)
+
+    assert len(cycles) == 3
+    assert [c.args[0] for c in backoff.next_delay.call_args_list] == [True, True, False]
+
+
+def test_cancel_batch_skips_pending_tasks(storage_adapter_factory):
+    """Pending tasks are cancelled in bulk; a task already claimed is skipped by the worker."""
+    task_storage = storage_adapter_factory(QueuedTask)
+    batch_storage = storage_adapter_factory(BackgroundJob)
+    batch = BackgroundJob(id="b1", namespace="ns", table_name=None, rules_requested=None, status="running")
+    batch_storage.save(batch)
+    other = BackgroundJob(id="b2", namespace="ns", table_name=None, rules_requested=None, status="running")
+    batch_storage.save(other)
+    task_storage.save_many([
+        QueuedTask(namespace="ns", table_name=f"t{i}", rules_requested=None, batch_id="b1") for i in range(3)
+    ] + [QueuedTask(namespace="ns", table_name="t9", rules_requested=None, batch_id="b2", priority=20)])
+    claimed = worker.get_atomic_job(task_storage)
+
+    assert cancel_batch(batch, task_storage, batch_storage) == 2
+
+    statuses = {t.table_name: t.status for t in task_storage.get_all()}
+    assert statuses == {"t0": TaskStatus.RUNNING, "t1": TaskStatus.CANCELLED,
+                        "t2": TaskStatus.CANCELLED, "t9": TaskStatus.PENDING}
+    assert batch_storage.get_by_id("b1").status == "cancelled"
+
+    # The worker that claimed t0 before the cancellation stops it at the first rule boundary.
+    runner = MagicMock()
+    with patch("app.worker.get_atomic_job", return_value=claimed):
+        assert run_worker_cycle(task_storage, batch_storage, runner, MagicMock())
+    runner.run_for_table.assert_not_called()
+    assert task_storage.get_by_id(claimed.id).status == TaskStatus.CANCELLED
+    assert batch_storage.get_by_id("b1").status == "cancelled"
+
+
+def test_finished_and_cancelled_batches_do_not_overwrite_each_other(storage_adapter_factory):
+    """A completion read before a cancellation is saved does not undo it, and vice versa."""
+    task_storage = storage_adapter_factory(QueuedTask)
+    batch_storage = storage_adapter_factory(BackgroundJob)
+    batch_storage.save(BackgroundJob(id="b1", namespace="ns", table_name=None, rules_requested=None, status="running"))
+    task_storage.save(QueuedTask(namespace="ns", table_name="t0", rules_requested=None, batch_id="b1",
+                                 status=TaskStatus.COMPLETE))
+    read_before_cancel = batch_storage.get_by_id("b1")
+
+    assert cancel_batch(batch_storage.get_by_id("b1"), task_storage, batch_storage) == 0
+    with patch.object(batch_storage, "get_by_id", side_effect=[read_before_cancel, batch_storage.get_by_id("b1")]):
+        worker.update_batch_status("b1", task_storage, batch_storage)
+    assert batch_storage.get_by_id("b1").status == "cancelled"
+
+    batch_storage.save(BackgroundJob(id="b2", namespace="ns", table_name=None, rules_requested=None, status="running"))
+    late = batch_storage.get_by_id("b2")
+    assert worker.finish_batch(batch_storage, "b2", "complete", "Done.", late.created_at)
+    assert cancel_batch(late, task_storage, batch_storage) == 0
+    assert (late.status, batch_storage.get_by_id("b2").status) == ("complete", "complete")
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the LakeView read paths and the health pipeline.
+
+Generates a synthetic lakehouse on a local SQLite catalog (namespaces x tables, with a
+configurable number of data files, snapshots and partition skew per table), then times:
+
+- the LakeView calls behind the /api/tables/{table_id}/* endpoints,
+- every insight rule, on every table,
+- the worker's generator task for the whole lakehouse,
+- a full worker batch (generator plus one insight run per table).
+
+Each benchmark reports its median wall time, throughput and peak Python heap. Results can
+be saved as a baseline and later runs compared against it; the script exits with status 1
+when a benchmark is slower than the baseline by more than the tolerance.
+
+Usage (from the repository root):
+    python scripts/benchmark.py --namespaces 2 --tables 5 --files 200 --snapshots 20
+    python scripts/benchmark.py --skip-generate --save-baseline be/benchmark/baseline.json
+    python scripts/benchmark.py --skip-generate --baseline be/benchmark/baseline.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable
+
+import pyarrow as pa
+
+logger = logging.getLogger("benchmark")
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_WORKDIR = REPO_ROOT / "be" / "benchmark"
+BENCH_NAMESPACE_PREFIX = "bench"
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    seconds: float  # median over repeats
+    operations: int  # units of work per repeat (tables, files, ...)
+    peak_bytes: int
+
+    @property
+    def ops_per_second(self) -> float:
+        return self.operations / self.seconds if self.seconds else 0.0
+
+
+# --------------------------------------------------------------------------- setup
+
+
+def configure_environment(workdir: Path) -> None:
+    """Points the catalog and the health database at the work directory, before app imports."""
+    workdir.mkdir(parents=True, exist_ok=True)
+    warehouse = workdir / "warehouse"
+    warehouse.mkdir(exist_ok=True)
+    os.environ["PYICEBERG_CATALOG__DEFAULT__TYPE"] = "sql"
+    os.environ["PYICEBERG_CATALOG__DEFAULT__URI"] = f"sqlite:///{workdir / 'catalog.db'}"
+    os.environ["PYICEBERG_CATALOG__DEFAULT__WAREHOUSE"] = f"file://{warehouse}"
+    os.environ["LAKEVISION_DATABASE_URL"] = f"sqlite:///{workdir / 'health.db'}"
+    os.environ["PUBLIC_HEALTH_ENABLED"] = "true"
+    sys.path.insert(0, str(REPO_ROOT / "be"))
+
+
+def generate_lakehouse(
+    namespaces: int,
+    tables: int,
+    files: int,
+    snapshots: int,
+    rows_per_file: int,
+    partitions: int,
+    skew: float,
+    seed: int,
+) -> None:
+    """
+    Creates `namespaces` x `tables` identity-partitioned tables. Each table gets `files`
+    data files spread over `snapshots` appends; partition 0 gets `skew` times the rows
+    of the others.
+    """
+    from pyiceberg.catalog import load_catalog
+    from pyiceberg.partitioning import PartitionField, PartitionSpec
+    from pyiceberg.schema import Schema
+    from pyiceberg.transforms import IdentityTransform
+    from pyiceberg.types import DoubleType, LongType, NestedField, StringType, TimestampType
+
+    rng = random.Random(seed)
+    catalog = load_catalog("default")
+    schema = Schema(
+        NestedField(1, "id", LongType(), required=False),
+        NestedField(2, "category", StringType(), required=False),
+        NestedField(3, "value", DoubleType(), required=False),
+        NestedField(4, "ts", TimestampType(), required=False),
+    )
+    spec = PartitionSpec(PartitionField(source_id=2, field_id=1000, transform=IdentityTransform(), name="category"))
+    arrow_schema = pa.schema([
+        pa.field("id", pa.int64()),
+        pa.field("category", pa.string()),
+        pa.field("value", pa.float64()),
+        pa.field("ts", pa.timestamp("us")),
+    ])
+    snapshots = max(1, min(snapshots, files))
+    start = datetime(2024, 1, 1)
+
+    for ns_idx in range(namespaces):
+        namespace = f"{BENCH_NAMESPACE_PREFIX}_{ns_idx}"
+        catalog.create_namespace_if_not_exists(namespace)
+        for tbl_idx in range(tables):
+            identifier = f"{namespace}.t_{tbl_idx}"
+            if catalog.table_exists(identifier):
+                catalog.drop_table(identifier)
+            table = catalog.create_table(identifier, schema=schema, partition_spec=spec)
+
+            next_id = 0
+            for commit in range(snapshots):
+                # One file per distinct partition value in the appended batch.
+                files_in_commit = files // snapshots + (1 if commit < files % snapshots else 0)
+                columns = {"id": [], "category": [], "value": [], "ts": []}
+                for j in range(files_in_commit):
+                    partition = (commit * files_in_commit + j) % partitions
+                    rows = int(rows_per_file * (skew if partition == 0 else 1))
+                    columns["id"].extend(range(next_id, next_id + rows))
+                    columns["category"].extend([f"p{partition}"] * rows)
+                    columns["value"].extend(rng.random() for _ in range(rows))
+                    columns["ts"].extend(start + timedelta(minutes=next_id + i) for i in range(rows))
+                    next_id += rows
+                table.append(pa.table(columns, schema=arrow_schema))
+            logger.info("Created %s (%s files, %s snapshots)", identifier, files, snapshots)
+
+
+# --------------------------------------------------------------------------- timing
+
+
+def measure(name: str, fn: Callable[[], int], repeat: int) -> BenchmarkResult:
+    """Runs `fn` `repeat` times; `fn` returns the number of operations it performed."""
+    timings = []
+    peak = 0
+    operations = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        operations = fn()
+        timings.append(time.perf_counter() - started)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    result = BenchmarkResult(name=name, seconds=statistics.median(timings), operations=operations, peak_bytes=peak)
+    logger.info("%-45s %9.3fs %10.1f ops/s %8.1f MiB", name, result.seconds, result.ops_per_second, peak / 2**20)
+    return result
+
+
+def bench_lakeview(lv, table_ids: list[str], repeat: int) -> list[BenchmarkResult]:
+    from app.api_utils import arrow_to_records
+    from app.query_cost import QueryBudget
+
+    # The /sample endpoint: Arrow rows converted to records, and a planned sample query.
+    unlimited = QueryBudget(max_files=0, max_bytes=0)
+
+    def sample_query(table):
+        sql = f"select id, value from {'.'.join(table.name())} where category = 'p1' and value > 0.5 limit 50"
+        return arrow_to_records(lv.get_sample_table(table, sql, 50, budget=unlimited))
+
+    def each_table(call: Callable) -> Callable[[], int]:
+        def run() -> int:
+            for table_id in table_ids:
+                call(lv.load_table(table_id))
+            return len(table_ids)
+        return run
+
+    calls = {
+        "load_table": lambda table: None,
+        "snapshots": lv.get_snapshot_data,
+        "partitions": lv.get_partition_data,
+        "data_change": lv.get_data_change,
+        "schema": lv.get_schema,
+        "summary": lv.get_summary,
+        "properties": lv.get_properties,
+        "partition_specs": lv.get_partition_specs,
+        "sort_order": lv.get_sort_order,
+        "sample": lambda table: arrow_to_records(lv.get_sample_table(table, None, 50)),
+        "sample_sql": sample_query,
+    }
+    return [measure(f"lakeview.{name}", each_table(call), repeat) for name, call in calls.items()]
+
+
+def bench_rules(lv, table_ids: list[str], repeat: int) -> list[BenchmarkResult]:
+    from app.insights.rules import ALL_RULES_OBJECT
+
+    tables = [lv.load_table(table_id) for table_id in table_ids]
+    results = []
+    for rule in ALL_RULES_OBJECT:
+        def run(rule=rule) -> int:
+            for table in tables:
+                rule.method(table)
+            return len(tables)
+        results.append(measure(f"rule.{rule.id}", run, repeat))
+    return results
+
+
+def bench_worker(lv, table_count: int, repeat: int) -> list[BenchmarkResult]:
+    from app.insights.runner import InsightsRunner
+    from app.models import (
+        ActiveInsight, BackgroundJob, InsightRecord, InsightRun, QueuedTask, RuleExecution, TableHealth
+    )
+    from app.storage import get_storage
+    from app.worker import execute_generator_task, run_worker_cycle
+
+    storages = {model: get_storage(model=model) for model in (
+        InsightRun, InsightRecord, ActiveInsight, TableHealth, RuleExecution, QueuedTask, BackgroundJob
+    )}
+    for storage in storages.values():
+        storage.connect()
+        storage.ensure_table()
+    task_storage = storages[QueuedTask]
+    batch_storage = storages[BackgroundJob]
+    runner = InsightsRunner(
+        lakeview=lv,
+        run_storage=storages[InsightRun],
+        insight_storage=storages[InsightRecord],
+        active_insight_storage=storages[ActiveInsight],
+        health_storage=storages[TableHealth],
+        execution_storage=storages[RuleExecution],
+    )
+
+    def new_batch() -> QueuedTask:
+        batch = BackgroundJob(id=str(uuid.uuid4()), namespace="*", table_name=None, rules_requested=None,
+                              status="pending")
+        batch_storage.save(batch)
+        return QueuedTask(batch_id=batch.id, namespace="*", table_name=None, rules_requested=None, run_type="auto")
+
+    def generator() -> int:
+        task = new_batch()
+        execute_generator_task(task, task_storage, lv)
+        task_storage.delete_by_attributes({"batch_id": task.batch_id})
+        return table_count
+
+    def full_batch() -> int:
+        task_storage.save(new_batch())
+        while run_worker_cycle(task_storage, batch_storage, runner, lv):
+            pass
+        return table_count
+
+    try:
+        return [
+            measure("worker.generator_task", generator, repeat),
+            measure("worker.full_batch", full_batch, repeat),
+        ]
+    finally:
+        for storage in storages.values():
+            storage.disconnect()
+
+
+# --------------------------------------------------------------------------- reporting
+
+
+def compare(results: list[BenchmarkResult], baseline: dict, tolerance: float) -> list[str]:
+    """Returns a line per benchmark slower than the baseline by more than `tolerance`."""
+    regressions = []
+    for result in results:
+        previous = baseline.get(result.name)
+        if not previous or not previous.get("seconds"):
+            continue
+        ratio = result.seconds / previous["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{result.name}: {result.seconds:.3f}s vs {previous['seconds']:.3f}s baseline ({ratio:.2f}x)"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workdir", type=Path, default=DEFAULT_WORKDIR, help="Catalog, warehouse and health DB location")
+    parser.add_argument("--skip-generate", action="store_true", help="Reuse the lakehouse from a previous run")
+    parser.add_argument("--namespaces", type=int, default=2)
+    parser.add_argument("--tables", type=int, default=3, help="Tables per namespace")
+    parser.add_argument("--files", type=int, default=50, help="Data files per table")
+    parser.add_argument("--snapshots", type=int, default=10, help="Appends per table (at most one per file)")
+    parser.add_argument("--rows-per-file", type=int, default=100)
+    parser.add_argument("--partitions", type=int, default=8)
+    parser.add_argument("--skew", type=float, default=1.0, help="Row multiplier of the hottest partition")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the median is reported")
+    parser.add_argument("--only", choices=["lakeview", "rules", "worker"], action="append",
+                        help="Run only these benchmark groups (repeatable)")
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Compare against a saved baseline JSON")
+    parser.add_argument("--save-baseline", type=Path, help="Save results as the new baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs. baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    configure_environment(args.workdir.resolve())
+
+    if not args.skip_generate:
+        generate_lakehouse(args.namespaces, args.tables, args.files, args.snapshots,
+                           args.rows_per_file, args.partitions, args.skew, args.seed)
+
+    from app.lakeviewer import LakeView
+
+    lv = LakeView()
+    table_ids = [
+        ".".join(ident)
+        for ns in lv.get_namespaces()
+        if ns[0].startswith(BENCH_NAMESPACE_PREFIX)
+        for ident in lv.get_tables(".".join(ns))
+    ]
+    if not table_ids:
+        logger.error("No benchmark tables found in %s; run without --skip-generate first.", args.workdir)
+        return 2
+
+    groups = set(args.only or ["lakeview", "rules", "worker"])
+    results: list[BenchmarkResult] = []
+    if "lakeview" in groups:
+        results += bench_lakeview(lv, table_ids, args.repeat)
+    if "rules" in groups:
+        results += bench_rules(lv, table_ids, args.repeat)
+    if "worker" in groups:
+        results += bench_worker(lv, len(table_ids), args.repeat)
+
+    report = {
+        result.name: {**asdict(result), "ops_per_second": result.ops_per_second}
+        for result in results
+    }
+    report_meta = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "tables": len(table_ids),
+        "args": {k: str(v) for k, v in vars(args).items()},
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({"meta": report_meta, "results": report}, indent=2))
+            logger.info("Results written to %s", path)
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text()).get("results", {})
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            logger.error("Regressions against %s:\n  %s", args.baseline, "\n  ".join(regressions))
+            return 1
+        logger.info("No regressions against %s (tolerance %.0f%%)", args.baseline, args.tolerance * 100)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
 #! /bin/bash
 cd /app/be
-python3 -m app.worker
\ No newline at end of file
+# exec, so that the worker receives SIGTERM and can drain on scale-down
+exec python3 -m app.worker
\ No newline at end of file